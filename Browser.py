@@ -3,209 +3,102 @@ Wiki Racing App - A standalone app for playing rounds of wiki racing and trackin
 Created by James and Bruce Smith 21/11/2024
 '''
 
+import time
+STARTED = time.perf_counter()
+
 # importing required libraries
+# QtWebEngine is deliberately not imported here: the race browser lives in RaceWindow,
+# which is loaded after the menu has painted (see race_pool). The game's other modules
+# are imported by the handlers that use them, so none of them delay the menu either
 from PyQt5 import QtCore
-from PyQt5.QtCore import Qt, QUrl, QTimer, QTime
+from PyQt5.QtCore import Qt, QTimer, QTime
 from PyQt5.QtGui import *
-from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor
-from PyQt5.QtWebEngineWidgets import *
 from PyQt5.QtWidgets import *
-import sys, csv
-import urllib.request
+import json
+import sqlite3
+import sys
+import threading
 
+from NavigationRules import RELAY_MODE, SCAVENGER_MODE, SINGLE_MODE
+from RaceClock import NS_PER_SECOND, format_elapsed
 
-'''
-Name: MainWindow
-Attributes: browser, status, toolbar
-Methods: add_to_toolbar, update_title, set_url
-'''
+# Difficulty band of "Play Random" rounds when a round pair index has been built
+# Pass --difficulty easy|medium|hard|expert on the command line to change it (checked
+# against RoundGenerator's bands at startup, see __main__)
+ROUND_DIFFICULTY = "medium"
+if "--difficulty" in sys.argv[:-1]:
+    ROUND_DIFFICULTY = sys.argv[sys.argv.index("--difficulty") + 1]
 
-class MainWindow(QMainWindow):
-    # Initialise Browser window
-    def __init__(self, start, goal, parent=None):
-        super(MainWindow, self).__init__(parent)
-
-        '''
-        Initialising The primary window with the following:
-        Toolbar: [Back, Next, Reload, Stop] 
-        Central Widget:
-        QGraphicsView 
-            QTWebEngineView
-            QLCDNumber
-        '''
-        # Central widget with QGraphicsView as the root and a QVBoxLayout
-        self.central = QGraphicsView()
-        self.vBox = QVBoxLayout()
-
-        self.lcd = self.add_timer()
-        self.vBox.addWidget(self.lcd)
-        self.endPageLabel = QLabel("Your Goal Is: " + goal)
-        self.endPageLabel.setAlignment(Qt.AlignCenter)
-        self.endPageLabel.setFont(QFont("MS Gothic", 30))
-        self.vBox.addWidget(self.endPageLabel, 0)
-        self.add_browser(goal)
-        self.startUrl = self.set_start(start)
-        self.goalUrl = self.set_goal(goal)
-        self.set_url(self.startUrl)
-        self.vBox.addWidget(self.browser)
-        self.central.setLayout(self.vBox)
-        self.central.setMinimumHeight(800)
-        self.central.setMinimumWidth(800)
-        self.central.resize(800, 800)
-        self.setCentralWidget(self.central)
+# Pass --relay N or --scavenger N to play "Play Random" rounds with N checkpoints, reached in
+# order or in any order
+ROUND_MODE = SINGLE_MODE
+ROUND_CHECKPOINTS = 1
+for _mode in (RELAY_MODE, SCAVENGER_MODE):
+    if "--" + _mode in sys.argv[:-1]:
+        ROUND_MODE = _mode
+        _count = sys.argv[sys.argv.index("--" + _mode) + 1]
+        if not _count.isdigit() or int(_count) < 1:
+            sys.exit(f"--{_mode} needs a number of checkpoints, not '{_count}'")
+        ROUND_CHECKPOINTS = int(_count)
 
-        # Initialising a status bar object
-        self.status = QStatusBar(self)
-        self.setStatusBar(self.status)
+# Extra goal fields the input window offers for relay and scavenger rounds
+MAX_CHECKPOINT_FIELDS = 9
 
-        # Initialising a top toolbar as QToolBar object
-        self.toolbar = QToolBar("Navigation")
-        self.addToolBar(self.toolbar)
-        self.add_to_toolbar("Back", "Back to previous page", self.browser.back)
-        self.add_to_toolbar("Next", "Forward to next page",
-                            self.browser.forward)
-        self.add_to_toolbar("Reload", "Reload page", self.browser.reload)
-        self.add_to_toolbar("Stop", "Stop loading page", self.browser.stop)
+# Rows the leaderboard fetches from the store at a time, and how long after the last
+# key press its search is applied
+LEADERBOARD_ROWS = 50
+SEARCH_DELAY_MS = 250
 
-        '''self.topDock = QDockWidget()
-        self.addDockWidget(self.topDock)'''
+# How long Play Random waits for the random pool to deliver before giving up
+RANDOM_WAIT_SECONDS = 20
 
-        self.gameStarted = False
+# How long after the menu appears to start loading QtWebEngine in the background
+PREWARM_DELAY_MS = 200
 
-        self.show()
+# Round played by --startup-report to time the first page load
+STARTUP_REPORT_ROUND = ("Wiki_racing", "Philosophy")
 
-    '''
-    Method to add navigation button to the toolbar
-    Arguments:
-    text - the label of the button
-    tip - the tooltip that displays on hover
-    action - the function to be performed on triggered
-    '''
+# Seconds since STARTED at which each startup milestone was first reached
+STARTUP_MARKS = {}
 
-    def add_to_toolbar(self, text, tip, action):
-        button = QAction(text, self)
-        button.setStatusTip(tip)
-        button.triggered.connect(action)
-        self.toolbar.addAction(button)
 
-    '''
-    Method to create a browser via QTWebEngineView
-    Returns a QTWebEngineView object
-    '''
+def mark_startup(name):
+    STARTUP_MARKS.setdefault(name, time.perf_counter() - STARTED)
 
-    def add_browser(self, goal):
-        self.browser = QWebEngineView()
-        self.interceptor = WebEngineUrlRequestInterceptor()
-        self.profile = QWebEngineProfile()
-        self.profile.setUrlRequestInterceptor(self.interceptor)
-        self.page = CustomWebPage(
-            goal, self.stop_timer, self.profile, self.browser)
-        self.browser.setPage(self.page)
-        self.browser.setMinimumHeight(600)
-        self.browser.setMinimumWidth(800)
-        self.browser.resize(800, 600)
-        self.browser.loadFinished.connect(self.update_title)
-        # return browser
-
-    def add_timer(self):
-        lcd = QLCDNumber(self)
-        lcd.setNumDigits(8)
-        lcd.setSegmentStyle(QLCDNumber.Filled)
-        lcd.resize(600, 200)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.showTime)
-        self.time = QTime(0, 0, 0)
-        lcd.display(self.time.toString('mm:ss.zzz'))
-        # self.timer.start(10)
-        return lcd
-
-    def stop_timer(self):
-        self.timer.stop()
-        self.window = GameComplete(self.time)
-        self.close()
 
-    # Update the QLCDNumber object with current timing
-    def showTime(self):
-        self.time = self.time.addMSecs(10)
-        self.lcd.display(self.time.toString('mm:ss.zzz'))
-
-    # Updates the title of the browser window
-    def update_title(self):
-        title = self.browser.page().title()
-        self.setWindowTitle("% s - Wiki-Racing" % title)
-        if not self.gameStarted:
-            self.timer.start(10)
-            self.gameStarted = True
-
-    # Sets the url using QUrl functionality
-    def set_url(self, url):
-        self.browser.setUrl(QUrl(url))
-
-    def set_start(self, start):
-        startUrl = "https://en.wikipedia.org/wiki/" + start
-        return startUrl
-
-    def set_goal(self, goal):
-        goalUrl = "https://en.wikipedia.org/wiki/" + goal
-        self.endPageLabel.setText("Your Goal Is: " + goal)
-        return goalUrl
-
-    def convert_goal_readable(self):
-        goal = self.goalUrl[30:]
-        goal.capitalize()
-        return goal
+mark_startup("qt_imported")
 
+_racePool = None
 
 '''
-Class to intercept every XHR call to load anything
-This class is needed, though its sole method does nothing, because otherwise we get the runtime error:
-TypeError: PyQt5.QtWebEngineCore.QWebEngineUrlRequestInterceptor represents a C++ abstract class and cannot be instantiated
+Returns the EnginePool for race windows, importing QtWebEngine on first use
 '''
-
-class WebEngineUrlRequestInterceptor(QWebEngineUrlRequestInterceptor):
-    def __init__(self, parent=None):
-        super(WebEngineUrlRequestInterceptor, self).__init__(parent)
-
-    '''
-    This method must be provided to avoid the runtime error:
-    QWebEngineUrlRequestInterceptor.interceptRequest() is abstract and must be overridden
-    '''
-
-    def interceptRequest(self, _):
-        x = 1  # dummy else Python is syntactically unhappy
+def race_pool():
+    global _racePool
+    if _racePool is None:
+        mark_startup("webengine_import_started")
+        import RaceWindow
+        mark_startup("webengine_imported")
+        _racePool = RaceWindow.EnginePool(onFinish=GameComplete)
+    return _racePool
 
 
 '''
-Class to restrict navigation to within Wikipedia
-Checks for requests for pages outside of wikipedia as well as 
-search requests made using the inbuilt wikipedia search bar
-If either request is made, the request is ignored
+Load QtWebEngine and build an idle race window while the player is still in the menu,
+so pressing Play does not wait for Chromium to start
 '''
-
-class CustomWebPage(QWebEnginePage):
-    def __init__(self, goal, stopper, profile, parent=None):
-        super(CustomWebPage, self).__init__(profile, parent)
-        self.goal = goal.lower()
-        self.stopper = stopper
-
-    '''
-    Method that checks every XHR request to ensure that only those going to Wikipedia destinations
-    are processed. This holds the game player hostage on Wikipedia
-    '''
-
-    def acceptNavigationRequest(self, url,  _type, isMainFrame):
-        lower = url.toString().lower()
-        if lower.find("wikipedia.org") < 0 or lower.find("wikipedia.org/w/index.php?search=") > 0:
-            return False
-        if lower.find(self.goal) > 0:
-            self.stopper()
-        return super().acceptNavigationRequest(url,  _type, isMainFrame)
+def prewarm():
+    from RandomPool import default_pool
+    # Start resolving random rounds in the background so "Play Random" is instant
+    default_pool().refill()
+    race_pool().prewarm()
+    mark_startup("webengine_prewarmed")
 
 
 '''
 Name: MenuWindow
 Attributes: centralWidget, playBtn, playRandBtn, settingsBtn, quitBtn
-Methods: start_game, startgame_random, run_settings
+Methods: start_game, startgame_random, join_race, run_settings
 '''
 
 class MenuWindow(QMainWindow):
@@ -228,11 +121,17 @@ class MenuWindow(QMainWindow):
         # Play Random Start, Random End Button
         self.add_button(QtCore.QRect(300, 250, 200, 50),
                         "Play Random", self.start_game_random)
-        # Start up Timer Widget [Placeholder till functionality is incorporated into MainWindow]
+        # Join a shared race on a LAN race server
         self.add_button(QtCore.QRect(300, 350, 200, 50),
+                        "Join Race", self.join_race)
+        # Start up Timer Widget [Placeholder till functionality is incorporated into MainWindow]
+        self.add_button(QtCore.QRect(300, 450, 200, 50),
                         "Leaderboard", self.show_leaderboard)
         # Quit Game Button
-        self.add_button(QtCore.QRect(300, 450, 200, 50), "Quit", self.close)
+        self.add_button(QtCore.QRect(300, 550, 200, 50), "Quit", self.close)
+
+        # Warm up the random pool and the race browser once the menu is on screen
+        QTimer.singleShot(PREWARM_DELAY_MS, prewarm)
 
         '''self.background = QGraphicsView(self.centralWidget)
         self.background.setGeometry(QtCore.QRect(0,0,600,500))
@@ -240,6 +139,10 @@ class MenuWindow(QMainWindow):
 
         self.show()
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        mark_startup("menu_first_paint")
+
     '''
     Method to add button widgets to the window
     Arguments: 
@@ -272,17 +175,99 @@ class MenuWindow(QMainWindow):
         self.window.show()
         self.close()
 
+    '''
+    Method to join a race server: asks for its address and a player name, then waits in
+    the lobby for the host to start rounds
+    '''
+
+    def join_race(self):
+        address, entered = QInputDialog.getText(
+            self, "Join Race", "Race server (host or host:port): ", text="localhost")
+        if not entered or not address.strip():
+            return
+        name, entered = QInputDialog.getText(self, "Join Race", "Your name: ")
+        if not entered or not name.strip():
+            return
+        from RaceClient import RaceClient, RaceLobby
+        from RaceServer import RACE_PORT
+        host, _, port = address.strip().partition(':')
+        client = RaceClient(name.strip())
+        self.window = RaceLobby(client, lambda start, goal, onFinish:
+                                race_pool().acquire(start, goal, onFinish))
+        client.connect_to(host, int(port) if port.isdigit() else RACE_PORT)
+        self.close()
+
     def show_leaderboard(self):
         self.window = Leaderboard()
         self.window.show()
         self.close()
 
 
+'''
+Name: TitleSuggester
+Description: Worker thread that answers autocomplete and validation queries for the input
+fields, so building the prefix index and resolving titles never block the GUI thread.
+Only the latest text of each field is looked up; anything typed in between is skipped
+Attributes: suggested, resolved
+Methods: request, stop
+'''
+
+class TitleSuggester(QtCore.QObject):
+    # (field, text, suggested titles)
+    suggested = QtCore.pyqtSignal(str, str, list)
+    # (field, text, resolved title, whether it is a known article). The title is empty
+    # when the lookup itself failed
+    resolved = QtCore.pyqtSignal(str, str, str, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="TitleSuggester", daemon=True)
+        self.thread.start()
+
+    def request(self, field, text):
+        with self.condition:
+            self.pending[field] = text
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        from TitleResolver import default_resolver
+        from TitleSearch import default_index
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                requests, self.pending = self.pending, {}
+            for field, text in requests.items():
+                try:
+                    index = default_index()
+                    resolver = default_resolver()
+                    self.suggested.emit(field, text, index.suggest(text))
+                    title = resolver.resolve(text)
+                    # Without a link graph nothing can be ruled out, so any title will do
+                    found = bool(title) and resolver.exists(text) is not False
+                except Exception as error:
+                    # e.g. a damaged title index; keep the thread alive for the next field
+                    print(f"Could not look up '{text}': {error}")
+                    title, found = "", False
+                self.resolved.emit(field, text, title, found)
+
+
 '''
 Name: InputWindow
 Description: A small pop-up window that waits for user input 
 for the start page and the goal for the game before starting a new game
-option to return to main menu
+option to return to main menu. Titles autocomplete as they are typed and Start stays
+disabled until both resolve to an article
 '''
 
 class InputWindow(QMainWindow):
@@ -294,18 +279,31 @@ class InputWindow(QMainWindow):
         self.resize(400, 400)
         self.central = QGraphicsView()
         self.grid = QVBoxLayout()
-        self.start, self.startEntered = QInputDialog.getText(
-            self, "Start Page", "Enter a page to start: ")
-        self.goal, self.goalEntered = QInputDialog.getText(
-            self, "Goal", "Enter a goal: ")
-        self.startLabel = QLabel("Start Page: " + self.start)
-        self.startLabel.setFont(QFont("MS Gothic", 10))
-        self.grid.addWidget(self.startLabel)
-        self.goalLabel = QLabel("Goal Page: " + self.goal)
-        self.goalLabel.setFont(QFont("MS Gothic", 10))
-        self.grid.addWidget(self.goalLabel)
+        self.suggester = TitleSuggester(self)
+        self.suggester.suggested.connect(self.show_suggestions)
+        self.suggester.resolved.connect(self.show_resolved)
+        # Resolved title of each field, None until it resolves. Empty checkpoint fields
+        # have no entry, so they do not hold up the start button
+        self.titles = {"start": None, "goal": None}
+        self.fields = {}
+        self.statusLabels = {}
+        self.models = {}
+        self.fieldBox = QVBoxLayout()
+        self.grid.addLayout(self.fieldBox)
+        self.add_field("start", "Start Page: ")
+        self.add_field("goal", "Goal Page: ")
+        # Extra goals make a relay (in order) or a scavenger hunt (any order)
+        self.checkpointBtn = QPushButton("Add checkpoint", self.central)
+        self.checkpointBtn.clicked.connect(self.add_checkpoint)
+        self.grid.addWidget(self.checkpointBtn)
+        self.modeBox = QComboBox(self.central)
+        self.modeBox.addItem("Relay: checkpoints in order", RELAY_MODE)
+        self.modeBox.addItem("Scavenger hunt: any order", SCAVENGER_MODE)
+        self.modeBox.setVisible(False)
+        self.grid.addWidget(self.modeBox)
         self.startBtn = QPushButton(self.central)
         self.startBtn.setText("Start")
+        self.startBtn.setEnabled(False)
         self.startBtn.clicked.connect(self.start_game)
         self.grid.addWidget(self.startBtn)
         self.backBtn = QPushButton(self.central)
@@ -316,9 +314,84 @@ class InputWindow(QMainWindow):
         self.setCentralWidget(self.central)
         self.show()
 
+    '''
+    Add a labelled title field with a completer fed by the suggester
+    '''
+
+    def add_field(self, field, caption):
+        label = QLabel(caption)
+        label.setFont(QFont("MS Gothic", 10))
+        self.fieldBox.addWidget(label)
+        edit = QLineEdit()
+        edit.setFont(QFont("MS Gothic", 10))
+        model = QtCore.QStringListModel(self)
+        completer = QCompleter(model, self)
+        # The suggester has already matched the prefix, so show its list as it is
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        edit.setCompleter(completer)
+        edit.textChanged.connect(lambda text: self.title_changed(field, text))
+        edit.returnPressed.connect(self.start_game)
+        self.fieldBox.addWidget(edit)
+        status = QLabel("")
+        status.setFont(QFont("MS Gothic", 9))
+        self.fieldBox.addWidget(status)
+        self.fields[field] = edit
+        self.statusLabels[field] = status
+        self.models[field] = model
+
+    def add_checkpoint(self):
+        checkpoints = len(self.fields) - 1
+        self.add_field("goal%d" % (checkpoints + 1), "Checkpoint %d: " % (checkpoints + 1))
+        self.modeBox.setVisible(True)
+        self.checkpointBtn.setEnabled(checkpoints < MAX_CHECKPOINT_FIELDS)
+
+    def title_changed(self, field, text):
+        self.titles[field] = None
+        if text.strip():
+            self.statusLabels[field].setText("Checking...")
+            self.suggester.request(field, text)
+        else:
+            self.statusLabels[field].setText("")
+            self.models[field].setStringList([])
+            if field not in ("start", "goal"):
+                del self.titles[field]
+        self.startBtn.setEnabled(None not in self.titles.values())
+
+    def show_suggestions(self, field, text, titles):
+        edit = self.fields[field]
+        if text != edit.text():
+            return  # Answer to text the player has since changed
+        self.models[field].setStringList(titles)
+        # Nothing to offer once the field already holds the only suggestion
+        if edit.hasFocus() and titles and titles != [text]:
+            edit.completer().complete()
+
+    def show_resolved(self, field, text, title, found):
+        if text != self.fields[field].text():
+            return
+        if found:
+            self.titles[field] = title
+            self.statusLabels[field].setText("-> " + title)
+        elif not title:
+            self.statusLabels[field].setText("Could not check this title")
+        else:
+            self.statusLabels[field].setText("No article called '%s'" % title)
+        self.startBtn.setEnabled(None not in self.titles.values())
+
+    def closeEvent(self, event):
+        self.suggester.stop()
+        super().closeEvent(event)
+
     def start_game(self):
-        self.window = MainWindow(self.start, self.goal)
-        self.window.show()
+        if None in self.titles.values():
+            return
+        # Goal fields in the order they were added, skipping empty checkpoints
+        goals = [self.titles[field] for field in self.fields
+                 if field != "start" and field in self.titles]
+        mode = self.modeBox.currentData() if len(goals) > 1 else SINGLE_MODE
+        self.window = race_pool().acquire(self.titles["start"], goals if len(goals) > 1
+                                          else goals[0], mode=mode)
         self.close()
 
 
@@ -342,38 +415,161 @@ class CountdownTimer(QLCDNumber):
         self.display(self.time.toString('s'))
         self.timer.start(1000)
 
+        # Rounds come from the distance-bucketed pair index when one has been built, so
+        # every player gets a round of comparable difficulty. Otherwise they come from
+        # Special:Random, which the pool tops up while the player watches the countdown
+        from RandomPool import default_pool
+        from RoundGenerator import default_generator
+        self.generator = default_generator()
+        self.pool = default_pool()
+        self.waited = 0
+        if self.generator is None:
+            self.pool.reserve(ROUND_CHECKPOINTS)
+
+    '''
+    Count down, then keep ticking until the round's pairs are ready. Nothing here waits
+    on the network: if the pool is still empty after RANDOM_WAIT_SECONDS the player is
+    told why and sent back to the menu
+    '''
+
     def showTime(self):
-        self.time = self.time.addSecs(-1)
-        self.display(self.time.toString('s'))
-        if self.time == QtCore.QTime(0, 0, 0):
-            self.start_game(self.special(), self.special())
+        if self.time > QtCore.QTime(0, 0, 0):
+            self.time = self.time.addSecs(-1)
+            self.display(self.time.toString('s'))
+        if self.time > QtCore.QTime(0, 0, 0):
+            return
+        pairs = self.next_pairs(ROUND_CHECKPOINTS)
+        if pairs is not None:
+            self.timer.stop()
+            self.start_game(pairs)
+            return
+        self.waited += 1
+        self.display('-')
+        if self.waited >= RANDOM_WAIT_SECONDS:
+            self.timer.stop()
+            QMessageBox.warning(self, "Play Random", "Could not fetch random articles: %s" % (
+                self.pool.lastError or "Wikipedia did not answer in time"))
+            self.window = MenuWindow()
+            self.close()
 
-    def start_game(self, start, goal):
-        self.window = MainWindow(start, goal)
-        self.window.show()
-        self.close()
+    '''
+    count (start, goal) pairs, or None while the random pool is still filling
+    '''
+
+    def next_pairs(self, count):
+        if self.generator is not None:
+            try:
+                return [self.generator.sample_band(ROUND_DIFFICULTY) for _ in range(count)]
+            except ValueError:
+                pass  # No pairs in this band; fall back to fully random rounds
+        return self.pool.take_pairs(count)
 
-    def special(self):
-        opener = urllib.request.build_opener(NoRedirection)
-        response = opener.open('https://en.wikipedia.org/wiki/Special:Random')
-        location = response.getheader('Location')
-        return location.removeprefix('https://en.wikipedia.org/wiki/')
+    '''
+    With --relay or --scavenger the goals of further pairs become the round's checkpoints
+    '''
 
+    def start_game(self, pairs):
+        start, goal = pairs[0]
+        if ROUND_MODE != SINGLE_MODE:
+            goal = [pair[1] for pair in pairs]
+        self.window = race_pool().acquire(start, goal, mode=ROUND_MODE)
+        self.close()
 
 '''
-Name: NoRedirection
-Description: A URL opener that does not follow redirections (HTTP 30x responses)
+Name: LeaderboardModel
+Description: Table model over the leaderboard store. Rows are fetched a page at a time as
+the view scrolls (canFetchMore / fetchMore), and sorting or filtering re-queries the store,
+so opening the board costs one page however many scores have been recorded
+Attributes: store, rows, orderBy, descending, search
+Methods: sort, set_search, fetchMore
 '''
 
-class NoRedirection(urllib.request.HTTPErrorProcessor):
-    def http_response(self, _, response):
-        return response
-    https_response = http_response
+class LeaderboardModel(QtCore.QAbstractTableModel):
+    # (header, store column) per table column
+    COLUMNS = (("Name", "name"), ("Time", "time"), ("Start", "start"), ("Goal", "goal"),
+               ("Clicks", "clicks"), ("Par", "par"), ("Date", "recorded"))
+
+    def __init__(self, store, pageSize=LEADERBOARD_ROWS, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.pageSize = pageSize
+        self.rows = []
+        self.orderBy = "time"
+        self.descending = False
+        self.search = None
+        self.exhausted = False
+        self.reload()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.COLUMNS[section][0]
+        return section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self.rows[index.row()][self.COLUMNS[index.column()][1]]
+        if role == Qt.TextAlignmentRole and index.column() != 0:
+            return Qt.AlignCenter
+        if role != Qt.DisplayRole or value is None:
+            return None
+        column = self.COLUMNS[index.column()][1]
+        if column == "time":
+            return format_elapsed(round(value * NS_PER_SECOND))
+        if column == "recorded":
+            return time.strftime("%Y-%m-%d %H:%M", time.localtime(value))
+        return value
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    '''
+    Append the next page of rows from the store
+    '''
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        rows = self.store.page(len(self.rows), self.pageSize, self.orderBy, self.descending,
+                               self.search)
+        self.exhausted = len(rows) < self.pageSize
+        if rows:
+            self.beginInsertRows(QtCore.QModelIndex(), len(self.rows),
+                                 len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+
+    # Drop the loaded rows and start again from the first page
+    def reload(self):
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.orderBy = self.COLUMNS[column][1]
+        self.descending = order == Qt.DescendingOrder
+        self.reload()
+
+    def set_search(self, text):
+        self.search = text.strip() or None
+        self.reload()
+
 
 '''
 Name: Leaderboard
-Description: used to display player times stored in a csv file
-TO BE IMPLEMENTED: Options for different score categories, the ability to return to menu
+Description: used to display the fastest player times held in the leaderboard store
+Scores are shown in a QTableView over LeaderboardModel; click a header to sort and type in
+the search box to filter by player, start or goal
 '''
 
 class Leaderboard(QMainWindow):
@@ -382,37 +578,42 @@ class Leaderboard(QMainWindow):
 
         self.resize(800,600)
         self.setWindowTitle("Leaderboard")
-        self.central = QGraphicsView()
-        self.grid = QVBoxLayout()
+        self.central = QWidget()
+        self.grid = QVBoxLayout(self.central)
         self.title = QLabel("LeaderBoard")
         self.title.setFont(QFont("MS Gothic", 30))
         self.grid.addWidget(self.title)
-        self.leaderboard = []
-        self.read_leaderboard("leaderboard.csv")
-        #print(self.leaderboard)
-        for entry in self.leaderboard:
-            print(entry[1])
-            self.value = QLabel(f"{entry[0]}: {entry[1]}")
-            self.value.setFont(QFont("MS Gothic", 20))
-            self.grid.addWidget(self.value)
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("Search player, start or goal")
+        self.grid.addWidget(self.search)
+        from LeaderboardStore import default_store
+        self.model = LeaderboardModel(default_store(), LEADERBOARD_ROWS, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setFont(QFont("MS Gothic", 12))
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        # Sort indicator first, so enabling sorting does not re-query by column 0
+        self.table.horizontalHeader().setSortIndicator(1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.grid.addWidget(self.table)
         self.btn_back = QPushButton("Back")
+        self.btn_back.clicked.connect(self.back_to_menu)
         self.grid.addWidget(self.btn_back)
-        self.central.setLayout(self.grid)
         self.setCentralWidget(self.central)
+
+        # Filter once typing pauses rather than on every key
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(SEARCH_DELAY_MS)
+        self.searchTimer.timeout.connect(lambda: self.model.set_search(self.search.text()))
+        self.search.textChanged.connect(self.searchTimer.start)
         self.show()
 
-    def read_leaderboard(self, filename):
-        # Read the existing leaderboard from the CSV file
-        try:
-            with open(filename, mode='r') as file:
-                reader = csv.reader(file)
-                next(reader)  # Skip the header row
-                for row in reader:
-                    self.leaderboard.append((row[1], float(row[2])))  # Append name and time
-        except FileNotFoundError:
-            print(f"File '{filename}' not found.")
-        except ValueError:
-            print("Error reading data. Ensure the CSV file has valid format.")
+    def back_to_menu(self):
+        self.window = MenuWindow()
+        self.close()
 
 '''
 Name: GameComplete
@@ -420,15 +621,23 @@ Description: Records the players time and takes input for a name to be used in t
 '''
 
 class GameComplete(QMainWindow):
-    def __init__(self, time, parent=None):
+    def __init__(self, time, clicks=None, par=None, start=None, goal=None, filterStats=None,
+                 path=None, splits=None, mode=None, parent=None):
         super().__init__(parent)
+        from LeaderboardStore import default_store
+        from RequestFilter import describe_savings
 
         self.setWindowTitle("Round Success")
         self.setGeometry(200,200,400,400)
-        self.csvFile = "leaderboard.csv"
-        self.leaderboard = []
-        self.read_leaderboard()
-        self.time = time
+        self.store = default_store()
+        self.time = time  # Race time in seconds, measured by MainWindow's RaceClock
+        self.start = start
+        self.goal = goal
+        self.clicks = clicks
+        self.par = par
+        self.path = path  # Titles visited on the way, kept for route analytics
+        self.mode = mode
+        self.splits = splits or []  # (checkpoint, seconds) of relay and scavenger rounds
 
         # Create UI components
         self.central_widget = QWidget()
@@ -438,73 +647,112 @@ class GameComplete(QMainWindow):
         self.label_player_name = QLabel("Enter Your Name: ")
         self.input_player_name = QLineEdit()
         self.label_time = QLabel("Your time was:")
-        self.label_player_time = QLabel(self.time.toString('mm:ss.zzz'))
+        self.label_player_time = QLabel(format_elapsed(round(self.time * NS_PER_SECOND)))
+        self.label_clicks = QLabel(self.clicks_text())
+        self.label_filter = QLabel(describe_savings(filterStats) if filterStats else "")
+        self.label_splits = QLabel(self.splits_text())
         self.btn_ok = QPushButton("Ok")
         self.btn_ok.clicked.connect(self.add_to_leaderboard)
         self.layout.addWidget(self.label_player_name)
         self.layout.addWidget(self.input_player_name)
         self.layout.addWidget(self.label_time)
         self.layout.addWidget(self.label_player_time)
+        self.layout.addWidget(self.label_clicks)
+        self.layout.addWidget(self.label_splits)
+        self.layout.addWidget(self.label_filter)
         self.layout.addWidget(self.btn_ok)
 
         self.show()
 
-    def read_leaderboard(self):
-        # Read the existing leaderboard from the CSV file
-        try:
-            with open(self.csvFile, mode='r') as file:
-                reader = csv.reader(file)
-                next(reader)  # Skip the header row
-                for row in reader:
-                    self.leaderboard.append((row[1], float(row[2])))  # Append name and time
-        except FileNotFoundError:
-            print(f"File '{self.csvFile}' not found.")
-        except ValueError:
-            print("Error reading data. Ensure the CSV file has valid format.")
+    '''
+    Describes the player's route length relative to the optimal route ("par")
+    '''
+    def clicks_text(self):
+        if self.clicks is None:
+            return ""
+        if self.par is None:
+            return "Clicks: %d" % self.clicks
+        return "Clicks: %d (par %d, %+d)" % (self.clicks, self.par, self.clicks - self.par)
 
     '''
-    Utility method used to convert the QTime object into a float (seconds)
+    One line per checkpoint: when it was reached and how long the leg to it took
     '''
-    def qtime_to_float(self):
-        total_seconds = self.time.hour() * 3600 + self.time.minute() * 60 + self.time.second() + self.time.msec() / 1000.0
-        return total_seconds
+    def splits_text(self):
+        if self.mode in (None, SINGLE_MODE) or not self.splits:
+            return ""
+        lines = []
+        previous = 0.0
+        for number, (title, seconds) in enumerate(self.splits, 1):
+            lines.append("%d. %s  %s  (+%s)" % (
+                number, title, format_elapsed(round(seconds * NS_PER_SECOND)),
+                format_elapsed(round((seconds - previous) * NS_PER_SECOND))))
+            previous = seconds
+        return "\n".join(lines)
 
     '''
-    Add the new player time into the "leaderboard.csv" file and sort in 
+    Add the new player time to the leaderboard store
     '''
     def add_to_leaderboard(self):
         # Add the new entry to the leaderboard
 
         new_entry_name = self.input_player_name.text().strip()
-        new_entry_time = self.qtime_to_float()
+        new_entry_time = round(self.time, 3)
 
         if not new_entry_name:
             QMessageBox.warning(self, "Input Error", "Player name is required")
             return
-        self.leaderboard.append((new_entry_name, new_entry_time))
-
-        # Sort the leaderboard by time (ascending)
-        self.leaderboard.sort(key=lambda x: x[1])
-
-        # Save the updated leaderboard to the CSV file
-        with open(self.csvFile, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["Rank", "Name", "Time (seconds)"])  # Write headers
-            for rank, (name, time) in enumerate(self.leaderboard, start=1):
-                writer.writerow([rank, name, time])
+        try:
+            self.store.add(new_entry_name, new_entry_time, self.start, self.goal,
+                           self.clicks, self.par, path=self.path, mode=self.mode,
+                           splits=self.splits)
+        except (sqlite3.Error, OSError) as error:
+            QMessageBox.warning(self, "Leaderboard Error", f"Could not save your time: {error}")
+            return
 
-        print(f"New entry added and leaderboard saved to '{self.csvFile}'!")
+        print(f"New entry added to '{self.store.filename}'!")
         self.window = MenuWindow()
         self.close()
 
 
+'''
+--startup-report: play STARTUP_REPORT_ROUND as soon as the menu is up, print the startup
+milestones as JSON once its first page has loaded, then quit
+'''
+def run_startup_report():
+    window = race_pool().acquire(*STARTUP_REPORT_ROUND)
+    window.browser.loadFinished.connect(finish_startup_report)
+
+
+def finish_startup_report(_):
+    mark_startup("first_page")
+    print(json.dumps(STARTUP_MARKS, indent=2))
+    QApplication.quit()
+
+
 '''
 Main Loop
 Starts a QApplciation and loads the startMenu
 Begins loop through app.exec_()
 '''
 if __name__ == "__main__":
+    from RoundGenerator import DIFFICULTY_BANDS
+    if ROUND_DIFFICULTY not in DIFFICULTY_BANDS:
+        sys.exit(f"Unknown difficulty '{ROUND_DIFFICULTY}', choose from "
+                 + ", ".join(DIFFICULTY_BANDS))
+    if "--mirror" in sys.argv:
+        # Opened here rather than in the first race window, where an error would abort the game
+        from WikiMirror import default_archive, mirror_file
+        try:
+            default_archive(mirror_file())
+        except (OSError, ValueError) as error:
+            sys.exit(f"Cannot open the offline mirror: {error}\n"
+                     f"Build one with: python WikiMirror.py build-cache page_cache {mirror_file()}")
+    # Lets QtWebEngine be imported after the QApplication exists
+    QtCore.QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     app.setApplicationName("Wiki Racing")
+    mark_startup("qapplication")
     window = MenuWindow()
+    if "--startup-report" in sys.argv:
+        QTimer.singleShot(PREWARM_DELAY_MS, run_startup_report)
     sys.exit(app.exec_())
@@ -0,0 +1,114 @@
+'''
+GhostRuns - recorded runs a player can race against
+A ghost is one finished round with the time at which each page was reached, written by
+RaceBot (or anything else that finishes a round) as a line of a JSON Lines file. Only the
+fastest ghost of each start/goal pair is kept in memory, and the race window asks for it
+at round start and shows where the ghost is as the clock runs.
+'''
+
+import bisect
+import json
+import threading
+
+from WikiTitles import title_key
+
+GHOST_FILE = "ghosts.jsonl"
+
+
+'''
+Name: Ghost
+Description: One recorded run: who ran it, its total time and clicks, and its splits as
+parallel lists of seconds and titles (splits start with the start page at 0)
+Attributes: start, goal, name, seconds, clicks, times, titles
+Methods: position, to_json
+'''
+
+class Ghost:
+    def __init__(self, start, goal, name, seconds, clicks, splits):
+        self.start = start
+        self.goal = goal
+        self.name = name
+        self.seconds = seconds
+        self.clicks = clicks
+        self.times = [time for time, _ in splits]
+        self.titles = [title for _, title in splits]
+
+    '''
+    Title of the page the ghost was on after seconds, and how many clicks it had made
+    '''
+
+    def position(self, seconds):
+        index = max(0, bisect.bisect_right(self.times, seconds) - 1)
+        return self.titles[index], index
+
+    def to_json(self):
+        return {"start": self.start, "goal": self.goal, "name": self.name,
+                "time": self.seconds, "clicks": self.clicks,
+                "splits": [[time, title] for time, title in zip(self.times, self.titles)]}
+
+    @staticmethod
+    def from_json(record):
+        return Ghost(record["start"], record["goal"], record.get("name", "ghost"),
+                     record["time"], record["clicks"], record.get("splits", []))
+
+
+'''
+Name: GhostStore
+Description: Append-only ghost file with the best ghost of each round kept in memory
+Attributes: filename, best
+Methods: add, best_for, load
+'''
+
+class GhostStore:
+    def __init__(self, filename=GHOST_FILE):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.best = {}
+        self.load()
+
+    def _key(self, start, goal):
+        return title_key(start), title_key(goal)
+
+    def _consider(self, ghost):
+        key = self._key(ghost.start, ghost.goal)
+        current = self.best.get(key)
+        if current is None or ghost.seconds < current.seconds:
+            self.best[key] = ghost
+
+    def load(self):
+        try:
+            with open(self.filename, mode='r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        self._consider(Ghost.from_json(json.loads(line)))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # A torn last line from an interrupted write
+        except FileNotFoundError:
+            pass
+
+    def add(self, ghost):
+        line = json.dumps(ghost.to_json()) + "\n"
+        with self.lock:
+            with open(self.filename, mode='a', encoding='utf-8') as file:
+                file.write(line)
+            self._consider(ghost)
+
+    '''
+    The fastest ghost from start to goal, or None if nobody has recorded one
+    '''
+
+    def best_for(self, start, goal):
+        with self.lock:
+            return self.best.get(self._key(start, goal))
+
+
+_defaultStore = None
+
+'''
+Returns the GhostStore for GHOST_FILE, loaded once per process
+'''
+def default_ghosts():
+    global _defaultStore
+    if _defaultStore is None:
+        _defaultStore = GhostStore(GHOST_FILE)
+    return _defaultStore
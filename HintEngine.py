@@ -0,0 +1,313 @@
+'''
+HintEngine - ranks the links on a page by how close each article is to the goal
+Every article has a precomputed unit vector, stored as a memory-mapped float16 matrix, so
+ranking a page is one gather of its links' rows and one dot product with the goal's row,
+well under a millisecond for a typical page. Titles are found through a sorted table of
+64-bit title hashes searched in one vectorised call, so nothing is parsed at load time
+and the engine runs fully offline.
+
+Vectors can be built from the link index: each article becomes a TF-IDF weighted bag of
+the articles it links to and is linked from, folded into a fixed number of dimensions by
+feature hashing, so articles that share neighbours point the same way. Vectors from any
+other model can be imported from a "Title<TAB>v1 v2 ..." file instead.
+
+Building vectors from a link graph (see LinkGraph.py):
+    python HintEngine.py build linkgraph.bin article_vectors.bin [dimensions]
+Importing vectors computed elsewhere:
+    python HintEngine.py import vectors.tsv article_vectors.bin
+Ranking links:
+    python HintEngine.py rank article_vectors.bin "Goal title" "Link 1" "Link 2" ...
+Timing rankings of pages of 500 links:
+    python HintEngine.py --benchmark article_vectors.bin
+'''
+
+import hashlib
+import mmap
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import *
+
+from WikiTitles import canonical_title
+
+VECTORS_FILE = "article_vectors.bin"
+
+# File layout: header, then 8 byte aligned sections: title hashes (uint64, sorted), the
+# row of each hash (uint32), and the vectors (float16, one row per article)
+MAGIC = b"WRAV"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQ")
+
+DIMENSIONS = 128
+# Articles processed per block while building, to bound the temporary float32 matrix
+BUILD_BLOCK = 16384
+# Links shown in the hint panel
+HINT_COUNT = 10
+
+
+'''
+64-bit hash of a canonical title, the key of the title table
+'''
+def title_hash(title):
+    return int.from_bytes(hashlib.blake2b(title.encode('utf-8'), digest_size=8).digest(),
+                          'little')
+
+
+'''
+Name: HintEngine
+Description: Read-only view of a vector file written by write_vectors
+Attributes: count, dimensions, matrix
+Methods: rows, vector, rank
+'''
+
+class HintEngine:
+    def __init__(self, filename=VECTORS_FILE, resolver=None):
+        self.filename = filename
+        # Follows links that are redirects to the article they point at, when given
+        self.resolver = resolver
+        with open(filename, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.dimensions, _, self.count, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"'{filename}' is not a version {VERSION} article vector file")
+        offset = HEADER.size
+        self.hashes = np.frombuffer(self.map, dtype=np.uint64, count=self.count, offset=offset)
+        offset += 8 * self.count
+        self.rowIds = np.frombuffer(self.map, dtype=np.uint32, count=self.count, offset=offset)
+        offset += 4 * self.count
+        offset += -offset % 8
+        self.matrix = np.frombuffer(self.map, dtype=np.float16, count=self.count * self.dimensions,
+                                    offset=offset).reshape(self.count, self.dimensions)
+
+    def close(self):
+        del self.hashes, self.rowIds, self.matrix
+        self.map.close()
+
+    '''
+    Row of each title in the matrix, -1 for titles without a vector
+    '''
+
+    def rows(self, titles):
+        if self.resolver is not None:
+            titles = [self.resolver.target_title(title) for title in titles]
+        if not self.count:
+            return np.full(len(titles), -1, dtype=np.int64)
+        wanted = np.fromiter((title_hash(title) for title in titles), dtype=np.uint64,
+                             count=len(titles))
+        positions = np.minimum(np.searchsorted(self.hashes, wanted), self.count - 1)
+        found = self.hashes[positions] == wanted
+        return np.where(found, self.rowIds[positions].astype(np.int64), -1)
+
+    def vector(self, title):
+        row = self.rows([title])[0]
+        return None if row < 0 else self.matrix[row].astype(np.float32)
+
+    '''
+    Titles sorted by cosine similarity to goal, best first, as (title, score) pairs.
+    Titles without a vector come last with a score of None
+    '''
+
+    def rank(self, goal, titles):
+        titles = list(titles)
+        goalVector = self.vector(canonical_title(goal))
+        rows = self.rows(titles)
+        known = np.flatnonzero(rows >= 0)
+        if goalVector is None or not len(known):
+            return [(title, None) for title in titles]
+        scores = self.matrix[rows[known]].astype(np.float32) @ goalVector
+        order = known[np.argsort(-scores, kind='stable')]
+        ranked = [(titles[index], float(score))
+                  for index, score in zip(order, np.sort(scores)[::-1])]
+        missing = np.flatnonzero(rows < 0)
+        return ranked + [(titles[index], None) for index in missing]
+
+
+'''
+Write a vector file from a list of titles and the matching rows, given as an iterable
+of float matrix blocks in title order. Rows are scaled to unit length, so dot products
+are cosine similarities
+'''
+def write_vectors(titles, blocks, dimensions, filename=VECTORS_FILE, nodeCount=0):
+    hashes = np.fromiter((title_hash(title) for title in titles), dtype=np.uint64,
+                         count=len(titles))
+    order = np.argsort(hashes, kind='stable')
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, dimensions, 0, len(titles), nodeCount))
+        file.write(hashes[order].tobytes())
+        file.write(order.astype(np.uint32).tobytes())
+        file.write(b'\0' * (-file.tell() % 8))
+        for block in blocks:
+            block = np.asarray(block, dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            block = np.divide(block, norms, out=np.zeros_like(block), where=norms > 0)
+            file.write(block.astype(np.float16).tobytes())
+    return len(titles)
+
+
+'''
+Hashed TF-IDF vectors for every article of a link graph, yielded in blocks of
+BUILD_BLOCK rows. The features of an article are its out-links and in-links, each
+weighted by the inverse of how many articles share it, and the article itself, so an
+article also points towards the pages that link to it
+'''
+def link_vectors(graph, dimensions=DIMENSIONS):
+    nodeCount = graph.nodeCount
+    fwdOffsets = np.frombuffer(graph.fwdOffsets, dtype=np.uint64).astype(np.int64)
+    fwdTargets = np.frombuffer(graph.fwdTargets, dtype=np.uint32)
+    revOffsets = np.frombuffer(graph.revOffsets, dtype=np.uint64).astype(np.int64)
+    revSources = np.frombuffer(graph.revSources, dtype=np.uint32)
+    degree = np.diff(fwdOffsets) + np.diff(revOffsets)
+    idf = np.log((nodeCount + 1) / (degree + 1)).astype(np.float32)
+    features = np.arange(nodeCount, dtype=np.uint64)
+    # Each feature lands in one bucket with a random sign, so collisions tend to cancel
+    buckets = ((features * np.uint64(2654435761)) % np.uint64(dimensions)).astype(np.int64)
+    signs = np.where((features * np.uint64(40503)) >> np.uint64(11) & np.uint64(1), 1.0, -1.0)
+    weights = (signs * idf).astype(np.float32)
+
+    for first in range(0, nodeCount, BUILD_BLOCK):
+        last = min(first + BUILD_BLOCK, nodeCount)
+        block = np.zeros((last - first) * dimensions, dtype=np.float64)
+        for offsets, neighbours in ((fwdOffsets, fwdTargets), (revOffsets, revSources)):
+            links = neighbours[offsets[first]:offsets[last]]
+            owners = np.repeat(np.arange(last - first), np.diff(offsets[first:last + 1]))
+            block += np.bincount(owners * dimensions + buckets[links], weights=weights[links],
+                                 minlength=block.size)
+        own = np.arange(last - first)
+        block[own * dimensions + buckets[first:last]] += weights[first:last]
+        yield block.reshape(-1, dimensions)
+
+
+def build_from_graph(graph, filename=VECTORS_FILE, dimensions=DIMENSIONS):
+    titles = [graph.title(node) for node in range(graph.nodeCount)]
+    return write_vectors(titles, link_vectors(graph, dimensions), dimensions, filename,
+                         graph.nodeCount)
+
+
+'''
+Read "Title<TAB>v1 v2 ..." lines of vectors computed elsewhere
+'''
+def import_vectors(source, filename=VECTORS_FILE):
+    titles = []
+    rows = []
+    with open(source, mode='r', encoding='utf-8') as file:
+        for line in file:
+            title, _, values = line.rstrip('\n').partition('\t')
+            if title and values and not title.startswith('#'):
+                titles.append(canonical_title(title))
+                rows.append(np.array(values.split(), dtype=np.float32))
+    return write_vectors(titles, [np.vstack(rows)], len(rows[0]) if rows else 0, filename)
+
+
+'''
+Name: HintDock
+Description: Dockable panel listing the current page's links closest to the goal
+Attributes: engine, list, timing
+Methods: clear, show_links
+'''
+
+class HintDock(QDockWidget):
+    def __init__(self, engine, parent=None):
+        super().__init__("Hints", parent)
+        self.engine = engine
+        self.setObjectName("HintDock")
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        self.list = QListWidget()
+        self.list.setFont(QFont("MS Gothic", 10))
+        layout.addWidget(self.list)
+        self.timing = QLabel()
+        self.timing.setAlignment(Qt.AlignRight)
+        layout.addWidget(self.timing)
+        self.setWidget(panel)
+
+    def clear(self):
+        self.list.clear()
+        self.timing.clear()
+
+    '''
+    Rank the canonical titles linked from a page (see LinkBridge) against goal
+    '''
+
+    def show_links(self, goal, titles):
+        start = time.perf_counter()
+        ranked = self.engine.rank(goal, titles)
+        elapsed = time.perf_counter() - start
+        self.list.clear()
+        for title, score in ranked[:HINT_COUNT]:
+            if score is None:
+                break
+            self.list.addItem("%.2f  %s" % (score, title))
+        self.timing.setText("%d links ranked in %.1f ms" % (len(ranked), elapsed * 1000))
+
+
+_defaultEngine = None
+_defaultLoaded = False
+_defaultLock = threading.Lock()
+
+'''
+Returns the HintEngine for VECTORS_FILE, or None if no vectors have been built. Opened
+once per process, whether the GUI or the prefetcher asks first; a missing file is not
+looked for again
+'''
+def default_engine():
+    global _defaultEngine, _defaultLoaded
+    with _defaultLock:
+        if not _defaultLoaded:
+            from TitleResolver import default_resolver
+            try:
+                _defaultEngine = HintEngine(VECTORS_FILE, default_resolver())
+            except (FileNotFoundError, ValueError):
+                _defaultEngine = None
+            _defaultLoaded = True
+    return _defaultEngine
+
+
+'''
+Time ranking pages of links drawn at random from the vector file's titles
+'''
+def benchmark(filename, titles, pages=200, links=500, seed=0):
+    rng = np.random.default_rng(seed)
+    engine = HintEngine(filename)
+    times = []
+    for _ in range(pages):
+        chosen = rng.choice(len(titles), size=links + 1)
+        start = time.perf_counter()
+        engine.rank(titles[chosen[0]], [titles[index] for index in chosen[1:]])
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {"pages": pages, "links_per_page": links,
+            "median_ms": times[len(times) // 2] * 1000,
+            "p95_ms": times[int(len(times) * 0.95)] * 1000,
+            "vectors": engine.count, "dimensions": engine.dimensions}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        from LinkGraph import LinkGraph
+        with LinkGraph(sys.argv[2]) as graph:
+            start = time.perf_counter()
+            count = build_from_graph(graph, sys.argv[3],
+                                     int(sys.argv[4]) if len(sys.argv) > 4 else DIMENSIONS)
+        print(f"Wrote {count} vectors to '{sys.argv[3]}' in {time.perf_counter() - start:.1f} s")
+    elif len(sys.argv) == 4 and sys.argv[1] == "import":
+        print(f"Wrote {import_vectors(sys.argv[2], sys.argv[3])} vectors to '{sys.argv[3]}'")
+    elif len(sys.argv) >= 5 and sys.argv[1] == "rank":
+        links = [canonical_title(title) for title in sys.argv[4:]]
+        for title, score in HintEngine(sys.argv[2]).rank(sys.argv[3], links):
+            print("%s  %s" % ("  -  " if score is None else "%.3f" % score, title))
+    elif len(sys.argv) >= 3 and sys.argv[1] == "--benchmark":
+        from LinkGraph import default_graph
+        graph = default_graph()
+        if graph is None:
+            sys.exit("The benchmark draws titles from the link graph; build one first")
+        titles = [graph.title(node) for node in range(graph.nodeCount)]
+        for key, value in benchmark(sys.argv[2], titles).items():
+            print(f"{key}: {value}")
+    else:
+        print(__doc__)
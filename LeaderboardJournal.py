@@ -0,0 +1,470 @@
+'''
+LeaderboardJournal - a file-backed leaderboard for setups where SQLite is not wanted
+Each finish is appended to a journal as one JSON line while holding a lock file, so
+several copies of the game can record at once and nothing is ever rewritten in place.
+Appends reach the OS immediately; a background thread fsyncs them in batches. After
+COMPACT_RECORDS finishes the journal is folded into a snapshot sorted by time: the new
+snapshot is written to a temporary file, fsynced and renamed over the old one, and
+appends move on to a new journal file for the snapshot's generation. A crash at any
+point leaves either the old state or the new one, and a torn last line is skipped.
+The fastest TOP_CACHE rounds are kept in a heap and every round is indexed by player and
+by (start, goal), so recording a finish is O(log TOP_CACHE), reading the top of the board
+or its first pages needs no sort, a player's or a pair's best times look only at their
+own rounds, and finishes from other processes are read incrementally.
+Same interface as LeaderboardStore; start the game with --journal to use it.
+'''
+
+from collections import defaultdict
+import csv
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from LeaderboardStore import LEADERBOARD_CSV, PATH_SEPARATOR, SORT_COLUMNS, encode_splits
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_FILE = "leaderboard.journal"
+
+# Journal records folded into the snapshot at a time
+COMPACT_RECORDS = 5000
+
+# Unsynced appends are fsynced after this many records or this many seconds
+FSYNC_BATCH = 32
+FSYNC_INTERVAL = 0.5
+
+# Fastest rounds kept in the in-memory heap for top() and the first pages of page()
+TOP_CACHE = 1000
+
+FIELDS = ("id", "name", "time", "start", "goal", "clicks", "par", "recorded", "path", "mode",
+          "splits")
+
+
+'''
+Name: FileLock
+Description: Exclusive lock on a lock file, shared between processes. A context manager
+'''
+
+class FileLock:
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'a+b')
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        else:
+            self.file.seek(0)
+            # LK_LOCK retries for 10 seconds before giving up
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *_):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        self.file.close()
+
+
+'''
+Name: LeaderboardJournal
+Description: Append-only journal plus sorted snapshot, read into memory
+Attributes: filename, snapshotFile, lockFile, rows
+Methods: add, top, page, count, games, migrate_csv, compact, sync, close
+'''
+
+class LeaderboardJournal:
+    def __init__(self, filename=JOURNAL_FILE, compactRecords=COMPACT_RECORDS):
+        base = os.path.splitext(filename)[0]
+        self.filename = filename
+        self.snapshotFile = base + ".snapshot"
+        self.lock = FileLock(base + ".lock")
+        self.compactRecords = compactRecords
+        self.journal = None
+        self.unsynced = 0
+        self.syncLock = threading.RLock()
+        self.closed = threading.Event()
+        with self.lock:
+            self.reload()
+        self.syncer = threading.Thread(target=self._sync_loop, name="JournalSync", daemon=True)
+        self.syncer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        if not self.closed.is_set():
+            self.closed.set()
+            self.syncer.join()
+            self.sync()
+            self.journal.close()
+            self.lock.close()
+
+    # Loading
+
+    def _journal_name(self, generation):
+        return "%s.%d" % (self.filename, generation)
+
+    def _snapshot_stat(self):
+        try:
+            stat = os.stat(self.snapshotFile)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    '''
+    Read the snapshot and the journal from scratch. Called with the lock held, at start
+    and whenever another process has compacted the journal
+    '''
+
+    def reload(self):
+        self.rows = []
+        self.meta = {}
+        # Max-heap of the TOP_CACHE fastest rows, and the same rows fastest first once asked
+        self.best = []
+        self.bestSorted = None
+        # Every row in (time, id) order, and rows that arrived since it was last merged
+        self.byTime = []
+        self.unmerged = []
+        # Rows of each player ("name", name) and each pair ("pair", start, goal), fastest
+        # first once sorted, and the keys whose rows arrived out of order since
+        self.indexes = defaultdict(list)
+        self.unsortedIndexes = set()
+        self.sorted = {}
+        self.nextId = 1
+        self.generation = 0
+        self.snapshotStat = self._snapshot_stat()
+        try:
+            with open(self.snapshotFile, mode='r', encoding='utf-8') as file:
+                header = json.loads(file.readline() or '{}')
+                self.generation = header.get("generation", 0)
+                self.meta = header.get("meta", {})
+                for line in file:
+                    self._apply(json.loads(line))
+        except FileNotFoundError:
+            pass
+        self._open_journal()
+
+    # Open (or start) the journal of the current generation and read it. Journals of
+    # earlier generations are already in the snapshot and are removed
+    def _open_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self._journal_name(self.generation), mode='a+b')
+        self.offset = 0
+        self.journalRecords = 0
+        self._read_journal()
+        if self.generation:
+            try:
+                os.remove(self._journal_name(self.generation - 1))
+            except OSError:
+                pass  # Already gone, or still open in another process on Windows
+
+    '''
+    Apply records other processes have appended since we last looked. If another process
+    has compacted the journal (a new snapshot), reload everything
+    '''
+
+    def _catch_up(self):
+        if self._snapshot_stat() != self.snapshotStat:
+            self.reload()
+        else:
+            self._read_journal()
+
+    def _read_journal(self):
+        self.journal.seek(self.offset)
+        data = self.journal.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            record = _parse(line)
+            if record is not None:
+                self._apply(record)
+                self.journalRecords += 1
+        self.offset += end
+
+    def _apply(self, record):
+        if record.get("op") == "meta":
+            self.meta[record["key"]] = record["value"]
+            return
+        row = {field: record.get(field) for field in FIELDS}
+        self.rows.append(row)
+        self.nextId = max(self.nextId, row["id"] + 1)
+        self.sorted.clear()
+        self.unmerged.append(row)
+        for key in (("name", row["name"]), ("pair", row["start"], row["goal"])):
+            rows = self.indexes[key]
+            if rows and _time_key(rows[-1]) > _time_key(row):
+                self.unsortedIndexes.add(key)
+            rows.append(row)
+        # Keyed so the slowest of the fastest rows is on top
+        entry = (-row["time"], -row["id"], row)
+        if len(self.best) < TOP_CACHE:
+            heapq.heappush(self.best, entry)
+            self.bestSorted = None
+        elif entry > self.best[0]:
+            heapq.heapreplace(self.best, entry)
+            self.bestSorted = None
+
+    def _fastest(self):
+        if self.bestSorted is None:
+            self.bestSorted = [row for _, _, row in sorted(self.best, reverse=True)]
+        return self.bestSorted
+
+    # Every row in time order. Rows that arrived since the last call are sorted and
+    # merged in one pass, so a burst of finishes costs one O(n) merge, not one each
+    def _by_time(self):
+        if self.unmerged:
+            self.unmerged.sort(key=_time_key)
+            self.byTime = list(heapq.merge(self.byTime, self.unmerged, key=_time_key))
+            self.unmerged = []
+        return self.byTime
+
+    # Writing
+
+    def _append(self, records):
+        with self.lock:
+            self._catch_up()
+            return self._append_locked(records)
+
+    '''
+    Append records to the journal. The lock must be held and the journal caught up, so
+    ids stay unique across processes. Returns the records as written
+    '''
+
+    def _append_locked(self, records):
+        self.journal.seek(0, os.SEEK_END)
+        if self.journal.tell() > self.offset:
+            # A torn line from a crashed writer: end it so ours starts on a fresh line
+            self.journal.write(b'\n')
+        for record in records:
+            if record.get("op") != "meta":
+                record["id"] = self.nextId
+                self.nextId += 1
+        self.journal.write(b"".join(json.dumps(record, ensure_ascii=False).encode('utf-8')
+                                    + b'\n' for record in records))
+        self.journal.flush()
+        self.offset = self.journal.tell()
+        for record in records:
+            self._apply(record)
+            self.journalRecords += 1
+        with self.syncLock:
+            self.unsynced += len(records)
+            syncNow = self.unsynced >= FSYNC_BATCH
+        if syncNow:
+            self.sync()
+        if self.journalRecords >= self.compactRecords:
+            self._compact()
+        return records
+
+    '''
+    Record a finished round and return its id
+    path is the list of article titles the player visited, start and goal included.
+    mode and splits are stored as LeaderboardStore stores them
+    '''
+
+    def add(self, name, seconds, start=None, goal=None, clicks=None, par=None, recorded=None,
+            path=None, mode=None, splits=None):
+        record = {"op": "add", "name": name, "time": seconds, "start": start, "goal": goal,
+                  "clicks": clicks, "par": par,
+                  "recorded": time.time() if recorded is None else recorded,
+                  "path": PATH_SEPARATOR.join(path) if path else None,
+                  "mode": mode, "splits": encode_splits(splits)}
+        return self._append([record])[0]["id"]
+
+    def sync(self):
+        with self.syncLock:
+            if not self.unsynced or self.journal is None or self.journal.closed:
+                return
+            self.unsynced = 0
+            os.fsync(self.journal.fileno())
+
+    def _sync_loop(self):
+        while not self.closed.wait(FSYNC_INTERVAL):
+            try:
+                self.sync()
+            except (OSError, ValueError):
+                pass  # Journal swapped or closed underneath us; the next write syncs
+
+    '''
+    Fold the journal into a new time-sorted snapshot of the next generation, then move on
+    to that generation's empty journal
+    '''
+
+    def compact(self):
+        with self.lock:
+            self._catch_up()
+            self._compact()
+
+    def _compact(self):
+        self.sync()
+        rows = list(self._by_time())
+        header = {"generation": self.generation + 1, "meta": self.meta}
+        try:
+            self._replace(self.snapshotFile, [header] + rows)
+        except PermissionError:
+            return  # Windows will not replace a snapshot another process is reading
+        self.generation += 1
+        self.rows = rows
+        self.snapshotStat = self._snapshot_stat()
+        self._open_journal()
+
+    # Write lines to a temporary file, fsync it and rename it over filename
+    def _replace(self, filename, records):
+        temporary = "%s.%d.tmp" % (filename, os.getpid())
+        with open(temporary, mode='wb') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, filename)
+
+    # Reading
+
+    def _refresh(self):
+        with self.lock:
+            self._catch_up()
+
+    def _matches(self, row, name, start, goal, search):
+        if (name is not None and row["name"] != name or start is not None and row["start"] != start
+                or goal is not None and row["goal"] != goal):
+            return False
+        if search:
+            needle = search.casefold()
+            return any(needle in (row[field] or "").casefold()
+                       for field in ("name", "start", "goal"))
+        return True
+
+    # Rows that can match the filters, fastest first: the smaller of the player's and the
+    # pair's rounds, or None when neither filter is given. An index is sorted on first use
+    # after rows arrived out of order
+    def _candidates(self, name, start, goal):
+        keys = []
+        if name is not None:
+            keys.append(("name", name))
+        if start is not None and goal is not None:
+            keys.append(("pair", start, goal))
+        if not keys:
+            return None
+        key = min(keys, key=lambda key: len(self.indexes.get(key, ())))
+        if key not in self.indexes:
+            return []
+        if key in self.unsortedIndexes:
+            self.indexes[key].sort(key=_time_key)
+            self.unsortedIndexes.discard(key)
+        return self.indexes[key]
+
+    '''
+    The k fastest rounds, optionally only for one player and/or one (start, goal) pair
+    Rows are dicts with the same keys as LeaderboardStore's scores table
+    '''
+
+    def top(self, k=10, name=None, start=None, goal=None):
+        self._refresh()
+        if name is None and start is None and goal is None:
+            return self._fastest()[:k] if k <= TOP_CACHE else self._by_time()[:k]
+        candidates = self._candidates(name, start, goal)
+        if candidates is None:
+            matching = (row for row in self.rows if self._matches(row, name, start, goal, None))
+            return heapq.nsmallest(k, matching, key=_time_key)
+        return list(itertools.islice((row for row in candidates
+                                      if self._matches(row, name, start, goal, None)), k))
+
+    '''
+    One page of the leaderboard, ordered like LeaderboardStore.page. The default order,
+    fastest first without a search, is served from the heap for the first TOP_CACHE rows
+    and from the merged time order beyond them. Other columns, descending order and
+    searches fall back to a full sort, cached until new finishes arrive
+    '''
+
+    def page(self, offset=0, limit=50, orderBy="time", descending=False, search=None):
+        if orderBy not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort the leaderboard by '{orderBy}'")
+        self._refresh()
+        if orderBy == "time" and not descending and not search:
+            if offset + limit <= TOP_CACHE:
+                return self._fastest()[offset:offset + limit]
+            return self._by_time()[offset:offset + limit]
+        key = (orderBy, descending, search)
+        if key not in self.sorted:
+            rows = [row for row in self.rows if self._matches(row, None, None, None, search)]
+            rows.sort(key=_time_key)
+            # Stable, so ties stay in time order; NULLs first ascending, last descending
+            rows.sort(key=lambda row: (row[orderBy] is not None, row[orderBy] or 0)
+                      if orderBy in ("time", "clicks", "par", "recorded")
+                      else (row[orderBy] is not None, row[orderBy] or ""), reverse=descending)
+            self.sorted[key] = rows
+        return self.sorted[key][offset:offset + limit]
+
+    def count(self, name=None, start=None, goal=None, search=None):
+        self._refresh()
+        if name is None and start is None and goal is None and not search:
+            return len(self.rows)
+        candidates = self._candidates(name, start, goal)
+        return sum(1 for row in (self.rows if candidates is None else candidates)
+                   if self._matches(row, name, start, goal, search))
+
+    '''
+    Every single goal round with a start and goal, as
+    (start, goal, time, clicks, par, path) tuples
+    '''
+
+    def games(self):
+        self._refresh()
+        return [(row["start"], row["goal"], row["time"], row["clicks"], row["par"], row["path"])
+                for row in self.rows if row["start"] is not None and row["goal"] is not None
+                and row["mode"] in (None, "single")]
+
+    '''
+    Import a leaderboard.csv written by earlier versions of the game (Rank, Name, Time),
+    once per file. Returns the number of rows imported
+    '''
+
+    def migrate_csv(self, csvFile=LEADERBOARD_CSV):
+        key = "migrated:" + os.path.abspath(csvFile)
+        rows = []
+        try:
+            recorded = os.path.getmtime(csvFile)
+            with open(csvFile, mode='r', newline='') as file:
+                reader = csv.reader(file)
+                next(reader, None)  # Skip the header row
+                for row in reader:
+                    rows.append({"op": "add", "name": row[1], "time": float(row[2]),
+                                 "recorded": recorded})
+        except FileNotFoundError:
+            return 0
+        except (ValueError, IndexError):
+            print(f"Could not migrate '{csvFile}'. Ensure the CSV file has valid format.")
+            return 0
+        # Checked under the lock, so two games opening the journal at once cannot both
+        # import the file
+        with self.lock:
+            self._catch_up()
+            if key in self.meta:
+                return 0
+            self._append_locked(rows + [{"op": "meta", "key": key, "value": len(rows)}])
+        return len(rows)
+
+
+def _time_key(row):
+    return row["time"], row["id"]
+
+
+def _parse(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
@@ -0,0 +1,239 @@
+'''
+LeaderboardStore - an indexed SQLite backend for player times
+Each finish is a single indexed INSERT instead of a rewrite of the whole CSV, and the
+leaderboard reads only the rows it shows. SQLite's WAL journal lets several copies of
+the game record results at the same time on a tournament night.
+The legacy leaderboard.csv is imported once, the first time the store is opened.
+Each round also keeps the route the player took, as the titles visited in order, and for
+relay and scavenger rounds the time each checkpoint was reached.
+'''
+
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+LEADERBOARD_DB = "leaderboard.db"
+LEADERBOARD_CSV = "leaderboard.csv"
+
+# "sqlite", or "journal" for the file-backed LeaderboardJournal (pass --journal)
+LEADERBOARD_BACKEND = "journal" if "--journal" in sys.argv else "sqlite"
+
+# Columns the leaderboard can be sorted by
+SORT_COLUMNS = ("name", "time", "start", "goal", "clicks", "par", "recorded")
+
+# Separates the titles of a stored route; article titles cannot contain a tab
+PATH_SEPARATOR = "\t"
+
+# Columns added after the first release, created on databases that predate them
+ADDED_COLUMNS = ("path", "mode", "splits")
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    time REAL NOT NULL,
+    start TEXT,
+    goal TEXT,
+    clicks INTEGER,
+    par INTEGER,
+    recorded REAL NOT NULL,
+    path TEXT,
+    mode TEXT,
+    splits TEXT
+);
+CREATE INDEX IF NOT EXISTS scores_time ON scores (time);
+CREATE INDEX IF NOT EXISTS scores_name_time ON scores (name, time);
+CREATE INDEX IF NOT EXISTS scores_pair_time ON scores (start, goal, time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+'''
+Name: LeaderboardStore
+Description: One connection to the scores database, safe to share with other processes
+Attributes: filename, connection
+Methods: add, top, page, count, games, migrate_csv, close
+'''
+
+class LeaderboardStore:
+    def __init__(self, filename=LEADERBOARD_DB, timeout=10.0):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._add_columns()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    # Databases created before routes or splits were recorded lack their columns
+    def _add_columns(self):
+        columns = [row["name"] for row in self.connection.execute("PRAGMA table_info(scores)")]
+        for column in ADDED_COLUMNS:
+            if column in columns:
+                continue
+            try:
+                with self.connection:
+                    self.connection.execute("ALTER TABLE scores ADD COLUMN %s TEXT" % column)
+            except sqlite3.OperationalError:
+                pass  # Another process added it first
+
+    '''
+    Record a finished round and return its row id
+    path is the list of article titles the player visited, start and goal included.
+    mode and splits describe relay and scavenger rounds (see encode_splits)
+    '''
+
+    def add(self, name, seconds, start=None, goal=None, clicks=None, par=None, recorded=None,
+            path=None, mode=None, splits=None):
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO scores (name, time, start, goal, clicks, par, recorded, path, "
+                "mode, splits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, seconds, start, goal, clicks, par,
+                 time.time() if recorded is None else recorded,
+                 PATH_SEPARATOR.join(path) if path else None, mode, encode_splits(splits)))
+        return cursor.lastrowid
+
+    '''
+    Builds the WHERE clause shared by the read queries. Filters left as None are ignored
+    '''
+
+    def _where(self, name, start, goal, search=None):
+        clauses = []
+        params = []
+        for column, value in (("name", name), ("start", start), ("goal", goal)):
+            if value is not None:
+                clauses.append(column + " = ?")
+                params.append(value)
+        if search:
+            # Player name, start or goal containing the text, case-insensitively
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace(
+                "_", "\\_") + "%"
+            clauses.append("(name LIKE ? ESCAPE '\\' OR start LIKE ? ESCAPE '\\' "
+                           "OR goal LIKE ? ESCAPE '\\')")
+            params.extend((pattern, pattern, pattern))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    '''
+    The k fastest rounds, optionally only for one player and/or one (start, goal) pair
+    Rows are sqlite3.Row objects with the columns of the scores table
+    '''
+
+    def top(self, k=10, name=None, start=None, goal=None):
+        where, params = self._where(name, start, goal)
+        return self.connection.execute(
+            "SELECT * FROM scores" + where + " ORDER BY time, id LIMIT ?",
+            params + [k]).fetchall()
+
+    '''
+    One page of the leaderboard: limit rows from offset, ordered by one of SORT_COLUMNS
+    (ties broken by time, then id), optionally only rows matching search
+    '''
+
+    def page(self, offset=0, limit=50, orderBy="time", descending=False, search=None):
+        if orderBy not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort the leaderboard by '{orderBy}'")
+        where, params = self._where(None, None, None, search)
+        direction = " DESC" if descending else ""
+        return self.connection.execute(
+            "SELECT * FROM scores" + where + " ORDER BY " + orderBy + direction +
+            ", time, id LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+
+    def count(self, name=None, start=None, goal=None, search=None):
+        where, params = self._where(name, start, goal, search)
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM scores" + where, params).fetchone()[0]
+
+    '''
+    Every single goal round with a start and goal, as tuples of
+    (start, goal, time, clicks, par, path) with path still PATH_SEPARATOR-joined.
+    Plain tuples rather than sqlite3.Row, since analytics reads every row
+    '''
+
+    def games(self):
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        return cursor.execute(
+            "SELECT start, goal, time, clicks, par, path FROM scores "
+            "WHERE start IS NOT NULL AND goal IS NOT NULL "
+            "AND (mode IS NULL OR mode = 'single')").fetchall()
+
+    '''
+    Import a leaderboard.csv written by earlier versions of the game (Rank, Name, Time)
+    The import is recorded in the meta table so it only ever happens once per file.
+    Returns the number of rows imported
+    '''
+
+    def migrate_csv(self, csvFile=LEADERBOARD_CSV):
+        key = "migrated:" + os.path.abspath(csvFile)
+        rows = []
+        try:
+            with open(csvFile, mode='r', newline='') as file:
+                reader = csv.reader(file)
+                next(reader, None)  # Skip the header row
+                for row in reader:
+                    rows.append((row[1], float(row[2]), os.path.getmtime(csvFile)))
+        except FileNotFoundError:
+            return 0
+        except (ValueError, IndexError):
+            print(f"Could not migrate '{csvFile}'. Ensure the CSV file has valid format.")
+            return 0
+        # BEGIN IMMEDIATE takes the write lock first, so two games opening the store at
+        # once cannot both import the file
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            if self.connection.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+            self.connection.executemany(
+                "INSERT INTO scores (name, time, recorded) VALUES (?, ?, ?)", rows)
+            self.connection.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(len(rows))))
+        return len(rows)
+
+
+'''
+Stored form of a round's checkpoint splits, a list of (title, seconds): JSON text, or
+None for rounds without them
+'''
+def encode_splits(splits):
+    if not splits:
+        return None
+    return json.dumps([[title, round(seconds, 3)] for title, seconds in splits],
+                      ensure_ascii=False)
+
+
+def decode_splits(text):
+    return [(title, seconds) for title, seconds in json.loads(text)] if text else []
+
+
+_defaultStore = None
+
+'''
+Returns the store shared by the game windows, migrating leaderboard.csv on first use
+Both backends have the same interface
+'''
+def default_store():
+    global _defaultStore
+    if _defaultStore is None:
+        if LEADERBOARD_BACKEND == "journal":
+            from LeaderboardJournal import JOURNAL_FILE, LeaderboardJournal
+            _defaultStore = LeaderboardJournal(JOURNAL_FILE)
+        else:
+            _defaultStore = LeaderboardStore(LEADERBOARD_DB)
+        _defaultStore.migrate_csv(LEADERBOARD_CSV)
+    return _defaultStore
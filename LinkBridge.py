@@ -0,0 +1,86 @@
+'''
+LinkBridge - the article links of each race page, sent from the page to Python in one batch
+A script injected into every race page collects the page's /wiki/ links once the document
+is ready, drops repeats, and makes a single call over a QWebChannel with the whole list.
+The script runs in an isolated JavaScript world, so Wikipedia's own scripts can neither
+see nor call the bridge. Python then canonicalises the titles in one pass (see
+WikiTitles.article_links); nothing parses HTML or fetches the page again.
+'''
+
+from PyQt5.QtCore import QFile, QIODevice, QObject, pyqtSignal, pyqtSlot
+from PyQt5.QtWebChannel import QWebChannel
+from PyQt5.QtWebEngineWidgets import QWebEngineScript
+
+# World the snapshot script and the channel live in, apart from the page's own scripts
+BRIDGE_WORLD = QWebEngineScript.ApplicationWorld
+BRIDGE_NAME = "linkBridge"
+
+SNAPSHOT_SCRIPT = """
+new QWebChannel(qt.webChannelTransport, function (channel) {
+    var seen = new Set();
+    var hrefs = [];
+    for (const link of document.querySelectorAll('a[href^="/wiki/"]')) {
+        var href = link.getAttribute('href');
+        if (!seen.has(href)) {
+            seen.add(href);
+            hrefs.push(href);
+        }
+    }
+    channel.objects.%s.snapshot(location.href, hrefs);
+});
+""" % BRIDGE_NAME
+
+_channelScript = None
+
+
+'''
+Source of Qt's qwebchannel.js, which the snapshot script needs, read once from Qt's resources
+'''
+def channel_script():
+    global _channelScript
+    if _channelScript is None:
+        file = QFile(":/qtwebchannel/qwebchannel.js")
+        if not file.open(QIODevice.ReadOnly):
+            raise RuntimeError("qwebchannel.js is missing from the QtWebChannel resources")
+        _channelScript = bytes(file.readAll()).decode('utf-8')
+        file.close()
+    return _channelScript
+
+
+'''
+Name: LinkBridge
+Description: The Python end of the channel. Receives one snapshot of hrefs per page load
+Attributes: snapshotReady, snapshots
+Methods: snapshot
+'''
+
+class LinkBridge(QObject):
+    # (page URL, hrefs in page order without repeats)
+    snapshotReady = pyqtSignal(str, list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.snapshots = 0
+
+    @pyqtSlot(str, 'QVariantList')
+    def snapshot(self, url, hrefs):
+        self.snapshots += 1
+        self.snapshotReady.emit(url, [href for href in hrefs if isinstance(href, str)])
+
+
+'''
+Set up the channel and snapshot script on a QWebEnginePage. Returns its LinkBridge
+'''
+def install_link_bridge(page):
+    bridge = LinkBridge(page)
+    channel = QWebChannel(page)
+    channel.registerObject(BRIDGE_NAME, bridge)
+    page.setWebChannel(channel, BRIDGE_WORLD)
+    script = QWebEngineScript()
+    script.setName("WikiRacingLinkSnapshot")
+    script.setSourceCode(channel_script() + SNAPSHOT_SCRIPT)
+    script.setInjectionPoint(QWebEngineScript.DocumentReady)
+    script.setWorldId(BRIDGE_WORLD)
+    script.setRunsOnSubFrames(False)
+    page.scripts().insert(script)
+    return bridge
@@ -0,0 +1,339 @@
+'''
+LinkGraph - an offline, memory-mapped index of Wikipedia article links
+The graph is stored as CSR (compressed sparse row) arrays of article IDs so that a
+query only touches the pages of the file it needs and nothing is parsed at load time.
+A bidirectional breadth-first search over the index gives the optimal click path ("par")
+between the start and goal of a round.
+
+Building an index from a tab separated dump (one "Source<TAB>Target" link per line):
+    python LinkGraph.py build links.tsv linkgraph.bin
+Querying it:
+    python LinkGraph.py path linkgraph.bin "Start title" "Goal title"
+Building one from the links players actually saw (the "links" events in telemetry):
+    python LinkGraph.py observed telemetry.jsonl linkgraph.bin
+Generating a small synthetic dump for local testing:
+    python LinkGraph.py synthetic links.tsv 10000 8
+'''
+
+from array import array
+import mmap
+import random
+import struct
+import sys
+
+from WikiTitles import canonical_title
+
+LINK_GRAPH_FILE = "linkgraph.bin"
+
+# File layout: header, then 8 byte aligned sections in the order listed in SECTIONS
+MAGIC = b"WRLG"
+VERSION = 1
+HEADER = struct.Struct("<4sIII7Q")
+SECTIONS = ("fwdOffsets", "fwdTargets", "revOffsets", "revSources",
+            "titleOffsets", "sortedIds", "titleBlob")
+
+
+'''
+Name: LinkGraph
+Description: Read-only view of an index written by build_link_graph
+Attributes: nodeCount, edgeCount
+Methods: lookup, title, links_from, links_to, shortest_path, par, close
+'''
+
+class LinkGraph:
+    def __init__(self, filename=LINK_GRAPH_FILE):
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.nodeCount, _, *offsets = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"'{filename}' is not a version {VERSION} link graph")
+        self.view = memoryview(self.map)
+        self.fwdOffsets = self._section(offsets[0], 'Q', self.nodeCount + 1)
+        self.edgeCount = self.fwdOffsets[self.nodeCount]
+        self.fwdTargets = self._section(offsets[1], 'I', self.edgeCount)
+        self.revOffsets = self._section(offsets[2], 'Q', self.nodeCount + 1)
+        self.revSources = self._section(offsets[3], 'I', self.edgeCount)
+        self.titleOffsets = self._section(offsets[4], 'Q', self.nodeCount + 1)
+        self.sortedIds = self._section(offsets[5], 'I', self.nodeCount)
+        self.titleBlob = self._section(offsets[6], 'B', self.titleOffsets[self.nodeCount])
+
+    def _section(self, start, typecode, count):
+        size = array(typecode).itemsize
+        return self.view[start:start + count * size].cast(typecode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return self.nodeCount
+
+    def close(self):
+        for name in SECTIONS:
+            getattr(self, name).release()
+        self.view.release()
+        self.map.close()
+
+    '''
+    Returns the UTF-8 encoded canonical title of an article ID
+    '''
+
+    def _title_bytes(self, node):
+        return bytes(self.titleBlob[self.titleOffsets[node]:self.titleOffsets[node + 1]])
+
+    def title(self, node):
+        return self._title_bytes(node).decode('utf-8')
+
+    '''
+    Binary search of the title table. Returns the article ID or None if the title is unknown
+    '''
+
+    def lookup(self, title):
+        key = canonical_title(title).encode('utf-8')
+        ids = self.sortedIds
+        lo, hi = 0, self.nodeCount
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._title_bytes(ids[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.nodeCount and self._title_bytes(ids[lo]) == key:
+            return ids[lo]
+        return None
+
+    def links_from(self, node):
+        return self.fwdTargets[self.fwdOffsets[node]:self.fwdOffsets[node + 1]]
+
+    def links_to(self, node):
+        return self.revSources[self.revOffsets[node]:self.revOffsets[node + 1]]
+
+    '''
+    Bidirectional BFS between two article IDs
+    Expands whichever frontier is currently smaller, so hub articles on one side do not
+    blow up the search. Returns the list of IDs from source to target, or None if the
+    goal cannot be reached
+    '''
+
+    def shortest_path(self, source, target, maxDepth=None):
+        if source == target:
+            return [source]
+        forward = {source: None}
+        backward = {target: None}
+        forwardFrontier = [source]
+        backwardFrontier = [target]
+        depth = 0
+        while forwardFrontier and backwardFrontier:
+            if maxDepth is not None and depth >= maxDepth:
+                return None
+            depth += 1
+            if len(forwardFrontier) <= len(backwardFrontier):
+                forwardFrontier, meet = self._expand(
+                    forwardFrontier, forward, backward, self.fwdOffsets, self.fwdTargets)
+            else:
+                backwardFrontier, meet = self._expand(
+                    backwardFrontier, backward, forward, self.revOffsets, self.revSources)
+            if meet is not None:
+                return self._join(meet, forward, backward)
+        return None
+
+    def _expand(self, frontier, seen, other, offsets, targets):
+        nextFrontier = []
+        for node in frontier:
+            for neighbour in targets[offsets[node]:offsets[node + 1]]:
+                if neighbour in seen:
+                    continue
+                seen[neighbour] = node
+                if neighbour in other:
+                    return nextFrontier, neighbour
+                nextFrontier.append(neighbour)
+        return nextFrontier, None
+
+    def _join(self, meet, forward, backward):
+        path = []
+        node = meet
+        while node is not None:
+            path.append(node)
+            node = forward[node]
+        path.reverse()
+        node = backward[meet]
+        while node is not None:
+            path.append(node)
+            node = backward[node]
+        return path
+
+    '''
+    Title based wrapper around shortest_path used by the game
+    Returns the list of titles on the optimal route, or None if either title is unknown
+    or the goal is unreachable
+    '''
+
+    def solve(self, start, goal, maxDepth=None):
+        source = self.lookup(start)
+        target = self.lookup(goal)
+        if source is None or target is None:
+            return None
+        path = self.shortest_path(source, target, maxDepth)
+        if path is None:
+            return None
+        return [self.title(node) for node in path]
+
+    '''
+    Number of clicks on the optimal route, or None if it cannot be determined
+    '''
+
+    def par(self, start, goal, maxDepth=None):
+        path = self.solve(start, goal, maxDepth)
+        if path is None:
+            return None
+        return len(path) - 1
+
+
+'''
+Read "Source<TAB>Target" lines from a dump file, skipping blanks and # comments
+'''
+def read_link_dump(filename):
+    with open(filename, mode='r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip() or line.startswith('#'):
+                continue
+            source, _, target = line.rstrip('\n').partition('\t')
+            source = canonical_title(source)
+            target = canonical_title(target)
+            if source and target:
+                yield source, target
+
+
+'''
+Edges from the link snapshots race pages report to telemetry (see LinkBridge)
+Pages seen in several rounds repeat their links; build_link_graph drops the duplicates
+'''
+def read_observed_links(filename):
+    from Telemetry import read_events
+    for event in read_events(filename):
+        if event.get("event") != "links":
+            continue
+        source = canonical_title(event.get("title") or "")
+        if not source:
+            continue
+        for target in event.get("links", ()):
+            target = canonical_title(target)
+            if target:
+                yield source, target
+
+
+'''
+Turns (source, target) edges into CSR offset and adjacency arrays with a counting sort
+Duplicate links and self links are dropped
+'''
+def _csr(nodeCount, sources, targets):
+    counts = array('Q', bytes(8 * (nodeCount + 1)))
+    for source in sources:
+        counts[source + 1] += 1
+    for node in range(nodeCount):
+        counts[node + 1] += counts[node]
+    slots = array('Q', counts)
+    placed = array('I', bytes(4 * len(sources)))
+    for source, target in zip(sources, targets):
+        placed[slots[source]] = target
+        slots[source] += 1
+
+    offsets = array('Q', [0])
+    adjacency = array('I')
+    for node in range(nodeCount):
+        row = set(placed[counts[node]:counts[node + 1]])
+        row.discard(node)
+        adjacency.extend(sorted(row))
+        offsets.append(len(adjacency))
+    return offsets, adjacency
+
+
+'''
+Build a link graph index from an iterable of (source, target) title pairs and write it
+to filename. Returns the number of articles and links written
+'''
+def build_link_graph(edges, filename=LINK_GRAPH_FILE):
+    ids = {}
+    sources = array('I')
+    targets = array('I')
+    for source, target in edges:
+        sources.append(ids.setdefault(source, len(ids)))
+        targets.append(ids.setdefault(target, len(ids)))
+    nodeCount = len(ids)
+
+    fwdOffsets, fwdTargets = _csr(nodeCount, sources, targets)
+    revOffsets, revSources = _csr(nodeCount, targets, sources)
+
+    titles = [b''] * nodeCount
+    for title, node in ids.items():
+        titles[node] = title.encode('utf-8')
+    titleOffsets = array('Q', [0])
+    for encoded in titles:
+        titleOffsets.append(titleOffsets[-1] + len(encoded))
+    sortedIds = array('I', sorted(range(nodeCount), key=titles.__getitem__))
+    titleBlob = b''.join(titles)
+
+    sections = (fwdOffsets, fwdTargets, revOffsets, revSources,
+                titleOffsets, sortedIds, titleBlob)
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        position += -position % 8
+        offsets.append(position)
+        position += len(bytes(section)) if isinstance(section, array) else len(section)
+
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, nodeCount, 0, *offsets))
+        for offset, section in zip(offsets, sections):
+            file.write(b'\0' * (offset - file.tell()))
+            file.write(bytes(section))
+    return nodeCount, len(fwdTargets)
+
+
+'''
+Write a synthetic link dump: a ring of articles so every goal is reachable, plus random
+shortcut links. Used to exercise the index locally without a real Wikipedia dump
+'''
+def write_synthetic_dump(filename, nodeCount=1000, linksPerPage=8, seed=0):
+    rng = random.Random(seed)
+    with open(filename, mode='w', encoding='utf-8') as file:
+        for node in range(nodeCount):
+            file.write(f"Article {node}\tArticle {(node + 1) % nodeCount}\n")
+            for _ in range(linksPerPage - 1):
+                file.write(f"Article {node}\tArticle {rng.randrange(nodeCount)}\n")
+
+
+_defaultGraph = None
+
+'''
+Returns the shared LinkGraph for LINK_GRAPH_FILE, or None if no index has been built
+'''
+def default_graph():
+    global _defaultGraph
+    if _defaultGraph is None:
+        try:
+            _defaultGraph = LinkGraph(LINK_GRAPH_FILE)
+        except (FileNotFoundError, ValueError):
+            return None
+    return _defaultGraph
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        nodes, links = build_link_graph(read_link_dump(sys.argv[2]), sys.argv[3])
+        print(f"Wrote {nodes} articles and {links} links to '{sys.argv[3]}'")
+    elif len(sys.argv) >= 4 and sys.argv[1] == "observed":
+        nodes, links = build_link_graph(read_observed_links(sys.argv[2]), sys.argv[3])
+        print(f"Wrote {nodes} articles and {links} links to '{sys.argv[3]}'")
+    elif len(sys.argv) == 5 and sys.argv[1] == "path":
+        with LinkGraph(sys.argv[2]) as graph:
+            route = graph.solve(sys.argv[3], sys.argv[4])
+        print(" -> ".join(route) if route else "No route found")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "synthetic":
+        write_synthetic_dump(sys.argv[2], *map(int, sys.argv[3:5]))
+    else:
+        print(__doc__)
@@ -0,0 +1,118 @@
+'''
+MockWiki - a local stand-in for en.wikipedia.org
+Serves generated article pages with the same URL layout as Wikipedia (/wiki/<Title>,
+/w/load.php, Special:Random redirects) so the game can be driven and measured without
+a network. Pages link to the titles given in the link table plus deterministic filler
+articles, so any title resolves to a page.
+'''
+
+import hashlib
+import html
+import http.server
+import random
+import threading
+
+from WikiTitles import canonical_title, title_to_path
+
+FILLER_LINKS = 20
+STYLESHEET = b"body { font-family: sans-serif; } a { color: #36c; }"
+
+
+'''
+Name: MockWikiHandler
+Description: Request handler for MockWikiServer
+'''
+
+class MockWikiHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        wiki = self.server.wiki
+        path = self.path.split('?', 1)[0]
+        if path.startswith("/wiki/"):
+            title = canonical_title(path[len("/wiki/"):])
+            if title == "Special:Random":
+                self.reply(302, "text/html", b"", "/wiki/" + title_to_path(wiki.random_title()))
+            else:
+                self.reply(200, "text/html; charset=UTF-8", wiki.render(title))
+        elif path == "/w/load.php":
+            self.reply(200, "text/css", STYLESHEET)
+        else:
+            self.reply(404, "text/plain", b"Not found")
+
+    def reply(self, status, contentType, body, location=None):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        if location:
+            self.send_header("Location", location)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+'''
+Name: MockWikiServer
+Description: ThreadingHTTPServer on a daemon thread serving generated articles
+Attributes: links, baseUrl, requests
+Methods: start, stop, render, random_title, add_path
+'''
+
+class MockWikiServer:
+    def __init__(self, links=None, fillerLinks=FILLER_LINKS, host="127.0.0.1", port=0):
+        self.links = {}
+        for title, targets in (links or {}).items():
+            self.links[canonical_title(title)] = [canonical_title(target) for target in targets]
+        self.fillerLinks = fillerLinks
+        self.random = random.Random(0)
+        self.requests = 0
+        self.server = http.server.ThreadingHTTPServer((host, port), MockWikiHandler)
+        self.server.daemon_threads = True
+        self.server.wiki = self
+        self.baseUrl = "http://%s:%d" % self.server.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.server.serve_forever,
+                                           name="MockWiki", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread = None
+
+    '''
+    Make sure every step of a click path links to the next one
+    '''
+
+    def add_path(self, titles):
+        titles = [canonical_title(title) for title in titles]
+        for source, target in zip(titles, titles[1:]):
+            targets = self.links.setdefault(source, [])
+            if target not in targets:
+                targets.append(target)
+
+    def random_title(self):
+        return "Article %d" % self.random.randrange(100000)
+
+    def _filler(self, title):
+        seed = int.from_bytes(hashlib.sha1(title.encode('utf-8')).digest()[:8], 'little')
+        rng = random.Random(seed)
+        return ["Article %d" % rng.randrange(100000) for _ in range(self.fillerLinks)]
+
+    def render(self, title):
+        self.requests += 1
+        targets = self.links.get(title, []) + self._filler(title)
+        items = "".join('<li><a href="/wiki/%s">%s</a></li>' % (
+            html.escape(title_to_path(target)), html.escape(target)) for target in targets)
+        page = ('<!DOCTYPE html><html><head><meta charset="UTF-8">'
+                '<title>%s - Wikipedia</title>'
+                '<link rel="stylesheet" href="/w/load.php?modules=site.styles&amp;only=styles">'
+                '</head><body><h1>%s</h1><p>Generated article for local testing.</p>'
+                '<ul>%s</ul></body></html>') % (html.escape(title), html.escape(title), items)
+        return page.encode('utf-8')
@@ -0,0 +1,216 @@
+'''
+NavigationRules - decides which navigations a race allows and whether one reaches the goal
+Each URL is split once, its article title is canonicalised (percent-escapes, underscores,
+case, #fragments) and then checked against precompiled host, path and title sets, so a
+decision is a handful of hash lookups however long the URL is. Goal redirects such as
+"USA" -> "United States" go through the redirect index of a TitleResolver.
+A round can have several goals ("checkpoints"): in a relay they count in the order given,
+in a scavenger hunt in any order. The checkpoints still to reach are a hash map of
+redirect-resolved keys, so matching a navigation costs the same for fifty as for one.
+
+Comparing the rule engine with the old substring checks:
+    python NavigationRules.py --benchmark [urls]
+'''
+
+import random
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from WikiTitles import canonical_title, title_key
+
+# Any Wikipedia language edition, plus hosts passed in (e.g. the local caching proxy)
+ALLOWED_HOSTS = frozenset(("wikipedia.org",))
+ALLOWED_HOST_SUFFIX = ".wikipedia.org"
+
+# Search would let a player jump straight to the goal; Random would skip the race
+DENIED_TITLES = frozenset(title_key(title) for title in (
+    "Special:Search", "Special:Random", "Special:RandomRedirect", "Special:RandomInCategory"))
+DENIED_QUERY_KEYS = frozenset(("search", "fulltext"))
+ARTICLE_PREFIX = "/wiki/"
+SCRIPT_PATH = "/w/index.php"
+
+# One goal; checkpoints reached in order; checkpoints reached in any order
+SINGLE_MODE = "single"
+RELAY_MODE = "relay"
+SCAVENGER_MODE = "scavenger"
+GOAL_MODES = (SINGLE_MODE, RELAY_MODE, SCAVENGER_MODE)
+
+
+'''
+The goals of a round as one line of text, for labels, the leaderboard and ghosts
+'''
+def describe_goals(goals, mode=SINGLE_MODE):
+    if isinstance(goals, str):
+        return goals
+    return (" > " if mode == RELAY_MODE else " + ").join(goals)
+
+
+'''
+Name: NavigationRules
+Description: Precompiled allow/deny sets, goal redirects and checkpoint progress for one
+round. goals is a title or a list of titles
+Attributes: mode, checkpoints, remaining, reached, allowedHosts, resolver
+Methods: resolve, article_title, allowed, is_goal, check, reach, finished
+'''
+
+class NavigationRules:
+    def __init__(self, goals, localUrl=None, resolver=None, mode=SINGLE_MODE):
+        if mode not in GOAL_MODES:
+            raise ValueError(f"Unknown goal mode '{mode}', choose from " + ", ".join(GOAL_MODES))
+        self.resolver = resolver
+        self.mode = mode
+        if isinstance(goals, str):
+            goals = [goals]
+        # Key of each checkpoint's article, in order. The order only matters in a relay,
+        # and only a relay may visit the same article twice
+        self.checkpoints = [self.resolve(title_key(goal)) for goal in goals]
+        if mode != RELAY_MODE:
+            self.checkpoints = list(dict.fromkeys(self.checkpoints))
+        # Checkpoints that count if reached now, key -> position. A relay only ever has
+        # its next checkpoint in here
+        if mode == RELAY_MODE:
+            self.remaining = {self.checkpoints[0]: 0}
+        else:
+            self.remaining = {key: index for index, key in enumerate(self.checkpoints)}
+        self.reached = []  # Positions of the checkpoints reached, in the order reached
+        hosts = set(ALLOWED_HOSTS)
+        if localUrl:
+            hosts.add(urlsplit(localUrl).netloc.lower())
+        self.allowedHosts = frozenset(hosts)
+
+    '''
+    Follow redirects from a title key to the key of the article it points at
+    '''
+
+    def resolve(self, key):
+        if self.resolver is None:
+            return key
+        return self.resolver.target_key(key)
+
+    '''
+    Returns the canonical article title a split URL points at, or None for anything that is
+    not an article view (stylesheets, scripts, the API, ...)
+    '''
+
+    def article_title(self, parts):
+        if parts.path.startswith(ARTICLE_PREFIX):
+            return canonical_title(parts.path[len(ARTICLE_PREFIX):])
+        if parts.path == SCRIPT_PATH and parts.query:
+            titles = parse_qs(parts.query).get("title")
+            if titles:
+                return canonical_title(titles[0])
+        return None
+
+    def allowed(self, parts, key):
+        if parts.netloc.lower() not in self.allowedHosts:
+            hostname = parts.hostname
+            if not hostname or not hostname.endswith(ALLOWED_HOST_SUFFIX):
+                return False
+        if parts.path == SCRIPT_PATH and parts.query:
+            if not DENIED_QUERY_KEYS.isdisjoint(parse_qs(parts.query)):
+                return False
+        return key not in DENIED_TITLES
+
+    '''
+    Whether arriving at title now would reach a checkpoint
+    '''
+
+    def is_goal(self, title):
+        return title is not None and self.resolve(title.casefold()) in self.remaining
+
+    '''
+    Parse url once and return (allowed, title, isGoal)
+    '''
+
+    def check(self, url):
+        parts = urlsplit(url)
+        title = self.article_title(parts)
+        key = title.casefold() if title is not None else None
+        if not self.allowed(parts, key):
+            return False, title, False
+        return True, title, key is not None and self.resolve(key) in self.remaining
+
+    '''
+    Record arriving at title. Returns the position of the checkpoint it reaches, or None
+    '''
+
+    def reach(self, title):
+        if title is None:
+            return None
+        index = self.remaining.pop(self.resolve(title.casefold()), None)
+        if index is None:
+            return None
+        self.reached.append(index)
+        if self.mode == RELAY_MODE and index + 1 < len(self.checkpoints):
+            self.remaining[self.checkpoints[index + 1]] = index + 1
+        return index
+
+    def finished(self):
+        return len(self.reached) == len(self.checkpoints)
+
+
+'''
+The checks CustomWebPage made before the rule engine, kept for the benchmark
+'''
+def legacy_check(url, goal):
+    lower = url.lower()
+    if lower.find("wikipedia.org") < 0 or lower.find("wikipedia.org/w/index.php?search=") > 0:
+        return False, False
+    return True, lower.find(goal.lower()) > 0
+
+
+'''
+Time both implementations over a generated mix of article, search, foreign and
+subresource URLs. Also counts goal matches the substring check got wrong, and times the
+rule engine again with a fifty checkpoint scavenger hunt
+'''
+def benchmark(count=20000, seed=0):
+    rng = random.Random(seed)
+    goal = "Paris"
+    titles = ["Paris", "Paris_Hilton", "Plaster_of_Paris", "France", "Eiffel_Tower",
+              "Paris%20(mythology)", "paris", "Paris#History", "Treaty_of_Paris_(1783)"]
+    urls = []
+    for _ in range(count):
+        kind = rng.random()
+        title = rng.choice(titles)
+        if kind < 0.7:
+            urls.append("https://en.wikipedia.org/wiki/" + title)
+        elif kind < 0.8:
+            urls.append("https://en.wikipedia.org/w/index.php?search=" + title)
+        elif kind < 0.9:
+            urls.append("https://en.wikipedia.org/w/load.php?modules=site.styles&only=styles")
+        else:
+            urls.append("https://example.com/wiki/" + title)
+    rules = NavigationRules(goal)
+
+    start = time.perf_counter()
+    legacy = [legacy_check(url, goal) for url in urls]
+    legacyTime = time.perf_counter() - start
+    start = time.perf_counter()
+    current = [rules.check(url) for url in urls]
+    rulesTime = time.perf_counter() - start
+    hunt = NavigationRules([goal] + ["Checkpoint %d" % index for index in range(49)],
+                           mode=SCAVENGER_MODE)
+    start = time.perf_counter()
+    for url in urls:
+        hunt.check(url)
+    huntTime = time.perf_counter() - start
+
+    falseGoals = sum(1 for old, new in zip(legacy, current) if old[1] and not new[2])
+    return {
+        "urls": count,
+        "legacy_us_per_url": legacyTime / count * 1e6,
+        "rules_us_per_url": rulesTime / count * 1e6,
+        "rules_50_checkpoints_us_per_url": huntTime / count * 1e6,
+        "legacy_false_goal_matches": falseGoals,
+        "goal_matches": sum(1 for result in current if result[2]),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        for key, value in benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20000).items():
+            print(f"{key}: {value}")
+    else:
+        print(__doc__)
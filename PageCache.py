@@ -0,0 +1,394 @@
+'''
+PageCache - an on-disk LRU cache of Wikipedia responses and the local proxy that serves it
+Articles are fetched through a small HTTP server on 127.0.0.1 that mirrors the layout of
+en.wikipedia.org (/wiki/..., /w/..., /static/...). Responses are kept on disk with
+least-recently-used eviction once the cache grows past its size limit, so hub articles
+and the site's stylesheets are only downloaded once across games and restarts.
+Resources from other Wikimedia hosts (images on upload.wikimedia.org) are fetched through
+/_/<host>/<path>; the browser's request interceptor rewrites them to that form.
+'''
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from RandomPool import NoRedirection
+
+CACHE_DIR = "page_cache"
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+UPSTREAM = "https://en.wikipedia.org"
+USER_AGENT = "WikiRacing/1.0 (local page cache)"
+
+# Hosts the proxy will fetch from through /_/<host>/. Anything else is refused so the
+# proxy cannot be used to reach arbitrary sites
+PROXIED_DOMAINS = ("wikipedia.org", "wikimedia.org")
+
+# Responses that must be fresh on every request, e.g. Special:Random
+UNCACHEABLE = ("Special:", "/w/api.php", "/w/index.php")
+
+# Temp files older than this are left by a write that never completed. Younger ones may
+# belong to another copy of the game sharing the cache directory
+STALE_TEMP_SECONDS = 600
+
+# Longest a request waits for a prefetch of the same page before fetching it itself
+PREFETCH_WAIT = 15
+
+# Serve articles from an offline archive instead of upstream (see WikiMirror.py)
+MIRROR_MODE = "--mirror" in sys.argv
+
+
+'''
+Whether host (optionally with a :port) is one of PROXIED_DOMAINS or a subdomain of one.
+Matching on whole labels keeps look-alikes such as evilwikipedia.org out
+'''
+def proxied_host(host):
+    host = host.rpartition('@')[2].partition(':')[0].lower().rstrip('.')
+    return any(host == domain or host.endswith("." + domain) for domain in PROXIED_DOMAINS)
+
+
+'''
+Name: PageCache
+Description: Thread-safe LRU store of HTTP responses, one file per entry in directory
+Attributes: directory, maxBytes, totalBytes, hits, misses, evictions
+Methods: get, put, stats, clear
+'''
+
+class PageCache:
+    def __init__(self, directory=CACHE_DIR, maxBytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> size on disk, least recently used first
+        self.totalBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytesServed = 0
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    '''
+    Rebuild the LRU order from the files left by earlier runs, oldest modified first
+    '''
+
+    def load(self):
+        found = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if ".tmp" in name:
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue  # Replaced or evicted by another copy of the game meanwhile
+            found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.totalBytes += size
+        with self.lock:
+            self._evict()
+
+    def _name(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def __contains__(self, url):
+        with self.lock:
+            return self._name(url) in self.entries
+
+    '''
+    Returns (status, contentType, body) for url, or None on a miss.
+    A hit moves the entry to the most recently used end and touches its file so the
+    order survives a restart
+    '''
+
+    def get(self, url):
+        name = self._name(url)
+        with self.lock:
+            if name not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+        try:
+            with open(self._path(name), 'rb') as file:
+                meta = json.loads(file.readline())
+                body = file.read()
+            os.utime(self._path(name))
+        except (OSError, ValueError):
+            with self.lock:
+                self._discard(name)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self.bytesServed += len(body)
+        return meta["status"], meta["type"], body
+
+    '''
+    Store a response, evicting least recently used entries beyond maxBytes
+    '''
+
+    def put(self, url, status, contentType, body):
+        name = self._name(url)
+        header = json.dumps({"url": url, "status": status, "type": contentType}).encode('utf-8')
+        temp = self._path(name) + ".tmp.%d.%d" % (os.getpid(), threading.get_ident())
+        with open(temp, 'wb') as file:
+            file.write(header + b"\n")
+            file.write(body)
+        try:
+            os.replace(temp, self._path(name))
+        except FileNotFoundError:
+            return  # Our temp was cleared away; the response is just not cached this time
+        size = len(header) + 1 + len(body)
+        with self.lock:
+            self.totalBytes -= self.entries.pop(name, 0)
+            self.entries[name] = size
+            self.totalBytes += size
+            self._evict()
+
+    '''
+    Size on disk of the cached entry for url, or None if it is not cached
+    '''
+
+    def size_of(self, url):
+        with self.lock:
+            return self.entries.get(self._name(url))
+
+    def _discard(self, name):
+        self.totalBytes -= self.entries.pop(name, 0)
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.totalBytes > self.maxBytes and self.entries:
+            name = next(iter(self.entries))
+            self._discard(name)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            for name in list(self.entries):
+                self._discard(name)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.totalBytes,
+                "max_bytes": self.maxBytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes_served": self.bytesServed,
+            }
+
+
+'''
+Name: CacheRequestHandler
+Description: Serves GET requests from the proxy's PageCache, fetching misses upstream
+'''
+
+class CacheRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        proxy = self.server.proxy
+        upstream = proxy.upstream_url(self.path)
+        if upstream is None:
+            self.send_error(403, "Host not proxied")
+            return
+        cacheable = not any(marker in self.path for marker in UNCACHEABLE)
+        if cacheable:
+            # A page the prefetcher is downloading right now is served once it lands
+            proxy.wait_for_prefetch(upstream)
+        cached = proxy.cache.get(upstream) if cacheable else None
+        if cached is not None:
+            self.reply(*cached)
+            return
+        try:
+            with proxy.foreground():
+                status, contentType, body, location = proxy.fetch(upstream)
+        except OSError as error:
+            self.send_error(502, "Upstream fetch failed: %s" % error)
+            return
+        if status == 200 and cacheable:
+            proxy.cache.put(upstream, status, contentType, body)
+        self.reply(status, contentType, body, location)
+
+    def reply(self, status, contentType, body, location=None):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        if location:
+            self.send_header("Location", self.server.proxy.local_url(location))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+'''
+Name: CachingProxy
+Description: A ThreadingHTTPServer on a daemon thread that fronts upstream with a PageCache
+Attributes: cache, upstream, baseUrl, foregroundFetches
+Methods: start, stop, upstream_url, local_url, size_of, fetch, prefetch, wait_for_prefetch,
+    foreground
+'''
+
+class CachingProxy:
+    handlerClass = CacheRequestHandler
+    # Whether fetching ahead saves anything; False for proxies that never go upstream
+    prefetchable = True
+
+    def __init__(self, cache=None, upstream=UPSTREAM, host="127.0.0.1", port=0):
+        self.cache = cache if cache is not None else PageCache()
+        self.upstream = upstream.rstrip('/')
+        self.upstreamHost = urlsplit(self.upstream).netloc
+        self.opener = urllib.request.build_opener(NoRedirection)
+        self.server = http.server.ThreadingHTTPServer((host, port), self.handlerClass)
+        self.server.daemon_threads = True
+        self.server.proxy = self
+        self.baseUrl = "http://%s:%d" % self.server.server_address[:2]
+        self.thread = None
+        # Prefetches in progress by URL, and upstream fetches the browser is waiting on
+        self.fetchLock = threading.Lock()
+        self.inflight = {}
+        self.foregroundFetches = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.server.serve_forever,
+                                           name="CachingProxy", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread = None
+
+    '''
+    Map a proxy request path back to the URL it stands for, or None if it is not allowed
+    '''
+
+    def upstream_url(self, path):
+        if not path.startswith("/_/"):
+            return self.upstream + path
+        host, _, rest = path[3:].partition('/')
+        if not proxied_host(host):
+            return None
+        return "https://%s/%s" % (host, rest)
+
+    '''
+    Map an absolute Wikipedia or Wikimedia URL onto the proxy. Other URLs are unchanged
+    '''
+
+    def local_url(self, url):
+        parts = urlsplit(url)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        if not parts.netloc or parts.netloc == self.upstreamHost:
+            return self.baseUrl + path
+        if proxied_host(parts.netloc):
+            return "%s/_/%s%s" % (self.baseUrl, parts.netloc, path)
+        return url
+
+    '''
+    Cached size of url, which may be a proxy URL the page requested or the upstream URL it
+    stands for; the cache is keyed on the latter. None if it is not cached
+    '''
+
+    def size_of(self, url):
+        if url.startswith(self.baseUrl + "/"):
+            url = self.upstream_url(url[len(self.baseUrl):])
+            if url is None:
+                return None
+        return self.cache.size_of(url)
+
+    '''
+    Fetch url without following redirects. Returns (status, contentType, body, location)
+    '''
+
+    def fetch(self, url):
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        # NoRedirection hands back error and redirect responses instead of raising
+        with self.opener.open(request, timeout=15) as response:
+            return (response.status,
+                    response.headers.get("Content-Type", "application/octet-stream"),
+                    response.read(),
+                    response.headers.get("Location"))
+
+    '''
+    Fetch url into the cache ahead of a request for it, unless it is cached or already on
+    its way. Returns the number of bytes cached: 0 for errors and redirects, which are not
+    '''
+
+    def prefetch(self, url):
+        with self.fetchLock:
+            if url in self.inflight or url in self.cache:
+                return 0
+            done = self.inflight[url] = threading.Event()
+        try:
+            status, contentType, body, _ = self.fetch(url)
+            if status != 200:
+                return 0
+            self.cache.put(url, status, contentType, body)
+            return len(body)
+        finally:
+            with self.fetchLock:
+                del self.inflight[url]
+            done.set()
+
+    def wait_for_prefetch(self, url, timeout=PREFETCH_WAIT):
+        with self.fetchLock:
+            done = self.inflight.get(url)
+        if done is not None:
+            done.wait(timeout)
+
+    '''
+    Marks an upstream fetch a page is waiting on, so prefetching can hold back meanwhile
+    '''
+
+    @contextmanager
+    def foreground(self):
+        with self.fetchLock:
+            self.foregroundFetches += 1
+        try:
+            yield
+        finally:
+            with self.fetchLock:
+                self.foregroundFetches -= 1
+
+
+_defaultProxy = None
+
+'''
+Returns the caching proxy shared by every round, starting it on first use.
+With --mirror it is an offline MirrorProxy over the archive instead
+'''
+def default_proxy():
+    global _defaultProxy
+    if _defaultProxy is None:
+        if MIRROR_MODE:
+            from WikiMirror import MirrorProxy, default_archive, mirror_file
+            _defaultProxy = MirrorProxy(default_archive(mirror_file())).start()
+        else:
+            _defaultProxy = CachingProxy().start()
+    return _defaultProxy
@@ -0,0 +1,290 @@
+'''
+Prefetcher - fetches the articles a player is likely to click next into the page cache
+When a race page's link snapshot arrives (see LinkBridge), the links are scored and the
+top few are downloaded through the caching proxy while the player reads, so a click on
+one of them is served from disk instead of waiting on Wikipedia. Links score by:
+    1. the next step of the optimal route to the goal, when a link graph is built
+    2. closeness to the goal, when article vectors are built (see HintEngine)
+    3. how often players clicked them before (navigate events in telemetry)
+Prefetching is kept out of the player's way: one daemon thread fetches one page at a
+time, waits while the proxy is fetching anything the page asked for, stays under a rate
+limit, stops after a byte budget per page, and drops its queue as soon as the player
+navigates. The page a player clicks while it is being prefetched is served when it lands.
+
+Pass --no-prefetch to turn it off. Measuring it against a slow local wiki:
+    python Prefetcher.py --benchmark [clicks] [delay ms]
+'''
+
+from collections import Counter, deque
+import sys
+import tempfile
+import threading
+import time
+
+from WikiTitles import canonical_title, title_to_path
+
+PREFETCH_MODE = "--no-prefetch" not in sys.argv
+
+# Links fetched ahead per page, bytes they may use, and the rate they are fetched at
+PREFETCH_TOP_K = 4
+PREFETCH_BUDGET_BYTES = 2 * 1024 * 1024
+PREFETCH_RATE_BYTES = 512 * 1024
+
+# How long the worker backs off while the proxy serves the page's own requests
+FOREGROUND_BACKOFF = 0.05
+
+# Prefetched titles remembered to count the ones the player went on to click
+REMEMBERED_URLS = 256
+
+
+'''
+Clicks per article title from the navigate events in a telemetry log
+'''
+def click_counts(filename):
+    from Telemetry import read_events
+    counts = Counter()
+    for event in read_events(filename):
+        if event.get("event") == "navigate" and event.get("type") == "LinkClicked":
+            title = event.get("title")
+            if title:
+                counts[canonical_title(title)] += 1
+    return counts
+
+
+'''
+Name: LinkScorer
+Description: Orders a page's links by how likely the player is to click them next
+Attributes: graph, engine, clicks
+Methods: rank
+'''
+
+class LinkScorer:
+    def __init__(self, graph=None, engine=None, clicks=None):
+        self.graph = graph
+        self.engine = engine
+        self.clicks = clicks if clicks is not None else Counter()
+
+    '''
+    Titles from links best first, leaving out the page itself and the goal (reaching the
+    goal ends the round before its page loads)
+    '''
+
+    def rank(self, current, goal, links):
+        titles = [title for title in links if title != current and title != goal]
+        popularity = {title: self.clicks.get(title, 0) for title in titles}
+        titles.sort(key=popularity.__getitem__, reverse=True)
+        if self.engine is not None and goal:
+            ranked = self.engine.rank(goal, titles)
+            # Popularity orders the titles the vectors cannot score, and breaks ties
+            titles = [title for title, _ in ranked]
+        if self.graph is not None and goal:
+            route = self.graph.solve(current, goal)
+            if route is not None and len(route) > 2 and route[1] in popularity:
+                titles.remove(route[1])
+                titles.insert(0, route[1])
+        return titles
+
+
+'''
+Name: Prefetcher
+Description: Daemon thread that fetches the top links of the current page through a
+CachingProxy within a rate limit and a per-page byte budget
+Attributes: proxy, scorer, topK, budgetBytes, rateBytes, pages, bytes, used, cancelled
+Methods: page_ready, navigated, stop, stats
+'''
+
+class Prefetcher:
+    def __init__(self, proxy, scorer=None, topK=PREFETCH_TOP_K,
+                 budgetBytes=PREFETCH_BUDGET_BYTES, rateBytes=PREFETCH_RATE_BYTES):
+        self.proxy = proxy
+        self.scorer = scorer
+        self.topK = topK
+        self.budgetBytes = budgetBytes
+        self.rateBytes = rateBytes
+        self.condition = threading.Condition()
+        # Bumped on every navigation; work queued under an older generation is stale
+        self.generation = 0
+        self.job = None
+        self.active = None
+        self.running = True
+        self.remembered = deque(maxlen=REMEMBERED_URLS)
+        self.pages = 0
+        self.bytes = 0
+        self.used = 0
+        self.cancelled = 0
+        self.thread = threading.Thread(target=self._run, name="Prefetcher", daemon=True)
+        self.thread.start()
+
+    '''
+    Queue the links ({title: href}) of the page the player is reading. Replaces any
+    earlier page's work
+    '''
+
+    def page_ready(self, current, goal, links):
+        with self.condition:
+            self.generation += 1
+            self.job = (self.generation, current, goal, dict(links))
+            self.condition.notify()
+
+    '''
+    The player is leaving the page for title: drop what is left of its prefetches
+    '''
+
+    def navigated(self, title=None):
+        with self.condition:
+            if self.job is not None or self.active == self.generation:
+                self.cancelled += 1
+            self.generation += 1
+            self.job = None
+            if title is not None and title in self.remembered:
+                self.used += 1
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.generation += 1
+            self.job = None
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {"pages": self.pages, "bytes": self.bytes, "used": self.used,
+                    "cancelled": self.cancelled}
+
+    def _current(self, generation):
+        with self.condition:
+            return self.running and generation == self.generation
+
+    def _run(self):
+        if self.scorer is None:
+            self.scorer = default_scorer()
+        while True:
+            with self.condition:
+                while self.running and self.job is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation, current, goal, links = self.job
+                self.job = None
+                self.active = generation
+            try:
+                self._prefetch(generation, current, goal, links)
+            except Exception:
+                pass  # Prefetching is only ever a speed-up; never let it kill the thread
+            with self.condition:
+                self.active = None
+
+    def _prefetch(self, generation, current, goal, links):
+        spent = 0
+        for title in self.scorer.rank(current, goal, links)[:self.topK]:
+            # The page's own href, so the cache key matches the request a click makes
+            url = self.proxy.upstream + links[title].partition('#')[0]
+            # Hold back while the page is loading its own resources
+            while self.proxy.foregroundFetches and self._current(generation):
+                time.sleep(FOREGROUND_BACKOFF)
+            if spent >= self.budgetBytes or not self._current(generation):
+                return
+            try:
+                fetched = self.proxy.prefetch(url)
+            except OSError:
+                continue
+            if not fetched:
+                continue
+            spent += fetched
+            with self.condition:
+                self.pages += 1
+                self.bytes += fetched
+                self.remembered.append(title)
+                # Pay for the bytes before the next fetch, waking early on navigation
+                self.condition.wait_for(lambda: generation != self.generation,
+                                        fetched / self.rateBytes)
+
+
+_defaultScorer = None
+_scorerLock = threading.Lock()
+
+'''
+Returns a LinkScorer over the default link graph, article vectors and the clicks in the
+telemetry log, whichever exist. Built on first use, off the GUI thread
+'''
+def default_scorer():
+    global _defaultScorer
+    with _scorerLock:
+        if _defaultScorer is None:
+            from HintEngine import default_engine
+            from LinkGraph import default_graph
+            from Telemetry import TELEMETRY_FILE
+            _defaultScorer = LinkScorer(default_graph(), default_engine(),
+                                        click_counts(TELEMETRY_FILE))
+    return _defaultScorer
+
+
+_prefetchers = {}
+
+'''
+Returns the Prefetcher for a proxy, shared by every round on it, or None when prefetching
+is turned off or the proxy never goes upstream
+'''
+def default_prefetcher(proxy):
+    if not PREFETCH_MODE or not proxy.prefetchable:
+        return None
+    if proxy not in _prefetchers:
+        _prefetchers[proxy] = Prefetcher(proxy)
+    return _prefetchers[proxy]
+
+
+'''
+Play clicks from page to page against a MockWiki behind a delay, once reading each page
+for a moment with prefetching and once without, and compare the time to load each click
+'''
+def benchmark(clicks=30, delayMs=150, readMs=300):
+    import urllib.request
+    from MockWiki import MockWikiServer
+    from PageCache import CachingProxy, PageCache
+
+    class SlowWiki(MockWikiServer):
+        def render(self, title):
+            time.sleep(delayMs / 1000)
+            return super().render(title)
+
+    wiki = SlowWiki().start()
+    route = ["Article %d" % index for index in range(clicks + 1)]
+    wiki.add_path(route)
+    results = {}
+    for mode in ("off", "on"):
+        proxy = CachingProxy(PageCache(tempfile.mkdtemp(prefix="prefetch_")), wiki.baseUrl).start()
+        # Only the route link scores, like a player heading for the goal most of the time
+        scorer = LinkScorer(clicks=Counter(route))
+        prefetcher = Prefetcher(proxy, scorer) if mode == "on" else None
+        loads = []
+        for current, following in zip(route, route[1:]):
+            if prefetcher is not None:
+                links = wiki.links[current] + wiki._filler(current)
+                prefetcher.page_ready(current, route[-1],
+                                      {link: "/wiki/" + title_to_path(link) for link in links})
+            time.sleep(readMs / 1000)
+            if prefetcher is not None:
+                prefetcher.navigated(following)
+            url = proxy.baseUrl + "/wiki/" + title_to_path(following)
+            start = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            loads.append((time.perf_counter() - start) * 1000)
+        loads.sort()
+        results["load_ms_median_" + mode] = loads[len(loads) // 2]
+        results["load_ms_mean_" + mode] = sum(loads) / len(loads)
+        if prefetcher is not None:
+            results.update(("prefetch_" + key, value) for key, value in prefetcher.stats().items())
+            prefetcher.stop()
+        proxy.stop()
+    wiki.stop()
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        arguments = [int(argument) for argument in sys.argv[2:4]]
+        for key, value in benchmark(*arguments).items():
+            print(f"{key}: {value}")
+    else:
+        print(__doc__)
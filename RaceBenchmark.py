@@ -0,0 +1,265 @@
+'''
+RaceBenchmark - headless replay and benchmark harness for the race window
+Drives MainWindow, CustomWebPage and the race timer under QT_QPA_PLATFORM=offscreen
+against a MockWiki server, replaying recorded click paths by clicking the links in the
+page. Reports navigation-decision latency, page-load time, timer overhead, memory per
+round and startup time as JSON, so regressions show up before an event night.
+
+    python RaceBenchmark.py [--paths paths.json] [--rounds N] [--output results.json]
+
+paths.json is a list of rounds: [{"path": ["Start", "Middle", ..., "Goal"]}, ...]
+Without it, synthetic rounds through MockWiki articles are generated.
+'''
+
+import os
+
+# Must be set before Qt is imported
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("QTWEBENGINE_CHROMIUM_FLAGS", "--disable-gpu")
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+STARTUP = time.perf_counter()
+
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtWidgets import QApplication
+
+import RaceWindow
+from MockWiki import MockWikiServer
+from PageCache import CachingProxy, PageCache
+from Telemetry import TELEMETRY_FILE, default_telemetry
+from TitleResolver import TITLE_CACHE_FILE, default_resolver
+from WikiTitles import title_to_path
+
+IMPORTED = time.perf_counter()
+
+LOAD_TIMEOUT_MS = 15000
+
+
+'''
+Resident set size of a process in KB, read from /proc where available.
+Falls back to this process's peak RSS from getrusage on other platforms
+'''
+def process_rss_kb(pid=None):
+    try:
+        with open("/proc/%s/status" % (pid or "self")) as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if pid is not None:
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+'''
+Run a nested event loop until signal fires or timeoutMs passes, calling trigger once
+the signal is connected. Returns the signal's arguments, or None on timeout
+'''
+def wait_for(signal, timeoutMs=LOAD_TIMEOUT_MS, trigger=None):
+    loop = QEventLoop()
+    received = []
+
+    def done(*args):
+        received.append(args)
+        loop.quit()
+
+    signal.connect(done)
+    QTimer.singleShot(timeoutMs, loop.quit)
+    if trigger is not None:
+        trigger()
+    if not received:
+        loop.exec_()
+    signal.disconnect(done)
+    return received[0] if received else None
+
+
+'''
+Name: TimedWebPage
+Description: CustomWebPage that records how long each navigation decision takes
+'''
+
+class TimedWebPage(RaceWindow.CustomWebPage):
+    decisionTimes = []
+
+    def acceptNavigationRequest(self, url, _type, isMainFrame):
+        start = time.perf_counter_ns()
+        accepted = super().acceptNavigationRequest(url, _type, isMainFrame)
+        self.decisionTimes.append(time.perf_counter_ns() - start)
+        return accepted
+
+
+'''
+Name: BenchmarkWindow
+Description: MainWindow that measures its timer callbacks and page loads, and records the
+finish instead of opening the GameComplete screen
+'''
+
+class BenchmarkWindow(RaceWindow.MainWindow):
+    pageClass = TimedWebPage
+
+    def __init__(self, start, goal, proxy):
+        self.timerCalls = 0
+        self.timerNs = 0
+        self.loadTimes = []
+        self.loadStart = None
+        self.finished = False
+        super().__init__(start, goal, proxy=proxy)
+        self.browser.loadStarted.connect(self.load_started)
+        self.browser.loadFinished.connect(self.load_finished)
+
+    def load_started(self):
+        self.loadStart = time.perf_counter()
+
+    def load_finished(self, _):
+        if self.loadStart is not None:
+            self.loadTimes.append(time.perf_counter() - self.loadStart)
+            self.loadStart = None
+
+    def showTime(self):
+        start = time.perf_counter_ns()
+        super().showTime()
+        self.timerNs += time.perf_counter_ns() - start
+        self.timerCalls += 1
+
+    def stop_timer(self):
+        self.clock.stop()
+        self.timer.stop()
+        self.finished = True
+
+
+'''
+Generate rounds along "Article N" chains; MockWiki links each step to the next
+'''
+def synthetic_rounds(count, length=5):
+    return [{"path": ["Article %d" % (1000 * index + step) for step in range(length)]}
+            for index in range(count)]
+
+
+'''
+Play one recorded round: load the start page, then click each next link in turn
+'''
+def replay(path, proxy):
+    memoryBefore = process_rss_kb()
+    roundStart = time.perf_counter()
+    window = BenchmarkWindow(path[0], path[-1], proxy)
+    firstLoad = wait_for(window.browser.loadFinished)
+    firstPage = time.perf_counter() - roundStart
+    clicks = 0
+    for title in path[1:]:
+        if window.finished:
+            break
+        script = ("var link = document.querySelector('a[href=\"/wiki/%s\"]');"
+                  "if (link) { link.click(); }" % title_to_path(title))
+        wait_for(window.browser.loadFinished,
+                 trigger=lambda: window.page.runJavaScript(script))
+        clicks += 1
+    rendererRss = None
+    if hasattr(window.page, "renderProcessPid"):
+        rendererRss = process_rss_kb(window.page.renderProcessPid())
+    result = {
+        "start": path[0],
+        "goal": path[-1],
+        "finished": window.finished,
+        "loaded": firstLoad is not None,
+        "clicks": clicks,
+        "page_clicks": window.page.clicks,
+        "race_seconds": window.clock.elapsed_seconds(),
+        "first_page_seconds": firstPage,
+        "load_seconds": window.loadTimes,
+        "timer_calls": window.timerCalls,
+        "timer_overhead_ms": window.timerNs / 1e6,
+        "renderer_rss_kb": rendererRss,
+    }
+    window.close()
+    window.deleteLater()
+    QApplication.processEvents()
+    memoryAfter = process_rss_kb()
+    result["memory_delta_kb"] = (memoryAfter - memoryBefore
+                                 if memoryAfter is not None and memoryBefore is not None else None)
+    return result
+
+
+def summarise(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {"count": len(ordered), "mean": statistics.fmean(ordered),
+            "median": statistics.median(ordered),
+            "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            "max": ordered[-1]}
+
+
+def run(rounds):
+    app = QApplication.instance() or QApplication(sys.argv)
+    appReady = time.perf_counter()
+    mock = MockWikiServer()
+    for entry in rounds:
+        mock.add_path(entry["path"])
+    mock.start()
+    cacheDir = tempfile.mkdtemp(prefix="wikiracing-bench-")
+    proxy = CachingProxy(PageCache(cacheDir), upstream=mock.baseUrl).start()
+    # Keep the benchmark's navigation events out of the player's telemetry log, and its
+    # mock titles out of the player's title cache
+    telemetry = default_telemetry(os.path.join(cacheDir, TELEMETRY_FILE))
+    default_resolver(os.path.join(cacheDir, TITLE_CACHE_FILE))
+
+    results = [replay(entry["path"], proxy) for entry in rounds]
+    proxy.stop()
+    mock.stop()
+    telemetry.flush()
+
+    TimedWebPage.decisionTimes.sort()
+    raceSeconds = sum(result["race_seconds"] for result in results)
+    timerCalls = sum(result["timer_calls"] for result in results)
+    return {
+        "startup": {
+            "import_seconds": IMPORTED - STARTUP,
+            "qapplication_seconds": appReady - IMPORTED,
+            "first_page_seconds": results[0]["first_page_seconds"] if results else None,
+        },
+        "navigation_decision_us": summarise([ns / 1000 for ns in TimedWebPage.decisionTimes]),
+        "page_load_ms": summarise([seconds * 1000 for result in results
+                                   for seconds in result["load_seconds"]]),
+        "timer": {
+            "calls": timerCalls,
+            "wakeups_per_second": timerCalls / raceSeconds if raceSeconds else None,
+            "overhead_ms": sum(result["timer_overhead_ms"] for result in results),
+        },
+        "memory_delta_kb_per_round": summarise([result["memory_delta_kb"] for result in results
+                                                if result["memory_delta_kb"] is not None]),
+        "process_rss_kb": process_rss_kb(),
+        "cache": proxy.cache.stats(),
+        "telemetry": telemetry.stats(),
+        "rounds": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless Wiki-Racing benchmark")
+    parser.add_argument("--paths", help="JSON file of recorded click paths to replay")
+    parser.add_argument("--rounds", type=int, default=5, help="synthetic rounds if no paths")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    arguments = parser.parse_args()
+    if arguments.paths:
+        with open(arguments.paths, mode='r', encoding='utf-8') as file:
+            recorded = json.load(file)
+    else:
+        recorded = synthetic_rounds(arguments.rounds)
+    report = json.dumps(run(recorded), indent=2)
+    if arguments.output:
+        with open(arguments.output, mode='w', encoding='utf-8') as file:
+            file.write(report)
+    else:
+        print(report)
@@ -0,0 +1,442 @@
+'''
+RaceBot - automated players that race the real race window, for load tests and ghosts
+A bot drives MainWindow's QWebEngineView through CustomWebPage like a player would: once
+a page has loaded it waits a human-like think time, reads the article links out of the
+page, lets its strategy pick one and clicks it. The navigation rules, timer, telemetry
+and proxy all see ordinary clicks. Strategies:
+    greedy      follows the shortest route in the local link index (see LinkGraph), with
+                an optional rate of deliberate mistakes
+    similarity  picks the link whose title is most like the goal's, by character trigram
+                similarity, without any index
+Rounds are split over a pool of processes, each running several offscreen browsers at
+once. Finished runs can be saved as ghosts (see GhostRuns) that players race against.
+
+    python RaceBot.py [--rounds N] [--processes P] [--concurrent C] [--strategy greedy]
+                      [--think-ms 800] [--mock] [--ghosts] [--output results.json]
+
+--mock serves generated articles from MockWiki and builds a matching link index, so a
+load test needs no network and no dumps. Otherwise rounds come from the round pair index
+(see RoundGenerator) and pages from the caching proxy.
+'''
+
+import os
+
+# Must be set before Qt is imported
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("QTWEBENGINE_CHROMIUM_FLAGS", "--disable-gpu")
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+from GhostRuns import Ghost, default_ghosts
+from LinkGraph import LinkGraph, build_link_graph, default_graph
+from RaceClock import NS_PER_MS
+from WikiTitles import LINKS_SCRIPT, article_links, canonical_title, title_key
+
+THINK_MS = 800
+MAX_CLICKS = 40
+ROUND_TIMEOUT_MS = 120000
+
+# Clicks the first link whose href is exactly %s (a JSON string)
+CLICK_SCRIPT = ("(function (href) { for (const link of"
+                " document.querySelectorAll('a[href^=\"/wiki/\"]')) {"
+                " if (link.getAttribute('href') === href) { link.click(); return true; } }"
+                " return false; })(%s)")
+
+
+'''
+Character trigrams of a title's key, padded so first and last letters count too
+'''
+def trigrams(title):
+    padded = " %s " % title_key(title)
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
+
+
+'''
+Jaccard similarity of two trigram sets, from 0 (nothing shared) to 1 (identical)
+'''
+def similarity(first, second):
+    if not first or not second:
+        return 0.0
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+
+'''
+Name: SimilarityStrategy
+Description: Picks the unvisited link whose title is most similar to the goal's
+Attributes: name, goal, visited
+Methods: new_round, choose
+'''
+
+class SimilarityStrategy:
+    name = "similarity"
+
+    def __init__(self, graph=None, mistakeRate=0.0, rng=None):
+        self.random = rng or random.Random()
+        self.goal = None
+        self.goalGrams = frozenset()
+        self.visited = set()
+
+    def new_round(self, start, goal):
+        self.goal = canonical_title(goal)
+        self.goalGrams = trigrams(goal)
+        self.visited = {title_key(start)}
+
+    '''
+    The title to click next from the article titles linked on the current page, or None
+    '''
+
+    def choose(self, current, links):
+        self.visited.add(title_key(current))
+        best = None
+        bestScore = -1.0
+        for title in links:
+            if title == self.goal:
+                return title
+            if title_key(title) in self.visited:
+                continue
+            # Random tie-break so bots sharing a round do not all take the same route
+            score = similarity(trigrams(title), self.goalGrams) + self.random.random() * 1e-6
+            if score > bestScore:
+                best, bestScore = title, score
+        return best
+
+
+'''
+Name: GreedyStrategy
+Description: Follows the shortest route in a link index, re-planning when the page it is
+on leaves the route. Falls back on similarity for pages the index does not know, and for
+a mistakeRate fraction of clicks
+Attributes: graph, mistakeRate, route
+Methods: new_round, choose
+'''
+
+class GreedyStrategy(SimilarityStrategy):
+    name = "greedy"
+
+    def __init__(self, graph=None, mistakeRate=0.0, rng=None):
+        super().__init__(graph, mistakeRate, rng)
+        self.graph = graph
+        self.mistakeRate = mistakeRate
+        self.route = []
+
+    def new_round(self, start, goal):
+        super().new_round(start, goal)
+        self.route = []
+
+    def next_on_route(self, current):
+        if current not in self.route[:-1]:
+            self.route = (self.graph.solve(current, self.goal) or []) if self.graph else []
+        if current in self.route[:-1]:
+            return self.route[self.route.index(current) + 1]
+        return None
+
+    def choose(self, current, links):
+        step = self.next_on_route(current)
+        if step is not None and step in links and self.random.random() >= self.mistakeRate:
+            self.visited.add(title_key(current))
+            return step
+        return super().choose(current, links)
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (GreedyStrategy, SimilarityStrategy)}
+
+
+'''
+Name: BotPlayer
+Description: Plays rounds in race windows borrowed from an EnginePool, one at a time
+Attributes: pool, strategy, name, thinkMs, window, splits
+Methods: play, page_loaded, read_links, click_from, reached_goal, give_up
+'''
+
+class BotPlayer(QObject):
+    finished = pyqtSignal(dict)
+
+    def __init__(self, pool, strategy, name, thinkMs=THINK_MS, maxClicks=MAX_CLICKS,
+                 rng=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.strategy = strategy
+        self.name = name
+        self.thinkMs = thinkMs
+        self.maxClicks = maxClicks
+        self.random = rng or random.Random()
+        self.window = None
+        self.links = {}
+        self.timeout = QTimer(self)
+        self.timeout.setSingleShot(True)
+        self.timeout.timeout.connect(self.give_up)
+
+    def play(self, start, goal):
+        self.splits = []
+        self.loads = []
+        self.loadStartNs = time.perf_counter_ns()
+        self.done = False
+        self.window = self.pool.acquire(start, goal, self.reached_goal)
+        self.strategy.new_round(self.window.start, self.window.goal)
+        self.window.browser.loadFinished.connect(self.page_loaded)
+        self.window.browser.loadStarted.connect(self.load_started)
+        self.timeout.start(ROUND_TIMEOUT_MS)
+
+    def load_started(self):
+        self.loadStartNs = time.perf_counter_ns()
+
+    def page_loaded(self, ok):
+        if self.done:
+            return
+        self.loads.append((time.perf_counter_ns() - self.loadStartNs) / NS_PER_MS)
+        page = self.window.page
+        current = page.path[-1] if page.path else self.window.start
+        self.splits.append((self.window.clock.elapsed_seconds(), current))
+        # Think times vary by half either way, like a player reading the page
+        QTimer.singleShot(int(self.thinkMs * self.random.uniform(0.5, 1.5)), self.read_links)
+
+    '''
+    Use the page's link snapshot (see LinkBridge) when it is for the current page; ask the
+    page directly only if the snapshot has not arrived
+    '''
+
+    def read_links(self):
+        if self.done:
+            return
+        page = self.window.page
+        if page.linksTitle is not None and page.linksTitle == self.splits[-1][1]:
+            self.click_from(page.links)
+        else:
+            page.runJavaScript(LINKS_SCRIPT, self.links_read)
+
+    def links_read(self, hrefs):
+        if not self.done:
+            self.click_from(article_links(hrefs))
+
+    def click_from(self, links):
+        self.links = links
+        current = self.splits[-1][1] if self.splits else self.window.start
+        choice = self.strategy.choose(current, self.links)
+        if choice is None or self.window.page.clicks >= self.maxClicks:
+            self.give_up()
+            return
+        self.window.page.runJavaScript(CLICK_SCRIPT % json.dumps(self.links[choice]))
+
+    def _detach(self):
+        self.done = True
+        self.timeout.stop()
+        self.window.browser.loadFinished.disconnect(self.page_loaded)
+        self.window.browser.loadStarted.disconnect(self.load_started)
+
+    '''
+    onFinish callback of the race window: record the run instead of showing GameComplete
+    '''
+
+    def reached_goal(self, seconds, clicks=None, par=None, start=None, goal=None,
+                     filterStats=None, path=None, splits=None, mode=None):
+        self._detach()
+        self.splits.append((seconds, goal))
+        self.finished.emit(self.result(True, seconds, clicks, par, path))
+        return None
+
+    def give_up(self):
+        if self.done:
+            return
+        self._detach()
+        window = self.window
+        window.clock.stop()
+        self.finished.emit(self.result(False, window.clock.elapsed_seconds(),
+                                       window.page.clicks, window.par, list(window.page.path)))
+        window.roundActive = False
+        self.pool.release(window)
+
+    def result(self, finished, seconds, clicks, par, path):
+        return {"name": self.name, "strategy": self.strategy.name,
+                "start": self.window.start, "goal": self.window.goal, "finished": finished,
+                "time": seconds, "clicks": clicks, "par": par, "path": path or [],
+                "splits": self.splits, "load_ms": self.loads}
+
+
+'''
+Build a link index matching the pages MockWiki serves for these rounds: each path, plus
+the filler links of every page on it
+'''
+def mock_link_graph(mock, rounds, filename):
+    edges = []
+    for entry in rounds:
+        for title in entry["path"]:
+            title = canonical_title(title)
+            edges.extend((title, target) for target in mock.links.get(title, []))
+            edges.extend((title, target) for target in mock._filler(title))
+    build_link_graph(edges, filename)
+    return LinkGraph(filename)
+
+
+'''
+Play rounds in this process with up to concurrent bots at once and return their results.
+Runs in a pool worker, so everything it needs comes in through options; chunk is this
+worker's share of the rounds, which with the seed fixes every bot's choices
+'''
+def run_worker(rounds, options, chunk=0):
+    import RaceWindow
+    from PageCache import CachingProxy, PageCache, default_proxy
+    from RaceBenchmark import process_rss_kb
+    from Telemetry import TELEMETRY_FILE, default_telemetry
+    from TitleResolver import TITLE_CACHE_FILE, default_resolver
+
+    application = QApplication.instance() or QApplication(sys.argv)
+    workDir = tempfile.mkdtemp(prefix="wikiracing-bot-")
+    # Bot navigations are kept out of the player's telemetry log
+    telemetry = default_telemetry(os.path.join(workDir, TELEMETRY_FILE))
+    mock = None
+    if options["mock"]:
+        from MockWiki import MockWikiServer
+        mock = MockWikiServer()
+        for entry in rounds:
+            mock.add_path(entry["path"])
+        mock.start()
+        # Mock titles are kept out of the player's title cache
+        default_resolver(os.path.join(workDir, TITLE_CACHE_FILE))
+        proxy = CachingProxy(PageCache(os.path.join(workDir, "page_cache")),
+                             upstream=mock.baseUrl).start()
+        graph = mock_link_graph(mock, rounds, os.path.join(workDir, "linkgraph.bin"))
+    else:
+        proxy = default_proxy()
+        graph = default_graph()
+
+    concurrent = max(1, min(options["concurrent"], len(rounds)))
+    pool = RaceWindow.EnginePool(size=concurrent, proxy=proxy)
+    pool.prewarm()
+
+    pending = list(rounds)
+    results = []
+    began = time.perf_counter()
+
+    def next_round(bot):
+        if pending:
+            entry = pending.pop()
+            bot.play(entry["path"][0], entry["path"][-1])
+        elif len(results) == len(rounds):
+            application.quit()
+
+    def round_done(bot, result):
+        results.append(result)
+        # The finished window goes back to the pool from a zero timer posted after this
+        # one, so wait a turn longer before taking a window for the next round
+        QTimer.singleShot(0, lambda: QTimer.singleShot(0, lambda: next_round(bot)))
+
+    bots = []
+    for index in range(concurrent):
+        rng = random.Random((options["seed"] * 1000 + chunk) * 1000 + index)
+        strategy = STRATEGIES[options["strategy"]](graph, options["mistakeRate"], rng)
+        bot = BotPlayer(pool, strategy, "bot-%s" % strategy.name, options["thinkMs"],
+                        options["maxClicks"], rng)
+        bot.finished.connect(lambda result, bot=bot: round_done(bot, result))
+        bots.append(bot)
+        QTimer.singleShot(0, lambda bot=bot: next_round(bot))
+    application.exec_()
+
+    elapsed = time.perf_counter() - began
+    if mock is not None:
+        proxy.stop()
+        mock.stop()
+    telemetry.flush()
+    return {"results": results, "seconds": elapsed, "rss_kb": process_rss_kb(),
+            "cache": proxy.cache.stats()}
+
+
+'''
+Start/goal rounds for a load test: MockWiki chains, or pairs from the round pair index
+'''
+def make_rounds(count, mock, difficulty, seed=0):
+    if mock:
+        from RaceBenchmark import synthetic_rounds
+        return synthetic_rounds(count)
+    from RoundGenerator import default_generator
+    generator = default_generator()
+    if generator is None:
+        sys.exit("No round pair index to draw rounds from; build one with RoundGenerator.py "
+                 "or pass --mock")
+    generator.random.seed(seed)
+    return [{"path": list(generator.sample_band(difficulty))} for _ in range(count)]
+
+
+'''
+Run rounds across a process pool and summarise them. Each worker process has its own
+QApplication and browsers, so the pool uses spawned rather than forked processes
+'''
+def run(rounds, processes, options):
+    from RaceBenchmark import summarise
+    processes = max(1, min(processes, len(rounds)))
+    chunks = [rounds[index::processes] for index in range(processes)]
+    began = time.perf_counter()
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) \
+            as executor:
+        workers = list(executor.map(run_worker, chunks, [options] * processes,
+                                    range(processes)))
+    elapsed = time.perf_counter() - began
+    results = [result for worker in workers for result in worker["results"]]
+    finished = [result for result in results if result["finished"]]
+    clicks = sum(result["clicks"] or 0 for result in results)
+    return {
+        "rounds": len(results),
+        "finished": len(finished),
+        "processes": processes,
+        "concurrent_per_process": options["concurrent"],
+        "wall_seconds": elapsed,
+        "clicks_per_second": clicks / elapsed if elapsed else None,
+        "round_seconds": summarise([result["time"] for result in finished]),
+        "clicks_over_par": summarise([result["clicks"] - result["par"] for result in finished
+                                      if result["par"] is not None]),
+        "page_load_ms": summarise([load for result in results for load in result["load_ms"]]),
+        "worker_rss_kb": [worker["rss_kb"] for worker in workers],
+        "results": results,
+    }
+
+
+'''
+Save finished runs as ghosts players can race against
+'''
+def record_ghosts(results, store=None):
+    store = store or default_ghosts()
+    for result in results:
+        if result["finished"]:
+            store.add(Ghost(result["start"], result["goal"], result["name"], result["time"],
+                            result["clicks"], result["splits"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wiki-Racing bot players")
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--concurrent", type=int, default=2, help="browsers per process")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="greedy")
+    parser.add_argument("--think-ms", type=int, default=THINK_MS)
+    parser.add_argument("--mistake-rate", type=float, default=0.0)
+    parser.add_argument("--max-clicks", type=int, default=MAX_CLICKS)
+    parser.add_argument("--difficulty", default="medium")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mock", action="store_true", help="race generated MockWiki pages")
+    parser.add_argument("--ghosts", action="store_true", help="save finished runs as ghosts")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    arguments = parser.parse_args()
+    options = {"strategy": arguments.strategy, "thinkMs": arguments.think_ms,
+               "mistakeRate": arguments.mistake_rate, "maxClicks": arguments.max_clicks,
+               "concurrent": arguments.concurrent, "mock": arguments.mock,
+               "seed": arguments.seed}
+    report = run(make_rounds(arguments.rounds, arguments.mock, arguments.difficulty,
+                             arguments.seed), arguments.processes, options)
+    if arguments.ghosts:
+        record_ghosts(report["results"])
+    report = json.dumps(report, indent=2)
+    if arguments.output:
+        with open(arguments.output, mode='w', encoding='utf-8') as file:
+            file.write(report)
+    else:
+        print(report)
@@ -0,0 +1,268 @@
+'''
+RaceClient - joins a RaceServer from the game and shows the live standings
+RaceClient wraps a QTcpSocket speaking the server's newline-delimited JSON and turns its
+messages into Qt signals, so nothing blocks the event loop. RaceLobby is the window a
+player waits in between rounds: it counts down to each round the server announces, opens
+a race window for it and reports the finish back.
+'''
+
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont
+from PyQt5.QtNetwork import QAbstractSocket, QTcpSocket
+from PyQt5.QtWidgets import *
+import json
+
+from RaceClock import NS_PER_SECOND, format_elapsed
+from RaceServer import RACE_PORT
+
+
+'''
+Name: RaceClient
+Description: Connection to a race server
+Attributes: name, playerId, isHost, round
+Methods: connect_to, send, finish, progress, start_round, close
+'''
+
+class RaceClient(QObject):
+    connected = pyqtSignal()
+    roundStarted = pyqtSignal(dict)
+    standingsChanged = pyqtSignal(list)
+    hostChanged = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.playerId = None
+        self.isHost = False
+        self.round = None
+        self.socket = QTcpSocket(self)
+        self.socket.connected.connect(self.say_hello)
+        self.socket.readyRead.connect(self.read_messages)
+        self.socket.disconnected.connect(self.lost_connection)
+        # Qt 5.15 renamed the error signal to errorOccurred
+        if hasattr(self.socket, "errorOccurred"):
+            self.socket.errorOccurred.connect(self.socket_error)
+        else:
+            self.socket.error[QAbstractSocket.SocketError].connect(self.socket_error)
+        self.closed = False
+
+    def connect_to(self, host, port=RACE_PORT):
+        self.socket.connectToHost(host, port)
+
+    '''
+    Leave the server without reporting it as a lost connection. Safe to call again
+    '''
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.socket.disconnected.disconnect(self.lost_connection)
+        self.socket.disconnectFromHost()
+
+    def lost_connection(self):
+        self.failed.emit("Disconnected from server")
+
+    def socket_error(self, _):
+        self.failed.emit(self.socket.errorString())
+
+    def send(self, message):
+        if self.socket.state() == QAbstractSocket.ConnectedState:
+            self.socket.write((json.dumps(message) + '\n').encode('utf-8'))
+
+    def say_hello(self):
+        self.send({"type": "hello", "name": self.name})
+
+    '''
+    Report a finish of round number, which may no longer be the server's current round
+    '''
+
+    def finish(self, number, seconds, clicks, path=None):
+        self.send({"type": "finish", "round": number, "time": seconds,
+                   "clicks": clicks, "path": path or []})
+
+    def progress(self, number, clicks):
+        self.send({"type": "progress", "round": number, "clicks": clicks})
+
+    '''
+    Ask the server for a new round; without a start and goal it picks one
+    '''
+
+    def start_round(self, start=None, goal=None):
+        self.send({"type": "start_round", "start": start, "goal": goal})
+
+    def read_messages(self):
+        while self.socket.canReadLine():
+            try:
+                message = json.loads(bytes(self.socket.readLine()))
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue  # Valid JSON but not a message, e.g. [] or "x"
+            kind = message.get("type")
+            if kind == "welcome":
+                self.playerId = message["player"]
+                self.isHost = bool(message.get("host"))
+                self.connected.emit()
+                self.hostChanged.emit(self.isHost)
+            elif kind == "host":
+                self.isHost = True
+                self.hostChanged.emit(True)
+            elif kind == "round":
+                self.round = message
+                self.roundStarted.emit(message)
+            elif kind == "standings":
+                if self.round is None or message.get("round") == self.round["round"]:
+                    self.standingsChanged.emit(message["standings"])
+            elif kind == "error":
+                self.failed.emit(message.get("message", "Server error"))
+
+
+'''
+Name: RaceLobby
+Description: Waiting room for a shared race: round info, countdown and live standings
+Attributes: client, standings, startBtn
+Methods: round_started, begin_round, end_window, report_progress, round_finished,
+show_standings
+'''
+
+class RaceLobby(QMainWindow):
+    def __init__(self, client, startRace, parent=None):
+        super().__init__(parent)
+        self.client = client
+        client.setParent(self)
+        # Callable (start, goal, onFinish) that opens a race window for a round
+        self.startRace = startRace
+        # Race window of the latest round and the slot reporting its progress
+        self.window = None
+        self.progressSlot = None
+
+        self.setWindowTitle("Wiki-Racing - Race Lobby")
+        self.resize(500, 600)
+        self.central = QWidget()
+        self.layout = QVBoxLayout(self.central)
+        self.roundLabel = QLabel("Connecting...")
+        self.roundLabel.setFont(QFont("MS Gothic", 15))
+        self.roundLabel.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.roundLabel)
+        self.standings = QListWidget()
+        self.standings.setFont(QFont("MS Gothic", 12))
+        self.layout.addWidget(self.standings)
+        self.startBtn = QPushButton("Start Round")
+        self.startBtn.setEnabled(False)
+        self.startBtn.clicked.connect(lambda: self.client.start_round())
+        self.layout.addWidget(self.startBtn)
+        self.backBtn = QPushButton("Leave")
+        self.backBtn.clicked.connect(self.close)
+        self.layout.addWidget(self.backBtn)
+        self.setCentralWidget(self.central)
+
+        self.countdown = QTimer(self)
+        self.countdown.timeout.connect(self.tick)
+        self.startsIn = 0
+
+        client.connected.connect(lambda: self.roundLabel.setText("Waiting for the host..."))
+        client.hostChanged.connect(self.startBtn.setEnabled)
+        client.roundStarted.connect(self.round_started)
+        client.standingsChanged.connect(self.show_standings)
+        client.failed.connect(lambda error: self.roundLabel.setText(error))
+        self.show()
+
+    def closeEvent(self, event):
+        self.countdown.stop()
+        self.end_window()
+        self.client.close()
+        super().closeEvent(event)
+
+    def round_started(self, message):
+        self.startsIn = max(0, round(message.get("starts_in", 0)))
+        self.countdown.start(1000)
+        self.tick()
+
+    def tick(self):
+        message = self.client.round
+        if self.startsIn <= 0:
+            self.countdown.stop()
+            self.begin_round(message["start"], message["goal"])
+            return
+        self.roundLabel.setText("Round %d: %s -> %s\nStarting in %d" % (
+            message["round"], message["start"], message["goal"], self.startsIn))
+        self.startsIn -= 1
+
+    '''
+    Open the race window for a round. The round number and window are bound into its
+    callbacks, so a finish is always reported for the round it was raced in
+    '''
+
+    def begin_round(self, start, goal):
+        number = self.client.round["round"]
+        self.roundLabel.setText("Round %d: %s -> %s\nRacing!" % (number, start, goal))
+        self.end_window()
+        window = None
+
+        def finished(*result, **details):
+            return self.round_finished(number, window, *result, **details)
+
+        def progress(_):
+            self.report_progress(number, window)
+
+        window = self.startRace(start, goal, finished)
+        self.window = window
+        self.progressSlot = progress
+        # Each page load after a click updates this player's line in everyone's standings
+        window.browser.urlChanged.connect(progress)
+
+    '''
+    Stop reporting the latest window's progress, and end its round if it is still racing
+    (a new round began, or the player left the lobby)
+    '''
+
+    def end_window(self):
+        window, self.window = self.window, None
+        if window is None:
+            return
+        self.disconnect_progress(window)
+        if window.roundActive:
+            window.end_round()
+
+    def disconnect_progress(self, window):
+        if self.progressSlot is None:
+            return
+        try:
+            window.browser.urlChanged.disconnect(self.progressSlot)
+        except TypeError:
+            pass  # Already disconnected
+        self.progressSlot = None
+
+    def report_progress(self, number, window):
+        if window.roundActive:
+            self.client.progress(number, window.page.clicks)
+
+    '''
+    onFinish callback for the race window of round number: report the result and come
+    back to the lobby
+    '''
+
+    def round_finished(self, number, window, seconds, clicks=None, par=None, start=None,
+                       goal=None, filterStats=None, path=None, splits=None, mode=None):
+        self.client.finish(number, seconds, clicks, path)
+        if window is self.window:
+            self.disconnect_progress(window)
+            self.window = None
+        self.roundLabel.setText("Round %d finished in %s" % (
+            number, format_elapsed(round(seconds * NS_PER_SECOND))))
+        self.show()
+        self.raise_()
+        return self
+
+    def show_standings(self, rows):
+        self.standings.clear()
+        for row in rows:
+            if row["finished"]:
+                text = "%d. %s  %s  (%d clicks)" % (
+                    row["rank"], row["name"],
+                    format_elapsed(round(row["time"] * NS_PER_SECOND)), row["clicks"])
+            else:
+                text = "-  %s  racing, %d clicks" % (row["name"], row["clicks"])
+            self.standings.addItem(text)
@@ -0,0 +1,144 @@
+'''
+RaceClock - monotonic, high resolution timing for a round
+The race time is the difference between two time.perf_counter_ns marks, so it does not
+depend on how often (or how late) the display timer fires. The on-screen clock is only a
+view of the marks and can refresh at whatever rate is cheapest.
+
+Comparing drift and timer wakeups against the old 10 ms tick accumulator:
+    python RaceClock.py --benchmark [seconds]
+'''
+
+import json
+import random
+import sys
+import time
+
+NS_PER_MS = 1000000
+NS_PER_SECOND = 1000000000
+
+# Display refresh intervals (ms): smooth while the race window has focus,
+# a few times a second while it is in the background, paused while minimised
+DISPLAY_INTERVAL_ACTIVE = 33
+DISPLAY_INTERVAL_INACTIVE = 250
+
+
+'''
+Name: RaceClock
+Description: A stopwatch made of perf_counter_ns start and stop marks, plus split marks
+for the checkpoints of relay and scavenger rounds
+Attributes: startNs, stopNs, splits
+Methods: start, stop, split, reset, elapsed_ns, elapsed_seconds, running
+'''
+
+class RaceClock:
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+        self.startNs = None
+        self.stopNs = None
+        self.splits = []  # Elapsed ns at each split, in order
+
+    def start(self):
+        self.startNs = self.clock()
+        self.stopNs = None
+        self.splits = []
+
+    def stop(self):
+        if self.running():
+            self.stopNs = self.clock()
+        return self.elapsed_ns()
+
+    '''
+    Mark a split at the current time (the stop mark once stopped). Returns its elapsed ns
+    '''
+
+    def split(self):
+        elapsed = self.elapsed_ns()
+        self.splits.append(elapsed)
+        return elapsed
+
+    def reset(self):
+        self.startNs = None
+        self.stopNs = None
+        self.splits = []
+
+    def running(self):
+        return self.startNs is not None and self.stopNs is None
+
+    def elapsed_ns(self):
+        if self.startNs is None:
+            return 0
+        end = self.clock() if self.stopNs is None else self.stopNs
+        return end - self.startNs
+
+    def elapsed_seconds(self):
+        return self.elapsed_ns() / NS_PER_SECOND
+
+
+'''
+Format a duration in nanoseconds the way the LCD shows it: mm:ss.zzz
+'''
+def format_elapsed(ns):
+    ms = ns // NS_PER_MS
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return "%02d:%02d.%03d" % (minutes, seconds, ms)
+
+
+'''
+Pick the display refresh interval for the race window's state.
+Returns None when the clock does not need repainting at all
+'''
+def display_interval(visible, active):
+    if not visible:
+        return None
+    return DISPLAY_INTERVAL_ACTIVE if active else DISPLAY_INTERVAL_INACTIVE
+
+
+'''
+Simulate a race of the given length on a loaded event loop.
+The tick accumulator mirrors the old MainWindow.showTime (add 10 ms per 10 ms timer
+tick); the race clock reads its marks. Random busy work between ticks stands in for page
+loads and layout on the GUI thread, which is what delays and coalesces timer events
+'''
+def benchmark(seconds=5.0, loadChance=0.2, maxLoadMs=25, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    for name, interval in (("tick_accumulator", 10), ("race_clock", DISPLAY_INTERVAL_ACTIVE)):
+        clock = RaceClock()
+        accumulated = 0
+        wakeups = 0
+        clock.start()
+        deadline = time.perf_counter() + seconds
+        nextTick = time.perf_counter()
+        while time.perf_counter() < deadline:
+            nextTick += interval / 1000
+            delay = nextTick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # A QTimer that falls behind fires once, not once per missed interval
+                nextTick = time.perf_counter()
+            wakeups += 1
+            accumulated += interval * NS_PER_MS
+            format_elapsed(clock.elapsed_ns())
+            if rng.random() < loadChance:
+                busyUntil = time.perf_counter() + rng.uniform(0, maxLoadMs) / 1000
+                while time.perf_counter() < busyUntil:
+                    pass
+        trueNs = clock.stop()
+        measured = accumulated if name == "tick_accumulator" else clock.elapsed_ns()
+        results[name] = {
+            "true_seconds": trueNs / NS_PER_SECOND,
+            "recorded_seconds": measured / NS_PER_SECOND,
+            "drift_ms": (measured - trueNs) / NS_PER_MS,
+            "wakeups_per_second": wakeups * NS_PER_SECOND / trueNs,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        length = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+        print(json.dumps(benchmark(length), indent=2))
+    else:
+        print(__doc__)
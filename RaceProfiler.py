@@ -0,0 +1,358 @@
+'''
+RaceProfiler - opt-in instrumentation for race windows, shown live and saved as a trace
+Start the game with --profile to record page loads (loadStarted to loadFinished), the
+time CustomWebPage takes to decide each navigation, GUI event-loop lag, renderer memory
+and the interceptor's request counts. A dock on the race window and a label in its
+status bar show the latest figures; "Export trace" writes everything recorded as a
+Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+Recording is a couple of perf_counter_ns() calls and a deque append, and the history is
+bounded, so profiling a whole event night does not grow memory or slow the race.
+
+Measuring the cost of recording on the calling thread:
+    python RaceProfiler.py --benchmark [events]
+'''
+
+from collections import deque
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QTimer, Qt
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import *
+
+from RaceClock import NS_PER_MS
+
+TRACE_FILE = "race_trace.json"
+
+# Trace events kept in memory; older ones are dropped first
+MAX_EVENTS = 200000
+# How often the event loop is checked for lag, memory is sampled and the dock refreshed
+LAG_INTERVAL_MS = 50
+SAMPLE_INTERVAL_MS = 1000
+DISPLAY_INTERVAL_MS = 500
+# Recent navigation decisions the dock's percentile is taken over
+DECISION_WINDOW = 200
+
+NS_PER_US = 1000
+
+
+'''
+Resident memory in bytes of process pid, or None where it cannot be read
+Reads /proc on Linux; elsewhere uses psutil if it is installed
+'''
+def process_memory(pid):
+    if not pid:
+        return None
+    try:
+        with open("/proc/%d/status" % pid, 'rb') as file:
+            for line in file:
+                if line.startswith(b"VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+'''
+Name: RaceProfiler
+Description: Bounded recorder of trace events and counters shared by every race window.
+span/instant/count_request are safe to call from any thread
+Attributes: events, lastLoadMs, decisionsUs, lagMs, maxLagMs, rendererBytes, requests
+Methods: span, instant, counter, count_request, track_page, snapshot, export_trace, stop
+'''
+
+class RaceProfiler(QObject):
+    def __init__(self, maxEvents=MAX_EVENTS, parent=None):
+        super().__init__(parent)
+        self.originNs = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = deque(maxlen=maxEvents)
+        self.lock = threading.Lock()
+        self.threadIds = {}
+        self.lastLoadMs = None
+        self.decisionsUs = deque(maxlen=DECISION_WINDOW)
+        self.lagMs = 0.0
+        self.maxLagMs = 0.0
+        self.rendererBytes = None
+        self.requests = {"total": 0, "blocked": 0, "proxied": 0}
+        self.pages = []
+
+        # A timer that fires late by more than its interval means the GUI thread was busy
+        self.lagTimer = QTimer(self)
+        self.lagTimer.setTimerType(Qt.PreciseTimer)
+        self.lagTimer.timeout.connect(self.check_lag)
+        self.lastTickNs = time.perf_counter_ns()
+        self.lagTimer.start(LAG_INTERVAL_MS)
+        self.sampleTimer = QTimer(self)
+        self.sampleTimer.timeout.connect(self.sample)
+        self.sampleTimer.start(SAMPLE_INTERVAL_MS)
+
+    def stop(self):
+        self.lagTimer.stop()
+        self.sampleTimer.stop()
+
+    # Small, stable thread numbers for the trace viewer's rows
+    def _tid(self):
+        ident = threading.get_ident()
+        tid = self.threadIds.get(ident)
+        if tid is None:
+            with self.lock:
+                tid = self.threadIds.setdefault(ident, len(self.threadIds) + 1)
+                self.events.append({"ph": "M", "name": "thread_name", "pid": self.pid,
+                                    "tid": tid, "args": {"name": threading.current_thread().name}})
+        return tid
+
+    def _us(self, ns):
+        return (ns - self.originNs) / NS_PER_US
+
+    # Under the lock, so export_trace never copies the deque while another thread appends
+    def _record(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    '''
+    Record an operation that ran from startNs to endNs (perf_counter_ns values)
+    '''
+
+    def span(self, name, startNs, endNs, category="race", **args):
+        self._record({"ph": "X", "name": name, "cat": category, "pid": self.pid,
+                      "tid": self._tid(), "ts": self._us(startNs),
+                      "dur": (endNs - startNs) / NS_PER_US, "args": args})
+
+    def instant(self, name, category="race", **args):
+        self._record({"ph": "i", "name": name, "cat": category, "pid": self.pid,
+                      "tid": self._tid(), "ts": self._us(time.perf_counter_ns()),
+                      "s": "t", "args": args})
+
+    def counter(self, name, **values):
+        self._record({"ph": "C", "name": name, "pid": self.pid, "tid": self._tid(),
+                      "ts": self._us(time.perf_counter_ns()), "args": values})
+
+    '''
+    Count a request seen by the interceptor. Called on Chromium's IO thread
+    '''
+
+    def count_request(self, blocked=False, proxied=False):
+        with self.lock:
+            self.requests["total"] += 1
+            self.requests["blocked"] += blocked
+            self.requests["proxied"] += proxied
+
+    def record_decision(self, startNs, endNs, allowed, url):
+        with self.lock:
+            self.decisionsUs.append((endNs - startNs) / NS_PER_US)
+        self.span("navigation_decision", startNs, endNs, allowed=allowed, url=url)
+
+    '''
+    Time page loads of a QWebEnginePage and include its renderer in memory samples
+    '''
+
+    def track_page(self, page):
+        started = []
+
+        def load_started():
+            started[:] = [time.perf_counter_ns()]
+
+        def load_finished(ok):
+            if started:
+                endNs = time.perf_counter_ns()
+                self.lastLoadMs = (endNs - started[0]) / NS_PER_MS
+                self.span("page_load", started[0], endNs, ok=ok,
+                          url=page.url().toString())
+                started.clear()
+
+        page.loadStarted.connect(load_started)
+        page.loadFinished.connect(load_finished)
+        page.destroyed.connect(lambda: self.pages.remove(page) if page in self.pages else None)
+        self.pages.append(page)
+
+    def check_lag(self):
+        now = time.perf_counter_ns()
+        self.lagMs = max(0.0, (now - self.lastTickNs) / NS_PER_MS - LAG_INTERVAL_MS)
+        self.lastTickNs = now
+        self.maxLagMs = max(self.maxLagMs, self.lagMs)
+        if self.lagMs >= LAG_INTERVAL_MS:
+            self.span("event_loop_stall", now - int(self.lagMs * NS_PER_MS), now,
+                      lag_ms=self.lagMs)
+
+    '''
+    Sample renderer memory and request counts into counter events
+    '''
+
+    def sample(self):
+        pids = set()
+        for page in self.pages:
+            # QWebEnginePage.renderProcessPid needs Qt 5.15
+            pid = getattr(page, "renderProcessPid", lambda: 0)()
+            if pid:
+                pids.add(pid)
+        sizes = [size for size in map(process_memory, pids) if size is not None]
+        self.rendererBytes = sum(sizes) if sizes else None
+        if self.rendererBytes is not None:
+            self.counter("renderer_memory", mb=self.rendererBytes / 2 ** 20)
+        with self.lock:
+            requests = dict(self.requests)
+        self.counter("requests", **requests)
+        self.counter("event_loop_lag", ms=self.lagMs)
+
+    def snapshot(self):
+        with self.lock:
+            decisions = sorted(self.decisionsUs)
+            requests = dict(self.requests)
+            events = len(self.events)
+        return {
+            "page_load_ms": self.lastLoadMs,
+            "decision_us": decisions[len(decisions) // 2] if decisions else None,
+            "decision_p95_us": decisions[int(len(decisions) * 0.95)] if decisions else None,
+            "lag_ms": self.lagMs,
+            "max_lag_ms": self.maxLagMs,
+            "renderer_mb": (self.rendererBytes / 2 ** 20
+                            if self.rendererBytes is not None else None),
+            "requests": requests,
+            "events": events,
+        }
+
+    '''
+    Write the recorded events as a Chrome trace. Returns the file name
+    '''
+
+    def export_trace(self, filename=TRACE_FILE):
+        with self.lock:
+            events = list(self.events)
+        temp = filename + ".tmp"
+        with open(temp, 'w', encoding='utf-8') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        os.replace(temp, filename)
+        return filename
+
+
+'''
+Short status bar summary of a profiler snapshot
+'''
+def describe_snapshot(snapshot):
+    parts = []
+    if snapshot["page_load_ms"] is not None:
+        parts.append("load %.0f ms" % snapshot["page_load_ms"])
+    parts.append("lag %.0f ms" % snapshot["lag_ms"])
+    if snapshot["renderer_mb"] is not None:
+        parts.append("renderer %.0f MB" % snapshot["renderer_mb"])
+    parts.append("%d requests" % snapshot["requests"]["total"])
+    return " | ".join(parts)
+
+
+'''
+Name: ProfilerDock
+Description: Dockable panel with the profiler's live figures and a trace export button
+Attributes: profiler, labels, statusLabel, exportBtn
+Methods: refresh, export
+'''
+
+class ProfilerDock(QDockWidget):
+    ROWS = (("page_load_ms", "Last page load", "%.1f ms"),
+            ("decision_us", "Navigation decision (median)", "%.1f us"),
+            ("decision_p95_us", "Navigation decision (p95)", "%.1f us"),
+            ("lag_ms", "Event loop lag", "%.1f ms"),
+            ("max_lag_ms", "Worst event loop lag", "%.1f ms"),
+            ("renderer_mb", "Renderer memory", "%.0f MB"))
+
+    def __init__(self, profiler, statusLabel=None, parent=None):
+        super().__init__("Profiler", parent)
+        self.profiler = profiler
+        # Label in the window's status bar that gets a one line summary
+        self.statusLabel = statusLabel
+        self.setObjectName("ProfilerDock")
+        panel = QWidget()
+        grid = QFormLayout(panel)
+        self.labels = {}
+        for key, caption, _ in self.ROWS + (("requests", "Requests", None),
+                                            ("events", "Trace events", None)):
+            label = QLabel("-")
+            label.setFont(QFont("MS Gothic", 10))
+            grid.addRow(caption, label)
+            self.labels[key] = label
+        self.exportBtn = QPushButton("Export trace")
+        self.exportBtn.clicked.connect(self.export)
+        grid.addRow(self.exportBtn)
+        self.setWidget(panel)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(DISPLAY_INTERVAL_MS)
+
+    def refresh(self):
+        if not self.parentWidget() or not self.parentWidget().isVisible():
+            return
+        snapshot = self.profiler.snapshot()
+        if self.statusLabel is not None:
+            self.statusLabel.setText(describe_snapshot(snapshot))
+        if not self.isVisible():
+            return
+        for key, _, form in self.ROWS:
+            value = snapshot[key]
+            self.labels[key].setText("-" if value is None else form % value)
+        requests = snapshot["requests"]
+        self.labels["requests"].setText("%d (%d blocked, %d proxied)" % (
+            requests["total"], requests["blocked"], requests["proxied"]))
+        self.labels["events"].setText(str(snapshot["events"]))
+
+    def export(self):
+        filename = self.profiler.export_trace(time.strftime("race_trace_%Y%m%d_%H%M%S.json"))
+        self.exportBtn.setText("Saved %s" % filename)
+
+
+_defaultProfiler = None
+
+'''
+Returns the profiler shared by every race window, created on first use
+'''
+def default_profiler():
+    global _defaultProfiler
+    if _defaultProfiler is None:
+        _defaultProfiler = RaceProfiler()
+    return _defaultProfiler
+
+
+'''
+Time span() and count_request() on the calling thread and the size of the exported trace
+'''
+def benchmark(count=100000):
+    from PyQt5.QtCore import QCoreApplication
+    application = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    profiler = RaceProfiler()
+    start = time.perf_counter()
+    for index in range(count):
+        now = time.perf_counter_ns()
+        profiler.record_decision(now, time.perf_counter_ns(), True, "https://example/%d" % index)
+    spanTime = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(count):
+        profiler.count_request(blocked=False, proxied=True)
+    countTime = time.perf_counter() - start
+    filename = os.path.join(tempfile.mkdtemp(prefix="race_profiler_"), TRACE_FILE)
+    start = time.perf_counter()
+    profiler.export_trace(filename)
+    exportTime = time.perf_counter() - start
+    profiler.stop()
+    return {
+        "events": count,
+        "us_per_span": spanTime / count * 1e6,
+        "us_per_request_count": countTime / count * 1e6,
+        "export_s": exportTime,
+        "trace_mb": os.path.getsize(filename) / 2 ** 20,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        for key, value in benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000).items():
+            print(f"{key}: {value}")
+    else:
+        print(__doc__)
@@ -0,0 +1,396 @@
+'''
+RaceServer - an asyncio race server for playing the same round with everyone on the LAN
+Players connect over TCP and speak newline-delimited JSON. The server hands every player
+the same start and goal with a short countdown, collects their finishes and pushes live
+standings. Each message is encoded once and written to every socket without waiting on
+any of them; standings updates are coalesced so a burst of finishes costs one broadcast,
+and a player whose socket stops draining is dropped instead of holding the others up.
+
+Messages from a player:
+    {"type": "hello", "name": "..."}                        first message on a connection
+    {"type": "progress", "round": 3, "clicks": 4}           optional, shown in standings
+    {"type": "finish", "round": 3, "time": 81.2, "clicks": 6, "path": [...]}
+    {"type": "start_round", "start": "...", "goal": "..."}  host only; omit both for a
+                                                            round from the pair index
+Messages from the server:
+    {"type": "welcome", "player": 7, "host": false}
+    {"type": "round", "round": 3, "start": "...", "goal": "...", "starts_in": 5.0}
+    {"type": "standings", "round": 3, "standings": [{"name", "time", "clicks", ...}]}
+    {"type": "host"}                                        this player now hosts
+    {"type": "error", "message": "..."}
+
+The first player to connect hosts and starts the rounds; when they leave, the next
+longest connected player takes over.
+
+    python RaceServer.py [--host 0.0.0.0] [--port 8765] [--countdown 5] [--difficulty medium]
+Several headless players against a local server, timing the fan-out:
+    python RaceServer.py --simulate [players] [rounds]
+'''
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import statistics
+import sys
+import time
+
+RACE_PORT = 8765
+COUNTDOWN_SECONDS = 5.0
+
+# Standings pushed at most this often (seconds), however quickly finishes arrive
+STANDINGS_INTERVAL = 0.1
+
+# A player with this much unsent data is too slow to keep and is disconnected
+MAX_BUFFERED = 256 * 1024
+MAX_LINE = 64 * 1024
+
+
+def encode(message):
+    return (json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+'''
+Name: Player
+Description: One connection: its name, writer and result in the current round
+'''
+
+class Player:
+    def __init__(self, playerId, name, writer):
+        self.id = playerId
+        self.name = name
+        self.writer = writer
+        self.clicks = 0
+        self.finished = None  # (time, clicks) once the goal is reached
+
+
+'''
+Name: RaceServer
+Description: Shared rounds and standings for every connected player
+Attributes: players, round, results
+Methods: start, close, start_round, broadcast, standings
+'''
+
+class RaceServer:
+    def __init__(self, host="0.0.0.0", port=RACE_PORT, pairSource=None,
+                 countdown=COUNTDOWN_SECONDS):
+        self.host = host
+        self.port = port
+        # Callable returning a (start, goal) pair for rounds the host does not choose
+        self.pairSource = pairSource
+        self.countdown = countdown
+        self.players = {}
+        self.ids = itertools.count(1)
+        self.round = None
+        # Finishes of the current round kept sorted as (time, clicks, order, player id)
+        self.results = []
+        self.order = itertools.count()
+        self.standingsPending = False
+        self.server = None
+        self.handlers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port,
+                                                 limit=MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        for player in list(self.players.values()):
+            player.writer.close()
+        # Let every connection handler see its socket close and finish
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def host_player(self):
+        return next(iter(self.players.values()), None)
+
+    '''
+    Serve one connection until it closes. Anything that is not a JSON object is ignored
+    '''
+
+    async def handle(self, reader, writer):
+        player = None
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            hello = json.loads(await reader.readline() or b'{}')
+            if not isinstance(hello, dict) or hello.get("type") != "hello":
+                return
+            name = str(hello.get("name") or "Player")[:40]
+            player = Player(next(self.ids), name, writer)
+            self.players[player.id] = player
+            self.send(player, {"type": "welcome", "player": player.id,
+                               "host": self.host_player() is player})
+            if self.round is not None:
+                self.send(player, dict(self.round, starts_in=max(
+                    0.0, self.round["starts_at"] - time.monotonic())))
+            self.schedule_standings()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(message, dict):
+                    await self.dispatch(player, message)
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            if player is not None:
+                self.remove(player)
+            writer.close()
+            self.handlers.discard(task)
+
+    async def dispatch(self, player, message):
+        kind = message.get("type")
+        if kind == "finish":
+            self.finish(player, message)
+        elif kind == "progress" and self.current(message) and player.finished is None:
+            try:
+                player.clicks = int(message.get("clicks") or 0)
+            except (TypeError, ValueError):
+                self.send(player, {"type": "error", "message": "clicks must be a number"})
+                return
+            self.schedule_standings()
+        elif kind == "start_round":
+            if player is not self.host_player():
+                self.send(player, {"type": "error", "message": "Only the host starts rounds"})
+                return
+            start, goal = message.get("start"), message.get("goal")
+            if not (isinstance(start, str) and isinstance(goal, str) and start and goal):
+                if self.pairSource is None:
+                    self.send(player, {"type": "error", "message": "No start and goal given"})
+                    return
+                try:
+                    start, goal = await asyncio.get_running_loop().run_in_executor(
+                        None, self.pairSource)
+                except (OSError, LookupError, ValueError) as error:
+                    # e.g. an empty difficulty band, or Wikipedia out of reach
+                    self.send(player, {"type": "error",
+                                       "message": "Could not pick a round: %s" % error})
+                    return
+            self.start_round(start, goal)
+
+    def current(self, message):
+        return self.round is not None and message.get("round") == self.round["round"]
+
+    def remove(self, player):
+        wasHost = self.host_player() is player
+        if self.players.pop(player.id, None) is None:
+            return
+        self.results = [result for result in self.results if result[3] != player.id]
+        if wasHost and self.players:
+            self.send(self.host_player(), {"type": "host"})
+        self.schedule_standings()
+
+    '''
+    Begin a round for everyone: reset results and broadcast the start and goal
+    '''
+
+    def start_round(self, start, goal):
+        number = self.round["round"] + 1 if self.round else 1
+        self.round = {"type": "round", "round": number, "start": start, "goal": goal,
+                      "starts_at": time.monotonic() + self.countdown}
+        self.results = []
+        for player in self.players.values():
+            player.clicks = 0
+            player.finished = None
+        # starts_at is this machine's clock; players are told how long to wait instead
+        message = dict(self.round, starts_in=self.countdown)
+        del message["starts_at"]
+        self.broadcast(message)
+        self.schedule_standings()
+
+    def finish(self, player, message):
+        if not self.current(message) or player.finished is not None:
+            return
+        try:
+            seconds = float(message["time"])
+            clicks = int(message.get("clicks") or 0)
+        except (KeyError, TypeError, ValueError):
+            self.send(player, {"type": "error", "message": "A finish needs a time and clicks"})
+            return
+        player.finished = (seconds, clicks)
+        player.clicks = clicks
+        bisect.insort(self.results, (seconds, clicks, next(self.order), player.id))
+        self.schedule_standings()
+
+    '''
+    Finished players by time, then everyone still racing by clicks so far
+    '''
+
+    def standings(self):
+        rows = []
+        for rank, (seconds, clicks, _, playerId) in enumerate(self.results, 1):
+            rows.append({"rank": rank, "name": self.players[playerId].name,
+                         "time": seconds, "clicks": clicks, "finished": True})
+        racing = sorted((player for player in self.players.values() if player.finished is None),
+                        key=lambda player: -player.clicks)
+        rows.extend({"rank": None, "name": player.name, "time": None, "clicks": player.clicks,
+                     "finished": False} for player in racing)
+        return rows
+
+    def schedule_standings(self):
+        if not self.standingsPending:
+            self.standingsPending = True
+            asyncio.get_running_loop().call_later(STANDINGS_INTERVAL, self.push_standings)
+
+    def push_standings(self):
+        self.standingsPending = False
+        self.broadcast({"type": "standings",
+                        "round": self.round["round"] if self.round else None,
+                        "standings": self.standings()})
+
+    '''
+    Encode message once and queue it on every connection without awaiting any of them
+    '''
+
+    def broadcast(self, message):
+        data = encode(message)
+        for player in list(self.players.values()):
+            self.send(player, data)
+
+    def send(self, player, message):
+        data = message if isinstance(message, bytes) else encode(message)
+        transport = player.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > MAX_BUFFERED:
+            transport.abort()
+            return
+        player.writer.write(data)
+
+
+'''
+Start a server and several headless players on localhost, have the host start rounds and
+every player finish after a random delay. Reports how long the round announcement and the
+final standings took to reach everyone
+'''
+async def simulate(players=200, rounds=3, seed=0):
+    rng = random.Random(seed)
+    server = await RaceServer("127.0.0.1", 0, countdown=0.0).start()
+    clients = []
+    for index in range(players):
+        # Standings for hundreds of players are longer than any line a player sends
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port,
+                                                       limit=64 * MAX_LINE)
+        writer.write(encode({"type": "hello", "name": "Player %d" % index}))
+        clients.append((reader, writer))
+
+    async def play(reader, writer, roundTimes, standingTimes):
+        host = json.loads(await reader.readline())["host"]
+        for number in range(1, rounds + 1):
+            if host:
+                writer.write(encode({"type": "start_round", "start": "Article %d" % number,
+                                     "goal": "Article %d" % (number + 1)}))
+            while True:
+                message = json.loads(await reader.readline())
+                if message["type"] == "round" and message["round"] == number:
+                    roundTimes.append(time.perf_counter() - sent[number])
+                    break
+            await asyncio.sleep(rng.uniform(0, 0.2))
+            writer.write(encode({"type": "finish", "round": number,
+                                 "time": rng.uniform(30, 300), "clicks": rng.randint(3, 12)}))
+            while True:
+                message = json.loads(await reader.readline())
+                if (message["type"] == "standings" and message["round"] == number
+                        and all(row["finished"] for row in message["standings"])):
+                    standingTimes.append(time.perf_counter() - lastFinish[0])
+                    break
+            # Let everyone see the final standings before the host starts the next round
+            await barrier()
+
+    sent = {}
+    lastFinish = [0.0]
+    arrived = [0, asyncio.Event()]
+
+    async def barrier():
+        arrived[0] += 1
+        if arrived[0] == players:
+            arrived[0] = 0
+            event, arrived[1] = arrived[1], asyncio.Event()
+            event.set()
+        else:
+            await arrived[1].wait()
+
+    startRound = server.start_round
+    finish = server.finish
+
+    def timed_start_round(start, goal):
+        sent[server.round["round"] + 1 if server.round else 1] = time.perf_counter()
+        startRound(start, goal)
+
+    def timed_finish(player, message):
+        lastFinish[0] = time.perf_counter()
+        finish(player, message)
+
+    server.start_round = timed_start_round
+    server.finish = timed_finish
+
+    # Wait until every hello has been handled before the host starts
+    while len(server.players) < players:
+        await asyncio.sleep(0.01)
+    roundTimes, standingTimes = [], []
+    began = time.perf_counter()
+    await asyncio.gather(*(play(reader, writer, roundTimes, standingTimes)
+                           for reader, writer in clients))
+    elapsed = time.perf_counter() - began
+    for _, writer in clients:
+        writer.close()
+    await server.close()
+
+    def summary(values):
+        ordered = sorted(values)
+        return {"median_ms": statistics.median(ordered) * 1000,
+                "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+                "max_ms": ordered[-1] * 1000}
+
+    return {"players": players, "rounds": rounds, "seconds": elapsed,
+            "round_fanout": summary(roundTimes),
+            "final_standings_after_last_finish": summary(standingTimes)}
+
+
+'''
+Pairs for host-less rounds: the round pair index if one is built, else Special:Random
+'''
+def default_pair_source(difficulty):
+    from RandomPool import default_pool
+    from RoundGenerator import default_generator
+    generator = default_generator()
+    if generator is not None:
+        return lambda: generator.sample_band(difficulty)
+    pool = default_pool()
+    pool.refill()
+    return pool.take_pair
+
+
+async def serve(host, port, countdown, difficulty):
+    server = await RaceServer(host, port, default_pair_source(difficulty), countdown).start()
+    print(f"Race server listening on {host}:{server.port}")
+    await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--simulate":
+        players = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+        print(json.dumps(asyncio.run(simulate(players, rounds)), indent=2))
+    else:
+        parser = argparse.ArgumentParser(description="Wiki-Racing LAN race server")
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=RACE_PORT)
+        parser.add_argument("--countdown", type=float, default=COUNTDOWN_SECONDS)
+        parser.add_argument("--difficulty", default="medium",
+                            help="band for rounds the host does not choose")
+        arguments = parser.parse_args()
+        try:
+            asyncio.run(serve(arguments.host, arguments.port, arguments.countdown,
+                              arguments.difficulty))
+        except KeyboardInterrupt:
+            pass
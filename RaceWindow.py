@@ -0,0 +1,710 @@
+'''
+RaceWindow - the race browser: MainWindow, its Chromium page and the engine pool
+Kept apart from Browser.py because importing QtWebEngine is the slowest part of startup;
+the menu is shown first and this module is loaded afterwards (see Browser.race_pool)
+'''
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt, QUrl, QTimer, pyqtSignal
+from PyQt5.QtGui import *
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInfo, QWebEngineUrlRequestInterceptor
+from PyQt5.QtWebEngineWidgets import *
+from PyQt5.QtWidgets import *
+import sys
+import time
+from urllib.parse import urlsplit
+import uuid
+
+from GhostRuns import default_ghosts
+from HintEngine import HintDock, default_engine
+from LinkBridge import install_link_bridge
+from LinkGraph import default_graph
+from NavigationRules import RELAY_MODE, SINGLE_MODE, NavigationRules, describe_goals
+from PageCache import default_proxy, proxied_host
+from Prefetcher import default_prefetcher
+from RaceProfiler import ProfilerDock, default_profiler
+from RaceClock import NS_PER_MS, NS_PER_SECOND, RaceClock, display_interval, format_elapsed
+from RequestFilter import RequestFilter, describe_savings
+from Telemetry import default_telemetry
+from TitleResolver import default_resolver
+from WikiTitles import article_links, title_key, title_to_path
+
+# Request filter mode for race pages: "standard", "lite" (HTML and CSS only) or "off"
+# Pass --lite on the command line for lite races
+REQUEST_FILTER_MODE = "lite" if "--lite" in sys.argv else "standard"
+
+# Pass --hints for training rounds: a dock ranks the links on each page by how close they
+# are to the goal (see HintEngine)
+HINT_MODE = "--hints" in sys.argv
+
+# Pass --profile to show the profiler dock on race windows and record a trace (see RaceProfiler)
+PROFILE_MODE = "--profile" in sys.argv
+
+# Race windows kept warm between rounds, and how many rounds a page serves before it is
+# replaced to release renderer memory
+ENGINE_POOL_SIZE = 1
+PAGE_RECYCLE_ROUNDS = 25
+BLANK_URL = "about:blank"
+
+# QWebEngineUrlRequestInfo.ResourceType values mapped to the names RequestFilter uses
+RESOURCE_TYPE_NAMES = {value: name[len("ResourceType"):]
+                       for name, value in vars(QWebEngineUrlRequestInfo).items()
+                       if name.startswith("ResourceType") and name != "ResourceType"}
+
+# QWebEnginePage.NavigationType values by name, for telemetry events
+NAVIGATION_TYPE_NAMES = {value: name[len("NavigationType"):]
+                         for name, value in vars(QWebEnginePage).items()
+                         if name.startswith("NavigationType") and name != "NavigationType"}
+
+
+'''
+Name: MainWindow
+Attributes: browser, status, toolbar
+Methods: add_to_toolbar, new_round, update_title, set_url
+'''
+
+class MainWindow(QMainWindow):
+    # Page class used for the race browser; the benchmark harness swaps in a timed subclass
+    pageClass = None
+
+    # Initialise Browser window
+    # Without a start and goal the window is built hidden, ready for EnginePool to reuse
+    def __init__(self, start=None, goal=None, parent=None, proxy=None):
+        super(MainWindow, self).__init__(parent)
+
+        '''
+        Initialising The primary window with the following:
+        Toolbar: [Back, Next, Reload, Stop] 
+        Central Widget:
+        QGraphicsView 
+            QTWebEngineView
+            QLCDNumber
+        '''
+        # Central widget with QGraphicsView as the root and a QVBoxLayout
+        self.central = QGraphicsView()
+        self.vBox = QVBoxLayout()
+        # Articles are loaded through the local caching proxy rather than directly
+        self.proxy = proxy if proxy is not None else default_proxy()
+        self.wikiUrl = self.proxy.baseUrl + "/wiki/"
+        self.pool = None
+        # Called with the round's results when the goal is reached; returns the window
+        # that shows them (Browser passes GameComplete)
+        self.onFinish = None
+        self.rounds = 0
+        self.roundActive = False
+        self.gameStarted = False
+        self.profiler = default_profiler() if PROFILE_MODE else None
+
+        self.lcd = self.add_timer()
+        self.vBox.addWidget(self.lcd)
+        self.endPageLabel = QLabel()
+        self.endPageLabel.setAlignment(Qt.AlignCenter)
+        self.endPageLabel.setFont(QFont("MS Gothic", 30))
+        self.vBox.addWidget(self.endPageLabel, 0)
+        self.parLabel = QLabel()
+        self.parLabel.setAlignment(Qt.AlignCenter)
+        self.parLabel.setFont(QFont("MS Gothic", 15))
+        self.vBox.addWidget(self.parLabel, 0)
+        # Where the fastest recorded run of this round was at the same time on the clock
+        self.ghost = None
+        self.ghostLabel = QLabel()
+        self.ghostLabel.setAlignment(Qt.AlignCenter)
+        self.ghostLabel.setFont(QFont("MS Gothic", 12))
+        self.vBox.addWidget(self.ghostLabel, 0)
+        self.add_browser(goal or "")
+        self.vBox.addWidget(self.browser)
+        self.central.setLayout(self.vBox)
+        self.central.setMinimumHeight(800)
+        self.central.setMinimumWidth(800)
+        self.central.resize(800, 800)
+        self.setCentralWidget(self.central)
+
+        # Initialising a status bar object
+        self.status = QStatusBar(self)
+        self.setStatusBar(self.status)
+
+        # Initialising a top toolbar as QToolBar object
+        self.toolbar = QToolBar("Navigation")
+        self.addToolBar(self.toolbar)
+        self.add_to_toolbar("Back", "Back to previous page", self.browser.back)
+        self.add_to_toolbar("Next", "Forward to next page",
+                            self.browser.forward)
+        self.add_to_toolbar("Reload", "Reload page", self.browser.reload)
+        self.add_to_toolbar("Stop", "Stop loading page", self.browser.stop)
+
+        # Link count of the current page, and a heads-up when the goal is one click away
+        self.linksLabel = QLabel()
+        self.status.addPermanentWidget(self.linksLabel)
+
+        if self.profiler is not None:
+            self.profileLabel = QLabel()
+            self.status.addPermanentWidget(self.profileLabel)
+            self.profilerDock = ProfilerDock(self.profiler, self.profileLabel, self)
+            self.addDockWidget(Qt.RightDockWidgetArea, self.profilerDock)
+
+        self.hintDock = None
+        engine = default_engine() if HINT_MODE else None
+        if engine is not None:
+            self.hintDock = HintDock(engine, self)
+            self.addDockWidget(Qt.LeftDockWidgetArea, self.hintDock)
+
+        if start is not None:
+            self.new_round(start, goal)
+
+    '''
+    Method to add navigation button to the toolbar
+    Arguments:
+    text - the label of the button
+    tip - the tooltip that displays on hover
+    action - the function to be performed on triggered
+    '''
+
+    def add_to_toolbar(self, text, tip, action):
+        button = QAction(text, self)
+        button.setStatusTip(tip)
+        button.triggered.connect(action)
+        self.toolbar.addAction(button)
+
+    '''
+    Method to create a browser via QTWebEngineView
+    The profile, interceptor, request filter and prefetcher are shared by every round
+    (see shared_profile), so only the view and its page belong to this window
+    '''
+
+    def add_browser(self, goal):
+        self.browser = QWebEngineView()
+        self.profile, self.requestFilter = shared_profile(self.proxy)
+        # Fetches the likeliest next articles into the page cache while the player reads
+        self.prefetcher = default_prefetcher(self.proxy)
+        self.page = (self.pageClass or CustomWebPage)(
+            goal, self.stop_timer, self.profile, self.browser, self.wikiUrl)
+        self.browser.setPage(self.page)
+        self.connect_page()
+        self.browser.setMinimumHeight(600)
+        self.browser.setMinimumWidth(800)
+        self.browser.resize(800, 600)
+        self.browser.loadFinished.connect(self.update_title)
+        # return browser
+
+    '''
+    Replace the page with a fresh one on the same profile. Used by the engine pool
+    every PAGE_RECYCLE_ROUNDS rounds so renderer memory cannot creep up forever
+    '''
+
+    def recycle_page(self):
+        oldPage = self.page
+        self.page = (self.pageClass or CustomWebPage)(
+            self.goal or "", self.stop_timer, self.profile, self.browser, self.wikiUrl)
+        self.browser.setPage(self.page)
+        self.connect_page()
+        oldPage.deleteLater()
+
+    def connect_page(self):
+        self.page.linksChanged.connect(self.show_links)
+        self.page.checkpointReached.connect(self.record_split)
+        if self.prefetcher is not None:
+            self.page.navigationStarted.connect(self.prefetcher.navigated)
+        if self.profiler is not None:
+            self.profiler.track_page(self.page)
+
+    def add_timer(self):
+        lcd = QLCDNumber(self)
+        lcd.setNumDigits(8)
+        lcd.setSegmentStyle(QLCDNumber.Filled)
+        lcd.resize(600, 200)
+        # The race time comes from the clock's marks; the QTimer only repaints the LCD
+        self.clock = RaceClock()
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.CoarseTimer)
+        self.timer.timeout.connect(self.showTime)
+        lcd.display(format_elapsed(0))
+        return lcd
+
+    '''
+    Reset the window for a round from start to goal and load the start page
+    goal may be a list of checkpoints, reached in order (RELAY_MODE) or in any order
+    (SCAVENGER_MODE). Everything a round leaves behind (timer, clicks, history, goal,
+    splits, filter stats) is cleared here, so a pooled window behaves exactly like a
+    newly built one
+    '''
+
+    def new_round(self, start, goal, mode=SINGLE_MODE):
+        # Redirects and spelling variants become the article itself, e.g. "usa" -> "United States"
+        resolver = default_resolver()
+        self.start = resolver.resolve(start)
+        self.mode = mode
+        goals = [goal] if isinstance(goal, str) else goal
+        self.goals = [resolver.resolve(title) for title in goals]
+        if mode != RELAY_MODE:
+            # Only a relay may send the player to the same article twice
+            unique = {}
+            for title in self.goals:
+                unique.setdefault(title_key(title), title)
+            self.goals = list(unique.values())
+        # The checkpoint the player is heading for; the one hints and prefetching aim at
+        self.goal = self.goals[0]
+        self.goalText = describe_goals(self.goals, mode)
+        # (title, seconds) of each checkpoint reached
+        self.splits = []
+        self.rounds += 1
+        self.timer.stop()
+        self.clock.reset()
+        self.lcd.display(format_elapsed(0))
+        self.gameStarted = False
+        self.roundActive = True
+        self.par = self.round_par()
+        self.parLabel.setText(self.par_text())
+        self.ghost = default_ghosts().best_for(self.start, self.goalText)
+        self.ghostLabel.setVisible(self.ghost is not None)
+        self.show_ghost(0.0)
+        self.requestFilter.reset_stats()
+        self.page.new_round(self.goals, mode)
+        self.page.telemetry.emit("round_start", round=self.page.roundId, start=self.start,
+                                 goal=self.goalText, mode=mode, checkpoints=len(self.goals),
+                                 par=self.par)
+        self.browser.history().clear()
+        self.startUrl = self.set_start(self.start)
+        self.goalUrl = self.set_goal(self.goal)
+        self.show_checkpoints()
+        self.set_url(self.startUrl)
+        self.show()
+
+    def stop_timer(self):
+        self.clock.stop()
+        self.timer.stop()
+        self.showTime()
+        self.roundActive = False
+        if self.prefetcher is not None:
+            self.prefetcher.navigated()
+        self.page.telemetry.emit("round_finish", round=self.page.roundId,
+                                 seconds=self.clock.elapsed_seconds(), clicks=self.page.clicks,
+                                 par=self.par)
+        if self.onFinish is not None:
+            self.window = self.onFinish(self.clock.elapsed_seconds(), self.page.clicks, self.par,
+                                        self.start, self.goalText, self.requestFilter.stats(),
+                                        path=list(self.page.path), splits=list(self.splits),
+                                        mode=self.mode)
+        # Called from inside acceptNavigationRequest, so leave the page alone until it returns
+        QTimer.singleShot(0, self.end_round)
+
+    def end_round(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            self.close()
+
+    '''
+    Looks up the fewest clicks needed for this round in the offline link graph
+    Returns None when no index has been built or either page is not in it
+    '''
+
+    def find_par(self, start, goal):
+        graph = default_graph()
+        if graph is None:
+            return None
+        return graph.par(start, goal)
+
+    '''
+    Par of the whole round: a relay's is the sum of its legs. None for a scavenger hunt,
+    whose best order would be a travelling salesman problem
+    '''
+
+    def round_par(self):
+        if self.mode == SINGLE_MODE:
+            return self.find_par(self.start, self.goal)
+        if self.mode != RELAY_MODE:
+            return None
+        par = 0
+        for leg in zip([self.start] + self.goals, self.goals):
+            legPar = self.find_par(*leg)
+            if legPar is None:
+                return None
+            par += legPar
+        return par
+
+    def par_text(self):
+        if self.par is None:
+            return "Par: unknown"
+        return "Par: %d clicks" % self.par
+
+    # Update the QLCDNumber object with current timing
+    def showTime(self):
+        self.lcd.display(format_elapsed(self.clock.elapsed_ns()))
+        if self.ghost is not None:
+            self.show_ghost(self.clock.elapsed_seconds())
+
+    def show_ghost(self, seconds):
+        if self.ghost is None:
+            return
+        title, clicks = self.ghost.position(seconds)
+        if seconds >= self.ghost.seconds:
+            text = "Ghost (%s) finished in %s with %d clicks" % (
+                self.ghost.name, format_elapsed(round(self.ghost.seconds * NS_PER_SECOND)),
+                self.ghost.clicks)
+        else:
+            text = "Ghost (%s): %s, %d clicks" % (self.ghost.name, title, clicks)
+        if text != self.ghostLabel.text():
+            self.ghostLabel.setText(text)
+
+    '''
+    Match the LCD refresh rate to the window state: smooth while focused, slower in the
+    background and not at all while minimised. The race clock keeps running regardless
+    '''
+
+    def adapt_refresh(self):
+        if not self.clock.running():
+            return
+        interval = display_interval(self.isVisible() and not self.isMinimized(),
+                                    self.isActiveWindow())
+        if interval is None:
+            self.timer.stop()
+        else:
+            self.timer.start(interval)
+            self.showTime()
+
+    def changeEvent(self, event):
+        if event.type() in (QtCore.QEvent.WindowStateChange, QtCore.QEvent.ActivationChange):
+            self.adapt_refresh()
+        super().changeEvent(event)
+
+    # Updates the title of the browser window
+    def update_title(self):
+        title = self.browser.page().title()
+        self.setWindowTitle("% s - Wiki-Racing" % title)
+        stats = self.proxy.cache.stats()
+        message = "Page cache: %d hits, %d misses (%.0f%% hit rate). %s" % (
+            stats["hits"], stats["misses"], 100 * stats["hit_rate"],
+            describe_savings(self.requestFilter.stats()))
+        if self.prefetcher is not None:
+            prefetched = self.prefetcher.stats()
+            message += " Prefetched %d pages, %d clicked." % (prefetched["pages"], prefetched["used"])
+        self.status.showMessage(message)
+        # The blank page a pooled window parks on between rounds does not start the clock
+        if self.roundActive and not self.gameStarted and self.browser.url() != QUrl(BLANK_URL):
+            self.clock.start()
+            self.adapt_refresh()
+            self.gameStarted = True
+
+    '''
+    Link snapshot of the page that just loaded: count the links, flag a goal one click
+    away, rank the links for the hint dock and start prefetching the likeliest ones
+    '''
+
+    def show_links(self, title, links, goalInSight):
+        if not self.roundActive:
+            self.linksLabel.clear()
+            if self.hintDock is not None:
+                self.hintDock.clear()
+            return
+        self.linksLabel.setText("%d links%s" % (
+            len(links), " - the goal is one click away!" if goalInSight else ""))
+        if self.hintDock is not None:
+            self.hintDock.show_links(self.goal, links)
+        if self.prefetcher is not None:
+            self.prefetcher.page_ready(title, self.goal, links)
+
+    # Sets the url using QUrl functionality
+    def set_url(self, url):
+        self.browser.setUrl(QUrl(url))
+
+    def set_start(self, start):
+        startUrl = self.wikiUrl + title_to_path(start)
+        return startUrl
+
+    def set_goal(self, goal):
+        goalUrl = self.wikiUrl + title_to_path(goal)
+        self.endPageLabel.setText("Your Goal Is: " + goal)
+        return goalUrl
+
+    '''
+    Record the split for a checkpoint the page reached and aim at the next one
+    '''
+
+    def record_split(self, index, title):
+        # The start page can be a checkpoint, reached before the clock starts
+        seconds = self.clock.split() / NS_PER_SECOND
+        self.splits.append((self.goals[index], seconds))
+        self.page.telemetry.emit("checkpoint", round=self.page.roundId, index=index,
+                                 title=title, seconds=seconds)
+        remaining = self.remaining_goals()
+        if remaining:
+            self.goal = remaining[0]
+            self.goalUrl = self.set_goal(self.goal)
+        self.show_checkpoints()
+
+    def remaining_goals(self):
+        reached = set(self.page.rules.reached)
+        return [title for index, title in enumerate(self.goals) if index not in reached]
+
+    '''
+    Progress through a multi-goal round under the goal label: the next checkpoint of a
+    relay, or every page still to find in a scavenger hunt
+    '''
+
+    def show_checkpoints(self):
+        if self.mode == SINGLE_MODE:
+            return
+        remaining = self.remaining_goals()
+        done = len(self.goals) - len(remaining)
+        if not remaining:
+            text = "All %d checkpoints reached" % len(self.goals)
+        elif self.mode == RELAY_MODE:
+            text = "Checkpoint %d of %d: %s" % (done + 1, len(self.goals), remaining[0])
+        else:
+            text = "Find %d of %d: %s" % (len(remaining), len(self.goals), ", ".join(remaining))
+        if self.splits:
+            title, seconds = self.splits[-1]
+            text += "\nLast: %s at %s" % (title, format_elapsed(round(seconds * NS_PER_SECOND)))
+        self.endPageLabel.setText(text)
+
+    def convert_goal_readable(self):
+        goal = self.goalUrl[len(self.wikiUrl):]
+        goal.capitalize()
+        return goal
+
+
+'''
+Name: EnginePool
+Description: Keeps finished race windows, with their QWebEngineView and page, warm for
+the next round instead of building a new browser every game
+Attributes: idle, size, onFinish, proxy
+Methods: acquire, release, prewarm
+'''
+
+class EnginePool:
+    def __init__(self, size=ENGINE_POOL_SIZE, onFinish=None, proxy=None):
+        self.size = size
+        self.onFinish = onFinish
+        # Proxy the pool's windows load pages through; None for the default proxy
+        self.proxy = proxy
+        self.idle = []
+
+    '''
+    Returns a window running a round from start to goal, reusing an idle one if possible
+    onFinish replaces the pool's finish callback for this round (e.g. a shared race)
+    '''
+
+    def acquire(self, start, goal, onFinish=None, mode=SINGLE_MODE):
+        window = self.idle.pop() if self.idle else MainWindow(proxy=self.proxy)
+        window.pool = self
+        window.onFinish = onFinish or self.onFinish
+        window.new_round(start, goal, mode)
+        return window
+
+    '''
+    Park a finished window: hide it, drop the last article and its history, and keep it
+    if the pool has room. Past that the window is closed, so memory stays bounded
+    '''
+
+    def release(self, window):
+        window.roundActive = False
+        window.timer.stop()
+        window.hide()
+        window.browser.stop()
+        window.browser.setUrl(QUrl(BLANK_URL))
+        window.browser.history().clear()
+        if window.rounds % PAGE_RECYCLE_ROUNDS == 0:
+            window.recycle_page()
+        if len(self.idle) < self.size and window not in self.idle:
+            self.idle.append(window)
+        else:
+            window.pool = None
+            window.close()
+            window.deleteLater()
+
+    '''
+    Build idle windows ahead of time so the first round does not pay for Chromium startup
+    '''
+
+    def prewarm(self):
+        while len(self.idle) < self.size:
+            window = MainWindow(proxy=self.proxy)
+            window.pool = self
+            window.set_url(BLANK_URL)
+            self.idle.append(window)
+
+
+_profiles = {}
+
+'''
+Returns the (QWebEngineProfile, RequestFilter) pair for a proxy, creating it on first use.
+One profile per proxy keeps Chromium's network context and caches alive across rounds
+'''
+def shared_profile(proxy):
+    if proxy not in _profiles:
+        requestFilter = RequestFilter(REQUEST_FILTER_MODE, sizeHint=proxy.size_of)
+        interceptor = WebEngineUrlRequestInterceptor(proxy, requestFilter)
+        profile = QWebEngineProfile()
+        profile.setUrlRequestInterceptor(interceptor)
+        _profiles[proxy] = (profile, requestFilter, interceptor)
+    profile, requestFilter, _ = _profiles[proxy]
+    return profile, requestFilter
+
+
+'''
+Class to intercept every XHR call to load anything
+Requests the RequestFilter rejects (tracking, and in lite mode everything but HTML and
+CSS) are blocked. Remaining subresources from Wikipedia and Wikimedia hosts (images,
+scripts, stylesheets) are redirected onto the local caching proxy so they are served
+from the on-disk cache
+'''
+
+class WebEngineUrlRequestInterceptor(QWebEngineUrlRequestInterceptor):
+    def __init__(self, proxy=None, requestFilter=None, parent=None):
+        super(WebEngineUrlRequestInterceptor, self).__init__(parent)
+        self.proxy = proxy
+        self.requestFilter = requestFilter
+        self.profiler = default_profiler() if PROFILE_MODE else None
+
+    '''
+    Called on the IO thread for every request the page makes, so it must stay cheap
+    '''
+
+    def interceptRequest(self, info):
+        url = info.requestUrl()
+        resourceType = RESOURCE_TYPE_NAMES.get(info.resourceType(), "Unknown")
+        urlString = url.toString(QUrl.FullyEncoded)
+        if self.requestFilter is not None and self.requestFilter.should_block(
+                urlString, url.host(), resourceType):
+            info.block(True)
+            if self.profiler is not None:
+                self.profiler.count_request(blocked=True)
+            return
+        proxied = (self.proxy is not None and bytes(info.requestMethod()) == b"GET"
+                   and resourceType not in ("MainFrame", "SubFrame")
+                   and url.scheme() == "https" and proxied_host(url.host()))
+        if proxied:
+            info.redirect(QUrl(self.proxy.local_url(urlString)))
+        if self.profiler is not None:
+            self.profiler.count_request(proxied=proxied)
+
+
+'''
+Class to restrict navigation to within Wikipedia
+Checks for requests for pages outside of wikipedia as well as 
+search requests made using the inbuilt wikipedia search bar
+If either request is made, the request is ignored
+The decisions themselves are made by NavigationRules
+Every accepted main frame navigation is also reported to the telemetry stream, once its
+page has loaded, with the time the player spent on the page before it
+'''
+
+class CustomWebPage(QWebEnginePage):
+    # (article title, {link title: href}, whether the goal is one of the links) for the
+    # page that just loaded, from the link bridge
+    linksChanged = pyqtSignal(str, dict, bool)
+    # Title of the article an accepted main frame navigation is heading to
+    navigationStarted = pyqtSignal(str)
+    # (position in the round's goals, title) of each checkpoint reached
+    checkpointReached = pyqtSignal(int, str)
+
+    def __init__(self, goal, stopper, profile, parent=None, localUrl=None, telemetry=None):
+        super(CustomWebPage, self).__init__(profile, parent)
+        # Articles served by the local caching proxy count as Wikipedia too
+        self.localUrl = localUrl
+        self.stopper = stopper
+        self.telemetry = telemetry if telemetry is not None else default_telemetry()
+        self.profiler = default_profiler() if PROFILE_MODE else None
+        self.loadFinished.connect(self.record_load)
+        self.linkBridge = install_link_bridge(self)
+        self.linkBridge.snapshotReady.connect(self.record_links)
+        self.new_round(goal)
+
+    '''
+    Point the page at new goals and reset its click count, for a reused race window
+    goal is a title, or a list of titles for a relay or scavenger mode round
+    '''
+
+    def new_round(self, goal, mode=SINGLE_MODE):
+        self.rules = NavigationRules(goal, self.localUrl, default_resolver(), mode)
+        self.clicks = 0
+        self.roundId = uuid.uuid4().hex[:12]
+        # Article titles visited this round, in order, backtracking included
+        self.path = []
+        # Navigation event waiting for its page to load, and when the last page loaded
+        self.pending = None
+        self.pendingNs = None
+        self.lastLoadedNs = None
+        # Article links of the current page, by title, and the page they came from
+        self.links = {}
+        self.linksTitle = None
+
+    '''
+    Method that checks every XHR request to ensure that only those going to Wikipedia destinations
+    are processed. This holds the game player hostage on Wikipedia
+    '''
+
+    def acceptNavigationRequest(self, url,  _type, isMainFrame):
+        # The pool parks idle pages on about:blank between rounds
+        if url.toString() == BLANK_URL:
+            return super().acceptNavigationRequest(url,  _type, isMainFrame)
+        startNs = time.perf_counter_ns()
+        urlString = url.toString(QUrl.FullyEncoded)
+        allowed, title, isGoal = self.rules.check(urlString)
+        if self.profiler is not None:
+            self.profiler.record_decision(startNs, time.perf_counter_ns(), allowed, urlString)
+        if not allowed:
+            if isMainFrame:
+                self.telemetry.emit("blocked", round=self.roundId, url=urlString,
+                                    type=NAVIGATION_TYPE_NAMES.get(_type))
+            return False
+        if isMainFrame and _type == QWebEnginePage.NavigationTypeLinkClicked:
+            self.clicks += 1
+        if isMainFrame:
+            self.record_navigation(urlString, title, _type, isGoal)
+        if isMainFrame and isGoal:
+            self.checkpointReached.emit(self.rules.reach(title), title)
+            if self.rules.finished():
+                self.stopper()
+        return super().acceptNavigationRequest(url,  _type, isMainFrame)
+
+    '''
+    Start a navigation event. Dwell is the time since the previous page finished loading.
+    A navigation that replaces one still loading is reported without a load time
+    '''
+
+    def record_navigation(self, url, title, _type, isGoal):
+        now = time.perf_counter_ns()
+        if title is not None:
+            self.path.append(title)
+        self.navigationStarted.emit(title or "")
+        if self.pending is not None:
+            self.telemetry.emit("navigate", load_ms=None, ok=False, **self.pending)
+        self.pending = {
+            "round": self.roundId,
+            "url": url,
+            "title": title,
+            "type": NAVIGATION_TYPE_NAMES.get(_type),
+            "back": _type == QWebEnginePage.NavigationTypeBackForward,
+            "click": self.clicks,
+            "goal": isGoal,
+            "dwell_ms": ((now - self.lastLoadedNs) / NS_PER_MS
+                         if self.lastLoadedNs is not None else None),
+        }
+        self.pendingNs = now
+
+    '''
+    Take the link snapshot the bridge sends for each loaded page. Reports the links to
+    telemetry, so a link graph can be built from real play (see LinkGraph), and checks in
+    the same pass whether the goal is one click away
+    '''
+
+    def record_links(self, url, hrefs):
+        title = self.rules.article_title(urlsplit(url))
+        if title is None:
+            return
+        self.links = article_links(hrefs)
+        self.linksTitle = title
+        goalInSight = any(self.rules.is_goal(link) for link in self.links)
+        self.telemetry.emit("links", round=self.roundId, title=title, count=len(self.links),
+                            goal_in_sight=goalInSight, links=list(self.links))
+        self.linksChanged.emit(title, self.links, goalInSight)
+
+    def record_load(self, ok):
+        now = time.perf_counter_ns()
+        self.lastLoadedNs = now
+        if self.pending is None:
+            return
+        self.telemetry.emit("navigate", load_ms=(now - self.pendingNs) / NS_PER_MS, ok=ok,
+                            **self.pending)
+        self.pending = None
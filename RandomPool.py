@@ -0,0 +1,200 @@
+'''
+RandomPool - a background pool of pre-resolved random start/goal pairs
+Resolving Special:Random costs a network round-trip per article, so a worker thread
+keeps a few pairs ready ahead of time and saves them to disk, letting "Play Random"
+start the moment the countdown ends, even straight after a restart.
+'''
+
+from collections import deque
+import json
+import os
+import tempfile
+import threading
+import urllib.request
+from urllib.parse import urlsplit
+
+RANDOM_URL = "https://en.wikipedia.org/wiki/Special:Random"
+POOL_FILE = "random_pool.json"
+# Kept apart from POOL_FILE so online titles missing from the offline mirror are not offered
+MIRROR_POOL_FILE = "random_pool_mirror.json"
+POOL_SIZE = 10
+
+
+'''
+Name: NoRedirection
+Description: A URL opener that does not follow redirections (HTTP 30x responses)
+'''
+
+class NoRedirection(urllib.request.HTTPErrorProcessor):
+    def http_response(self, _, response):
+        return response
+    https_response = http_response
+
+
+'''
+Ask Special:Random for an article without following the redirect and return the
+article path from the Location header, e.g. "Albert_Einstein"
+'''
+def fetch_random_title(randomUrl=RANDOM_URL, timeout=10):
+    opener = urllib.request.build_opener(NoRedirection)
+    with opener.open(randomUrl, timeout=timeout) as response:
+        location = response.getheader('Location')
+    title = urlsplit(location or '').path.partition('/wiki/')[2]
+    if not title:
+        raise ValueError(f"'{randomUrl}' did not redirect to an article")
+    return title
+
+
+'''
+Name: RandomArticlePool
+Description: Thread-safe queue of (start, goal) pairs refilled by a daemon worker thread
+Attributes: size, randomUrl, poolFile, lastError
+Methods: refill, reserve, take_pairs, take_pair, save, stop
+'''
+
+class RandomArticlePool:
+    def __init__(self, size=POOL_SIZE, randomUrl=RANDOM_URL, poolFile=POOL_FILE):
+        self.size = size
+        self.randomUrl = randomUrl
+        self.poolFile = poolFile
+        self.pairs = deque()
+        self.lock = threading.Lock()
+        # Keeps saves in order, so an older snapshot never replaces a newer one
+        self.saveLock = threading.Lock()
+        # Pairs were taken since the last save; the worker writes the file, not the taker
+        self.changed = False
+        self.wanted = threading.Event()
+        self.stopped = False
+        self.worker = None
+        # Why the worker's last fetch failed, or None once a fetch succeeds
+        self.lastError = None
+        self.load()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pairs)
+
+    '''
+    Read pairs saved by a previous run. A missing or damaged file just means a cold pool
+    '''
+
+    def load(self):
+        try:
+            with open(self.poolFile, mode='r', encoding='utf-8') as file:
+                saved = json.load(file)
+            self.pairs.extend(tuple(pair) for pair in saved if len(pair) == 2)
+        except (FileNotFoundError, ValueError, TypeError):
+            pass
+
+    '''
+    Write the current pairs to poolFile via a temporary file of its own so a crash, or
+    another copy of the game saving at the same time, never leaves a half written pool
+    '''
+
+    def save(self):
+        with self.saveLock:
+            with self.lock:
+                pairs = list(self.pairs)
+                self.changed = False
+            directory = os.path.dirname(os.path.abspath(self.poolFile))
+            temp = None
+            try:
+                handle, temp = tempfile.mkstemp(prefix=".random_pool.", dir=directory)
+                with os.fdopen(handle, mode='w', encoding='utf-8') as file:
+                    json.dump(pairs, file)
+                os.replace(temp, self.poolFile)
+            except OSError as error:
+                print(f"Could not save random pool to '{self.poolFile}': {error}")
+                if temp is not None and os.path.exists(temp):
+                    os.remove(temp)
+
+    '''
+    Wake the worker (starting it on first use) so it tops the pool back up to size
+    '''
+
+    def refill(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.stopped = False
+            self.worker = threading.Thread(target=self._run, name="RandomPool", daemon=True)
+            self.worker.start()
+        self.wanted.set()
+
+    '''
+    Make sure the pool can hold at least count pairs, for rounds that need several
+    '''
+
+    def reserve(self, count):
+        self.size = max(self.size, count)
+        self.refill()
+
+    def stop(self):
+        self.stopped = True
+        self.wanted.set()
+
+    def _run(self):
+        while not self.stopped:
+            self.wanted.wait()
+            self.wanted.clear()
+            if self.changed:
+                self.save()
+            while not self.stopped and len(self) < self.size:
+                try:
+                    pair = (fetch_random_title(self.randomUrl),
+                            fetch_random_title(self.randomUrl))
+                except (OSError, ValueError) as error:
+                    print(f"Random article fetch failed: {error}")
+                    self.lastError = str(error)
+                    break
+                self.lastError = None
+                with self.lock:
+                    self.pairs.append(pair)
+                self.save()
+
+    '''
+    Returns count pairs if the pool holds that many, else None. Never touches the network
+    or the pool file, so it is the one to call from the GUI thread; the worker is woken
+    either way and saves what is left
+    '''
+
+    def take_pairs(self, count=1):
+        with self.lock:
+            if len(self.pairs) < count:
+                pairs = None
+            else:
+                pairs = [self.pairs.popleft() for _ in range(count)]
+                self.changed = True
+        self.refill()
+        return pairs
+
+    '''
+    Returns a (start, goal) pair without touching the network when the pool is warm
+    Falls back to resolving a pair directly if the pool has run dry, so it may block:
+    only call it off the GUI thread (the race server does, from an executor)
+    '''
+
+    def take_pair(self):
+        with self.lock:
+            pair = self.pairs.popleft() if self.pairs else None
+            self.changed = self.changed or pair is not None
+        if pair is None:
+            pair = (fetch_random_title(self.randomUrl), fetch_random_title(self.randomUrl))
+        self.refill()
+        return pair
+
+
+_defaultPool = None
+
+'''
+Returns the pool shared by every CountdownTimer in this process. With --mirror the
+titles come from the offline mirror's Special:Random
+'''
+def default_pool():
+    global _defaultPool
+    if _defaultPool is None:
+        from PageCache import MIRROR_MODE, default_proxy
+        if MIRROR_MODE:
+            _defaultPool = RandomArticlePool(randomUrl=default_proxy().local_url(RANDOM_URL),
+                                             poolFile=MIRROR_POOL_FILE)
+        else:
+            _defaultPool = RandomArticlePool()
+    return _defaultPool
@@ -0,0 +1,192 @@
+'''
+RequestFilter - decides which subresources a race page may fetch
+The interceptor asks it about every request on the IO thread, so rules are compiled up
+front: blocked hosts into a trie of reversed domain labels (a rule covers its subdomains)
+and blocked URL fragments into an Aho-Corasick automaton that finds any of them in one
+pass over the URL. Blocked requests are counted per round with an estimate of the bytes
+they would have cost, so the time saved can be reported alongside the player's score.
+'''
+
+from collections import deque
+import threading
+
+# Resource types as named by QWebEngineUrlRequestInfo.ResourceType<Name>
+MAIN_FRAME = "MainFrame"
+SUB_FRAME = "SubFrame"
+STYLESHEET = "Stylesheet"
+
+# Modes: "standard" drops tracking and decoration, "lite" loads only HTML and CSS,
+# "off" lets everything through
+MODES = ("standard", "lite", "off")
+LITE_TYPES = frozenset((MAIN_FRAME, SUB_FRAME, STYLESHEET))
+STANDARD_BLOCKED_TYPES = frozenset(("Ping", "CspReport", "Prefetch", "Media", "FontResource"))
+
+# Analytics and fundraising banners: nothing a race needs
+BLOCKED_HOSTS = ("intake-analytics.wikimedia.org", "analytics.wikimedia.org",
+                 "donate.wikimedia.org", "donate.wikipedia.org")
+BLOCKED_PATTERNS = ("/beacon/", "special:bannerloader", "special:centralautologin",
+                    "/w/api.php?action=centralnoticecdncacheupdatebanner",
+                    "ext.eventlogging", "ext.centralnotice")
+
+# Typical transfer sizes used when the page cache does not know a resource's real size
+ESTIMATED_BYTES = {"Image": 20000, "Script": 30000, "FontResource": 40000, "Media": 200000,
+                   "Stylesheet": 15000, "SubFrame": 50000, "Xhr": 2000, "Ping": 500,
+                   "CspReport": 500, "Prefetch": 20000, "Favicon": 2000}
+DEFAULT_ESTIMATE = 5000
+
+
+'''
+Name: HostTrie
+Description: Trie over reversed domain labels. Matching "a.example.org" walks org -> example
+-> a and stops at the first label that ends a rule
+'''
+
+class HostTrie:
+    END = ""
+
+    def __init__(self, hosts=()):
+        self.root = {}
+        for host in hosts:
+            self.add(host)
+
+    def add(self, host):
+        node = self.root
+        for label in reversed(host.lower().strip('.').split('.')):
+            node = node.setdefault(label, {})
+        node[self.END] = True
+
+    def matches(self, host):
+        node = self.root
+        for label in reversed(host.lower().split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self.END in node:
+                return True
+        return False
+
+
+'''
+Name: PatternMatcher
+Description: Aho-Corasick automaton over lower-cased URL fragments
+'''
+
+class PatternMatcher:
+    def __init__(self, patterns=()):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [False]
+        for pattern in patterns:
+            self._insert(pattern.lower())
+        self._link()
+
+    def _insert(self, pattern):
+        state = 0
+        for char in pattern:
+            following = self.goto[state].get(char)
+            if following is None:
+                following = len(self.goto)
+                self.goto[state][char] = following
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(False)
+            state = following
+        self.output[state] = True
+
+    # Breadth-first pass that sets each state's failure link to the longest proper suffix
+    # that is also a prefix of some pattern
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(char, 0)
+                self.output[following] = self.output[following] or self.output[self.fail[following]]
+
+    def search(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+'''
+Name: RequestFilter
+Description: Compiled filter plus per-round savings counters. Safe to call from the
+interceptor's IO thread while the GUI thread reads the stats
+Attributes: mode, blockedRequests, blockedBytes, blockedByType
+Methods: should_block, reset_stats, stats
+'''
+
+class RequestFilter:
+    def __init__(self, mode="standard", blockedHosts=BLOCKED_HOSTS,
+                 blockedPatterns=BLOCKED_PATTERNS, sizeHint=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown request filter mode '{mode}'")
+        self.mode = mode
+        self.hosts = HostTrie(blockedHosts)
+        self.patterns = PatternMatcher(blockedPatterns)
+        # Optional callable url -> size in bytes (e.g. CachingProxy.size_of), or None
+        self.sizeHint = sizeHint
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    '''
+    Returns True if a request for url of the given resource type should be dropped
+    Top level page loads are never blocked here; navigation rules decide those
+    '''
+
+    def should_block(self, url, host, resourceType):
+        if self.mode == "off" or resourceType == MAIN_FRAME:
+            return False
+        if self.mode == "lite":
+            blocked = resourceType not in LITE_TYPES
+        else:
+            blocked = resourceType in STANDARD_BLOCKED_TYPES
+        blocked = blocked or self.hosts.matches(host) or self.patterns.search(url.lower())
+        if blocked:
+            self._count(url, resourceType)
+        return blocked
+
+    def _count(self, url, resourceType):
+        size = self.sizeHint(url) if self.sizeHint is not None else None
+        if size is None:
+            size = ESTIMATED_BYTES.get(resourceType, DEFAULT_ESTIMATE)
+        with self.lock:
+            self.blockedRequests += 1
+            self.blockedBytes += size
+            self.blockedByType[resourceType] = self.blockedByType.get(resourceType, 0) + 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.blockedRequests = 0
+            self.blockedBytes = 0
+            self.blockedByType = {}
+
+    def stats(self):
+        with self.lock:
+            return {"mode": self.mode, "requests": self.blockedRequests,
+                    "bytes": self.blockedBytes, "by_type": dict(self.blockedByType)}
+
+
+'''
+Human readable one-line summary of a stats() dict
+'''
+def describe_savings(stats):
+    if not stats["requests"]:
+        return "No requests filtered"
+    size = stats["bytes"] / 1024
+    unit = "KB"
+    if size >= 1024:
+        size /= 1024
+        unit = "MB"
+    return "Filtered %d requests (~%.1f %s saved)" % (stats["requests"], size, unit)
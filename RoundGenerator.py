@@ -0,0 +1,213 @@
+'''
+RoundGenerator - random rounds at a chosen shortest-path distance
+Start/goal pairs are sampled offline from the link graph: a breadth-first search from
+each of a few thousand random articles files a handful of the articles found at every
+depth into a bucket for that distance. The buckets are written as flat arrays of article
+IDs, so at game time a round is two random numbers and two title lookups in memory-mapped
+files, however large the graph is. Difficulty bands are ranges of distances.
+
+Building the pair index from a link graph (see LinkGraph.py):
+    python RoundGenerator.py build linkgraph.bin round_pairs.bin [sources] [per_distance]
+Drawing rounds from it:
+    python RoundGenerator.py sample linkgraph.bin round_pairs.bin <band or distance> [count]
+'''
+
+from array import array
+import mmap
+import random
+import struct
+import sys
+import time
+
+from LinkGraph import LINK_GRAPH_FILE, LinkGraph, default_graph
+
+ROUND_PAIRS_FILE = "round_pairs.bin"
+
+# File layout: header, one pair count per distance 0..maxDistance, then the pairs of each
+# distance in turn as (start, goal) article ID pairs
+MAGIC = b"WRRP"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQ")
+
+MAX_DISTANCE = 8
+SAMPLE_SOURCES = 2000
+PAIRS_PER_DISTANCE = 4
+
+# Distances (inclusive) that make up each difficulty band
+DIFFICULTY_BANDS = {
+    "easy": (1, 2),
+    "medium": (3, 3),
+    "hard": (4, 5),
+    "expert": (6, MAX_DISTANCE),
+}
+
+
+'''
+Name: RoundGenerator
+Description: Read-only view of a pair index written by build_round_pairs, sampled in O(1)
+Attributes: maxDistance, counts, graph
+Methods: distances, sample, sample_band, close
+'''
+
+class RoundGenerator:
+    def __init__(self, filename=ROUND_PAIRS_FILE, graph=None, rng=None):
+        self.filename = filename
+        self.graph = graph if graph is not None else LinkGraph(LINK_GRAPH_FILE)
+        self.random = rng or random.Random()
+        with open(filename, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.maxDistance, _, nodeCount, edgeCount = HEADER.unpack_from(
+            self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"'{filename}' is not a version {VERSION} round pair index")
+        if (nodeCount, edgeCount) != (self.graph.nodeCount, self.graph.edgeCount):
+            self.map.close()
+            raise ValueError(f"'{filename}' was built from a different link graph")
+        self.view = memoryview(self.map)
+        countsEnd = HEADER.size + 8 * (self.maxDistance + 1)
+        self.counts = self.view[HEADER.size:countsEnd].cast('Q')
+        # First pair of each distance, in pairs
+        self.starts = array('Q', [0])
+        for distance in range(self.maxDistance + 1):
+            self.starts.append(self.starts[-1] + self.counts[distance])
+        self.pairs = self.view[countsEnd:countsEnd + 8 * self.starts[-1]].cast('I')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.pairs.release()
+        self.counts.release()
+        self.view.release()
+        self.map.close()
+
+    '''
+    Distances that have at least one pair
+    '''
+
+    def distances(self):
+        return [distance for distance in range(1, self.maxDistance + 1) if self.counts[distance]]
+
+    '''
+    A random (start, goal) title pair whose shortest path is exactly distance clicks
+    Raises ValueError if the index has no pairs at that distance
+    '''
+
+    def sample(self, distance):
+        if not 0 < distance <= self.maxDistance or not self.counts[distance]:
+            raise ValueError(f"No rounds at distance {distance}")
+        index = 2 * (self.starts[distance] + self.random.randrange(self.counts[distance]))
+        return self.graph.title(self.pairs[index]), self.graph.title(self.pairs[index + 1])
+
+    '''
+    A random pair from a difficulty band (a name from DIFFICULTY_BANDS or a (low, high)
+    range of distances). Each pair in the band is equally likely
+    '''
+
+    def sample_band(self, band):
+        low, high = DIFFICULTY_BANDS[band] if isinstance(band, str) else band
+        low = max(low, 1)
+        high = min(high, self.maxDistance)
+        total = self.starts[high + 1] - self.starts[low] if low <= high else 0
+        if not total:
+            raise ValueError(f"No rounds in difficulty band {band}")
+        # Pairs of neighbouring distances are stored back to back, so one draw covers the band
+        index = 2 * (self.starts[low] + self.random.randrange(total))
+        return self.graph.title(self.pairs[index]), self.graph.title(self.pairs[index + 1])
+
+
+'''
+Distances from source to every article within maxDistance clicks, as a list of BFS levels
+'''
+def bfs_levels(graph, source, maxDistance=MAX_DISTANCE):
+    seen = bytearray(graph.nodeCount)
+    seen[source] = 1
+    offsets = graph.fwdOffsets
+    targets = graph.fwdTargets
+    levels = [[source]]
+    while len(levels) <= maxDistance:
+        frontier = []
+        for node in levels[-1]:
+            for neighbour in targets[offsets[node]:offsets[node + 1]]:
+                if not seen[neighbour]:
+                    seen[neighbour] = 1
+                    frontier.append(neighbour)
+        if not frontier:
+            break
+        levels.append(frontier)
+    return levels
+
+
+'''
+Sample start/goal pairs from graph and write them to filename, bucketed by distance.
+Every sampled start contributes up to perDistance goals at each distance, so long
+distances, which few starts reach, are not crowded out. Returns the pair count per distance
+'''
+def build_round_pairs(graph, filename=ROUND_PAIRS_FILE, sources=SAMPLE_SOURCES,
+                      perDistance=PAIRS_PER_DISTANCE, maxDistance=MAX_DISTANCE, seed=0):
+    rng = random.Random(seed)
+    buckets = [array('I') for _ in range(maxDistance + 1)]
+    candidates = [node for node in range(graph.nodeCount)
+                  if graph.fwdOffsets[node + 1] > graph.fwdOffsets[node]]
+    for source in rng.sample(candidates, min(sources, len(candidates))):
+        for distance, level in enumerate(bfs_levels(graph, source, maxDistance)):
+            if distance == 0:
+                continue
+            for goal in rng.sample(level, min(perDistance, len(level))):
+                buckets[distance].extend((source, goal))
+
+    counts = array('Q', (len(bucket) // 2 for bucket in buckets))
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, maxDistance, 0, graph.nodeCount, graph.edgeCount))
+        file.write(bytes(counts))
+        for bucket in buckets:
+            file.write(bytes(bucket))
+    return list(counts)
+
+
+_defaultGenerator = None
+
+'''
+Returns a RoundGenerator over ROUND_PAIRS_FILE and the default link graph, or None if
+either index is missing or they do not belong together
+'''
+def default_generator():
+    global _defaultGenerator
+    if _defaultGenerator is None:
+        graph = default_graph()
+        if graph is None:
+            return None
+        try:
+            _defaultGenerator = RoundGenerator(ROUND_PAIRS_FILE, graph)
+        except (FileNotFoundError, ValueError):
+            return None
+    return _defaultGenerator
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        with LinkGraph(sys.argv[2]) as graph:
+            start = time.perf_counter()
+            counts = build_round_pairs(graph, sys.argv[3], *map(int, sys.argv[4:6]))
+        print(f"Wrote {sum(counts)} pairs to '{sys.argv[3]}' in "
+              f"{time.perf_counter() - start:.1f} s")
+        for distance, count in enumerate(counts):
+            if count:
+                print(f"  distance {distance}: {count}")
+    elif len(sys.argv) >= 5 and sys.argv[1] == "sample":
+        with LinkGraph(sys.argv[2]) as graph, RoundGenerator(sys.argv[3], graph) as generator:
+            band = sys.argv[4]
+            count = int(sys.argv[5]) if len(sys.argv) > 5 else 5
+            began = time.perf_counter()
+            rounds = [generator.sample(int(band)) if band.isdigit() else generator.sample_band(band)
+                      for _ in range(count)]
+            elapsed = time.perf_counter() - began
+            for start, goal in rounds:
+                print(f"{start} -> {goal} (par {graph.par(start, goal)})")
+        print(f"{elapsed / count * 1e6:.1f} us per round")
+    else:
+        print(__doc__)
@@ -0,0 +1,289 @@
+'''
+RouteAnalytics - what the recorded rounds say about articles and start/goal pairs
+Reads every finished round from the leaderboard store (start, goal, time, clicks, par and
+the route taken) into flat NumPy arrays once, then answers everything with vectorised
+counting: hub articles that winning routes pass through, dead ends players back out of,
+average clicks and time per start/goal pair, and a difficulty score for each pair used to
+balance event rounds. Only the title-to-id encoding touches Python objects per row.
+
+    python RouteAnalytics.py [--db leaderboard.db] [--top N]
+    python RouteAnalytics.py --benchmark [games]
+'''
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from LeaderboardStore import LEADERBOARD_DB, PATH_SEPARATOR, LeaderboardStore
+
+# Pairs played fewer times than this are pulled towards the average difficulty
+PRIOR_GAMES = 5
+
+# Articles need this many visits before their dead-end rate is reported
+MIN_VISITS = 10
+
+TOP_ROWS = 20
+
+
+'''
+Map each value to a dense integer id in order of first appearance.
+Returns (ids as an int32 array, list of distinct values indexed by id)
+'''
+def encode(values):
+    index = {}
+    ids = np.fromiter((index.setdefault(value, len(index)) for value in values),
+                      dtype=np.int32, count=len(values))
+    return ids, list(index)
+
+
+'''
+Rank of each value among the finite ones, scaled to 0 (lowest) .. 1 (highest); NaN stays NaN
+'''
+def percentile_rank(values):
+    ranks = np.full(len(values), np.nan)
+    finite = np.flatnonzero(np.isfinite(values))
+    if len(finite) == 1:
+        ranks[finite] = 0.5
+    elif len(finite) > 1:
+        order = finite[np.argsort(values[finite], kind='stable')]
+        ranks[order] = np.arange(len(finite)) / (len(finite) - 1)
+    return ranks
+
+
+'''
+Indices of the k largest values, largest first
+'''
+def top_indices(values, k):
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-values, k - 1)[:k]
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+'''
+Name: RouteTable
+Description: Recorded rounds as columns. Routes are stored CSR style: the article ids of
+every route back to back in steps, with route g at steps[offsets[g]:offsets[g + 1]]
+Attributes: pair, pairStarts, pairGoals, times, clicks, pars, titles, steps, offsets
+Methods: hubs, dead_ends, pair_stats, difficulty, report
+'''
+
+class RouteTable:
+    def __init__(self, games):
+        games = list(games)
+        self.games = len(games)
+        starts, goals, times, clicks, pars, paths = (
+            zip(*games) if games else ((), (), (), (), (), ()))
+
+        # A pair id per game, from the start and goal ids combined into one integer
+        startIds, startTitles = encode(starts)
+        goalIds, goalTitles = encode(goals)
+        combined = startIds.astype(np.int64) * max(len(goalTitles), 1) + goalIds
+        pairKeys, self.pair = np.unique(combined, return_inverse=True)
+        self.pair = self.pair.astype(np.int64).ravel()
+        self.pairStarts = [startTitles[key] for key in pairKeys // max(len(goalTitles), 1)]
+        self.pairGoals = [goalTitles[key] for key in pairKeys % max(len(goalTitles), 1)]
+
+        # None (not recorded) becomes NaN
+        self.times = np.array(times, dtype=np.float64)
+        self.clicks = np.array(clicks, dtype=np.float64)
+        self.pars = np.array(pars, dtype=np.float64)
+
+        lengths = np.fromiter((path.count(PATH_SEPARATOR) + 1 if path else 0 for path in paths),
+                              dtype=np.int64, count=self.games)
+        routes = PATH_SEPARATOR.join(path for path in paths if path)
+        self.steps, self.titles = encode(routes.split(PATH_SEPARATOR) if routes else [])
+        self.offsets = np.zeros(self.games + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.lengths = lengths
+        # Game and position within its route for every step
+        self.stepGame = np.repeat(np.arange(self.games), lengths)
+        self.stepPosition = np.arange(len(self.steps)) - self.offsets[self.stepGame]
+
+    '''
+    Articles on the most routes, not counting the route's own start and goal.
+    Each route counts an article once however often the player came back to it.
+    Returns a list of (title, routes, share of routes with a recorded path)
+    '''
+
+    def hubs(self, k=TOP_ROWS):
+        interior = (self.stepPosition > 0) & (
+            self.stepPosition < self.lengths[self.stepGame] - 1)
+        articles = len(self.titles)
+        keys = np.unique(self.stepGame[interior] * articles + self.steps[interior])
+        routes = np.bincount(keys % articles, minlength=articles) if articles else keys
+        recorded = max(int(np.count_nonzero(self.lengths)), 1)
+        return [(self.titles[index], int(routes[index]), routes[index] / recorded)
+                for index in top_indices(routes, k) if routes[index]]
+
+    '''
+    Articles players backed out of: A -> B -> A within one route makes B a dead end.
+    Returns a list of (title, dead end count, visits, dead end rate), highest rate first,
+    for articles visited at least minVisits times
+    '''
+
+    def dead_ends(self, k=TOP_ROWS, minVisits=MIN_VISITS):
+        articles = len(self.titles)
+        if len(self.steps) < 3:
+            return []
+        before, middle, after = self.steps[:-2], self.steps[1:-1], self.steps[2:]
+        backtrack = ((self.stepGame[:-2] == self.stepGame[2:]) & (before == after)
+                     & (middle != before))
+        deadEnds = np.bincount(middle[backtrack], minlength=articles)
+        visits = np.bincount(self.steps, minlength=articles)
+        rate = np.where(visits >= minVisits, deadEnds / np.maximum(visits, 1), 0.0)
+        return [(self.titles[index], int(deadEnds[index]), int(visits[index]), rate[index])
+                for index in top_indices(rate, k) if rate[index] > 0]
+
+    '''
+    Per pair arrays: games, mean and best time, mean clicks (NaN if never recorded), par
+    '''
+
+    def pair_stats(self):
+        pairs = len(self.pairStarts)
+        games = np.bincount(self.pair, minlength=pairs)
+        meanTime = np.bincount(self.pair, self.times, minlength=pairs) / np.maximum(games, 1)
+        bestTime = np.full(pairs, np.inf)
+        np.minimum.at(bestTime, self.pair, self.times)
+        known = ~np.isnan(self.clicks)
+        clickGames = np.bincount(self.pair[known], minlength=pairs)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            meanClicks = np.bincount(self.pair[known], self.clicks[known],
+                                     minlength=pairs) / clickGames
+        par = np.full(pairs, np.nan)
+        np.fmax.at(par, self.pair, self.pars)
+        return {"games": games, "mean_time": meanTime, "best_time": bestTime,
+                "mean_clicks": meanClicks, "par": par}
+
+    '''
+    Difficulty of each pair from 0 (easiest) to 1 (hardest): the mean of its percentile
+    ranks for log race time and for clicks relative to par. Each pair's averages are
+    shrunk towards the overall average by PRIOR_GAMES pretend games, so a pair one player
+    happened to breeze through is not rated the easiest round there is
+    '''
+
+    def difficulty(self, priorGames=PRIOR_GAMES):
+        pairs = len(self.pairStarts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            components = [np.log(np.maximum(self.times, 1e-3)),
+                          self.clicks / np.where(self.pars > 0, self.pars, np.nan)]
+            ranks = []
+            for values in components:
+                known = np.isfinite(values)
+                if not known.any():
+                    continue
+                games = np.bincount(self.pair[known], minlength=pairs)
+                total = np.bincount(self.pair[known], values[known], minlength=pairs)
+                overall = values[known].mean()
+                shrunk = (total + priorGames * overall) / (games + priorGames)
+                shrunk[games == 0] = np.nan
+                ranks.append(percentile_rank(shrunk))
+            if not ranks:
+                return np.full(pairs, np.nan)
+            stacked = np.vstack(ranks)
+            counted = np.isfinite(stacked).sum(axis=0)
+            return np.where(counted, np.nansum(stacked, axis=0) / np.maximum(counted, 1), np.nan)
+
+    '''
+    JSON friendly summary: hubs, dead ends and the hardest and easiest pairs
+    '''
+
+    def report(self, k=TOP_ROWS):
+        stats = self.pair_stats()
+        difficulty = self.difficulty()
+
+        def pair_row(index):
+            return {"start": self.pairStarts[index], "goal": self.pairGoals[index],
+                    "games": int(stats["games"][index]),
+                    "mean_time": float(stats["mean_time"][index]),
+                    "best_time": float(stats["best_time"][index]),
+                    "mean_clicks": _number(stats["mean_clicks"][index]),
+                    "par": _number(stats["par"][index]),
+                    "difficulty": _number(difficulty[index])}
+
+        rated = np.where(np.isfinite(difficulty), difficulty, -1.0)
+        hardest = [index for index in top_indices(rated, k) if rated[index] >= 0]
+        easiest = [index for index in top_indices(np.where(rated >= 0, 1.0 - rated, -1.0), k)
+                   if rated[index] >= 0]
+        return {
+            "games": self.games,
+            "pairs": len(self.pairStarts),
+            "articles": len(self.titles),
+            "routes": int(np.count_nonzero(self.lengths)),
+            "hubs": [{"title": title, "routes": routes, "share": float(share)}
+                     for title, routes, share in self.hubs(k)],
+            "dead_ends": [{"title": title, "dead_ends": count, "visits": visits,
+                           "rate": float(rate)}
+                          for title, count, visits, rate in self.dead_ends(k)],
+            "hardest_pairs": [pair_row(index) for index in hardest],
+            "easiest_pairs": [pair_row(index) for index in easiest],
+        }
+
+
+def _number(value):
+    return None if np.isnan(value) else float(value)
+
+
+'''
+Build a RouteTable from every round recorded in a leaderboard database
+'''
+def load_routes(filename=LEADERBOARD_DB):
+    with LeaderboardStore(filename) as store:
+        return RouteTable(store.games())
+
+
+'''
+Random rounds shaped like real ones: skewed article popularity so hubs exist, routes of
+2-10 articles with occasional backtracking, and per-pair difficulty in the times
+'''
+def synthetic_games(count, articles=20000, pairs=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    pairStart = rng.integers(0, articles, pairs)
+    pairGoal = rng.integers(0, articles, pairs)
+    hardness = rng.lognormal(0.0, 0.5, pairs)
+    games = []
+    pairOfGame = rng.integers(0, pairs, count)
+    lengths = rng.integers(2, 11, count)
+    interior = np.minimum(rng.zipf(1.3, lengths.sum()), articles) - 1
+    position = 0
+    for game in range(count):
+        pair = pairOfGame[game]
+        length = lengths[game]
+        route = [int(pairStart[pair])] + list(interior[position:position + length - 2]) + [
+            int(pairGoal[pair])]
+        position += length - 2
+        if length > 3 and rng.random() < 0.2:
+            route.insert(2, route[0])  # Back out of the second article
+        titles = ["Article %d" % article for article in route]
+        games.append((titles[0], titles[-1], float(30 * hardness[pair] * rng.lognormal(0, 0.3)),
+                      len(titles) - 1, 3, PATH_SEPARATOR.join(titles)))
+    return games
+
+
+def benchmark(count=200000):
+    games = synthetic_games(count)
+    start = time.perf_counter()
+    table = RouteTable(games)
+    loaded = time.perf_counter()
+    report = table.report()
+    done = time.perf_counter()
+    return {"games": count, "articles": len(table.titles), "steps": len(table.steps),
+            "load_seconds": loaded - start, "analyse_seconds": done - loaded,
+            "hardest": report["hardest_pairs"][0] if report["hardest_pairs"] else None,
+            "top_hub": report["hubs"][0] if report["hubs"] else None}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        print(json.dumps(benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 200000),
+                         indent=2))
+    else:
+        parser = argparse.ArgumentParser(description="Route analytics over recorded rounds")
+        parser.add_argument("--db", default=LEADERBOARD_DB, help="leaderboard database")
+        parser.add_argument("--top", type=int, default=TOP_ROWS, help="rows per list")
+        arguments = parser.parse_args()
+        print(json.dumps(load_routes(arguments.db).report(arguments.top), indent=2))
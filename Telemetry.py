@@ -0,0 +1,183 @@
+'''
+Telemetry - a stream of per-navigation events written off the GUI thread
+Race pages emit one event per accepted navigation (URL, title, dwell on the previous
+page, load time, back clicks) plus round start and finish markers. emit() only puts the
+event on a bounded queue; a daemon writer thread drains it in batches and appends them to
+a JSON Lines log, so a slow disk can never stall the race. If the writer falls behind
+far enough to fill the queue, events are dropped and counted rather than blocking.
+
+Measuring the cost of emit() on the calling thread:
+    python Telemetry.py --benchmark [events]
+'''
+
+import atexit
+import json
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+TELEMETRY_FILE = "telemetry.jsonl"
+
+# Events written per batch, how long the writer waits for a batch to fill, and how many
+# events may wait in memory before new ones are dropped
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 1.0
+QUEUE_SIZE = 65536
+
+
+'''
+Name: TelemetryWriter
+Description: Bounded event queue drained by a daemon thread into an append-only JSONL file
+Attributes: filename, written, dropped
+Methods: emit, flush, stop, stats
+'''
+
+class TelemetryWriter:
+    def __init__(self, filename=TELEMETRY_FILE, batchSize=BATCH_SIZE,
+                 flushInterval=FLUSH_INTERVAL, queueSize=QUEUE_SIZE):
+        self.filename = filename
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.queue = queue.Queue(queueSize)
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.stopped = False
+        self.worker = threading.Thread(target=self._run, name="Telemetry", daemon=True)
+        self.worker.start()
+
+    '''
+    Queue an event of the given kind. Never blocks: returns False if the event was dropped
+    '''
+
+    def emit(self, kind, **fields):
+        if self.stopped:
+            return False
+        fields["event"] = kind
+        fields["ts"] = time.time()
+        try:
+            self.queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    '''
+    Block until everything queued so far is on disk. For tests and shutdown, not the GUI
+    '''
+
+    def flush(self):
+        self.queue.join()
+
+    def stop(self):
+        if not self.stopped:
+            self.stopped = True
+            self.queue.put(None)
+            self.worker.join()
+
+    def stats(self):
+        return {"file": self.filename, "written": self.written, "dropped": self.dropped,
+                "batches": self.batches, "queued": self.queue.qsize()}
+
+    # Wait for the first event, then keep collecting until the batch is full or
+    # flushInterval has passed, and write the lot with a single write call
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flushInterval
+            while batch[-1] is not None and len(batch) < self.batchSize:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            finished = batch[-1] is None
+            events = batch[:-1] if finished else batch
+            if events:
+                self._write(events)
+            for _ in batch:
+                self.queue.task_done()
+            if finished:
+                return
+
+    def _write(self, events):
+        lines = "".join(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n'
+                        for event in events)
+        try:
+            with open(self.filename, mode='a', encoding='utf-8') as file:
+                file.write(lines)
+        except OSError:
+            # Telemetry is best effort; losing a batch must not take the game down
+            self.dropped += len(events)
+            return
+        self.written += len(events)
+        self.batches += 1
+
+
+'''
+Iterate over the events in a telemetry log, skipping a torn last line from a crash
+'''
+def read_events(filename=TELEMETRY_FILE):
+    try:
+        with open(filename, mode='r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+_defaultWriter = None
+
+'''
+Returns the process-wide TelemetryWriter, started on first use and flushed at exit.
+filename only matters on the first call
+'''
+def default_telemetry(filename=TELEMETRY_FILE):
+    global _defaultWriter
+    if _defaultWriter is None:
+        _defaultWriter = TelemetryWriter(filename)
+        atexit.register(_defaultWriter.stop)
+    return _defaultWriter
+
+
+'''
+Time emit() on this thread while the writer runs, then how long the log took to drain
+'''
+def benchmark(count=20000):
+    directory = tempfile.mkdtemp(prefix="wikiracing-telemetry-")
+    writer = TelemetryWriter(os.path.join(directory, TELEMETRY_FILE))
+    emitNs = []
+    for index in range(count):
+        start = time.perf_counter_ns()
+        writer.emit("navigate", round="bench", url="https://en.wikipedia.org/wiki/Article_%d"
+                    % index, title="Article %d" % index, dwell_ms=1.5, load_ms=80.0, back=False)
+        emitNs.append(time.perf_counter_ns() - start)
+    start = time.perf_counter()
+    writer.stop()
+    drain = time.perf_counter() - start
+    emitNs.sort()
+    return {
+        "events": count,
+        "emit_us_mean": sum(emitNs) / count / 1000,
+        "emit_us_p99": emitNs[int(0.99 * (count - 1))] / 1000,
+        "emit_us_max": emitNs[-1] / 1000,
+        "drain_seconds": drain,
+        "log_bytes": os.path.getsize(writer.filename),
+        **writer.stats(),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+        print(json.dumps(benchmark(count), indent=2))
+    else:
+        print(__doc__)
@@ -0,0 +1,262 @@
+'''
+TitleResolver - turns whatever a player types into the article a round should use
+Input is canonicalised (see WikiTitles) and then looked up, case-insensitively, in an
+in-memory index of canonical titles and redirects built from a local redirect dump, so
+"usa", "U.S.A." and "united_states" all become "United States" with one hash lookup.
+Redirect chains are followed once, when the index is built. Answers are kept in a bounded
+LRU cache that is saved between runs along with whether the article exists in the link
+graph, so validating the titles of a round costs nothing at round start.
+
+Resolving titles from the command line:
+    python TitleResolver.py resolve "usa" "paris_hilton"
+Timing lookups over a synthetic redirect dump:
+    python TitleResolver.py --benchmark [redirects]
+'''
+
+from collections import OrderedDict
+import atexit
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from WikiTitles import canonical_title, title_key
+
+REDIRECTS_FILE = "redirects.tsv"
+TITLE_CACHE_FILE = "title_cache.json"
+CACHE_ENTRIES = 4096
+
+# Redirects to redirects are followed this many hops when the index is built
+MAX_REDIRECT_HOPS = 8
+
+
+'''
+Read a redirect dump of "Alias<TAB>Target" lines into an index of title keys to canonical
+titles. Targets index themselves, and every alias points at the end of its redirect chain
+'''
+def load_redirects(filename=REDIRECTS_FILE):
+    targets = {}
+    try:
+        with open(filename, mode='r', encoding='utf-8') as file:
+            for line in file:
+                alias, _, target = line.rstrip('\n').partition('\t')
+                if alias and target and not alias.startswith('#'):
+                    targets[title_key(alias)] = canonical_title(target)
+    except FileNotFoundError:
+        return {}
+    index = {}
+    for target in targets.values():
+        index.setdefault(title_key(target), target)
+    for key, target in targets.items():
+        for _ in range(MAX_REDIRECT_HOPS):
+            following = targets.get(title_key(target))
+            if following is None or following == target:
+                break
+            target = following
+        index[key] = target
+    return index
+
+
+'''
+Name: TitleResolver
+Description: Redirect and normalisation index with a persistent, bounded LRU of answers
+Attributes: index, cache, maxEntries, graph, hits, misses
+Methods: resolve, target_title, target_key, exists, save, stats
+'''
+
+class TitleResolver:
+    def __init__(self, redirectsFile=REDIRECTS_FILE, cacheFile=TITLE_CACHE_FILE,
+                 maxEntries=CACHE_ENTRIES, graph=None):
+        self.redirectsFile = redirectsFile
+        self.cacheFile = cacheFile
+        self.maxEntries = maxEntries
+        # Link graph used to tell whether an article exists; None means unknown
+        self.graph = graph
+        self.index = load_redirects(redirectsFile)
+        self.cache = OrderedDict()  # input -> (canonical title, exists), oldest first
+        self.lock = threading.Lock()
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    # Identifies the redirect dump and link graph the saved answers were worked out from
+    def _source(self):
+        source = []
+        for filename in (self.redirectsFile, getattr(self.graph, "filename", None)):
+            try:
+                stat = os.stat(filename)
+                source.append([filename, stat.st_size, stat.st_mtime_ns])
+            except (OSError, TypeError):
+                source.append(None)
+        return source
+
+    '''
+    Restore the answers saved by an earlier run, unless the dump or graph has changed since
+    '''
+
+    def load(self):
+        if self.cacheFile is None:
+            return
+        try:
+            with open(self.cacheFile, mode='r', encoding='utf-8') as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return
+        if saved.get("source") != self._source():
+            return
+        for text, title, exists in saved.get("entries", [])[-self.maxEntries:]:
+            self.cache[text] = (title, exists)
+
+    def save(self):
+        if self.cacheFile is None:
+            return
+        with self.lock:
+            if not self.changed:
+                return
+            entries = [[text, title, exists] for text, (title, exists) in self.cache.items()]
+            self.changed = False
+        directory = os.path.dirname(os.path.abspath(self.cacheFile))
+        handle, temp = tempfile.mkstemp(prefix=".title_cache.", dir=directory)
+        with os.fdopen(handle, mode='w', encoding='utf-8') as file:
+            json.dump({"source": self._source(), "entries": entries}, file)
+        os.replace(temp, self.cacheFile)
+
+    def _lookup(self, text):
+        title = canonical_title(text)
+        title = self.index.get(title.casefold(), title)
+        exists = None
+        if self.graph is not None and title:
+            exists = self.graph.lookup(title) is not None
+        return title, exists
+
+    def _answer(self, text):
+        with self.lock:
+            answer = self.cache.get(text)
+            if answer is not None:
+                self.cache.move_to_end(text)
+                self.hits += 1
+                return answer
+            self.misses += 1
+        answer = self._lookup(text)
+        with self.lock:
+            self.cache[text] = answer
+            self.changed = True
+            if len(self.cache) > self.maxEntries:
+                self.cache.popitem(last=False)
+        return answer
+
+    '''
+    The canonical title of the article text refers to, following redirects
+    e.g. "usa" -> "United States". Unknown titles are canonicalised but otherwise unchanged
+    '''
+
+    def resolve(self, text):
+        return self._answer(text.strip())[0]
+
+    '''
+    True if the resolved article is in the link graph, False if it is not, or None when
+    there is no link graph to check against
+    '''
+
+    def exists(self, text):
+        return self._answer(text.strip())[1]
+
+    '''
+    The article a canonical title redirects to, or the title itself. One dictionary lookup
+    and no caching, for resolving every link on a page at once
+    '''
+
+    def target_title(self, title):
+        return self.index.get(title.casefold(), title)
+
+    '''
+    The title key of the article a title key redirects to, for comparing visited pages with
+    the goal. One dictionary lookup, no caching needed
+    '''
+
+    def target_key(self, key):
+        title = self.index.get(key)
+        return key if title is None else title.casefold()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"titles": len(self.index), "cached": len(self.cache),
+                    "max_cached": self.maxEntries, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+_defaultResolver = None
+_defaultLock = threading.Lock()
+
+'''
+Returns the resolver for REDIRECTS_FILE and the default link graph, built once per process.
+Its cache is saved to cacheFile when the process exits; only the first call's cacheFile is used
+'''
+def default_resolver(cacheFile=TITLE_CACHE_FILE):
+    global _defaultResolver
+    # Title autocomplete builds it on a worker thread while the GUI may want it too
+    with _defaultLock:
+        if _defaultResolver is None:
+            from LinkGraph import default_graph
+            _defaultResolver = TitleResolver(cacheFile=cacheFile, graph=default_graph())
+            atexit.register(_defaultResolver.save)
+    return _defaultResolver
+
+
+'''
+Time index building and lookups over a synthetic dump of count redirects. Players ask
+for a limited set of titles, so lookups draw from a working set of distinct inputs: the
+first pass goes to the index, the second is answered by the LRU
+'''
+def benchmark(count=200000, lookups=100000, workingSet=2000, seed=0):
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp(prefix="title_resolver_")
+    filename = os.path.join(directory, REDIRECTS_FILE)
+    with open(filename, mode='w', encoding='utf-8') as file:
+        for alias in range(count):
+            file.write("Alias %d\tArticle %d\n" % (alias, rng.randrange(count // 4)))
+
+    start = time.perf_counter()
+    resolver = TitleResolver(filename, os.path.join(directory, TITLE_CACHE_FILE))
+    buildTime = time.perf_counter() - start
+    titles = ["alias_%d" % rng.randrange(count) for _ in range(workingSet)]
+    inputs = [rng.choice(titles) for _ in range(lookups)]
+    start = time.perf_counter()
+    for text in titles:
+        resolver.resolve(text)
+    firstTime = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in inputs:
+        resolver.resolve(text)
+    secondTime = time.perf_counter() - start
+    start = time.perf_counter()
+    resolver.save()
+    saveTime = time.perf_counter() - start
+    return {
+        "redirects": count,
+        "build_s": buildTime,
+        "first_pass_us_per_lookup": firstTime / workingSet * 1e6,
+        "second_pass_us_per_lookup": secondTime / lookups * 1e6,
+        "save_ms": saveTime * 1e3,
+        **resolver.stats(),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "resolve":
+        resolver = default_resolver()
+        for text in sys.argv[2:]:
+            exists = resolver.exists(text)
+            print("%s -> %s%s" % (text, resolver.resolve(text),
+                                  "" if exists is None else " (in link graph)" if exists
+                                  else " (not in link graph)"))
+    elif len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        for key, value in benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 200000).items():
+            print(f"{key}: {value}")
+    else:
+        print(__doc__)
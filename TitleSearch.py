@@ -0,0 +1,144 @@
+'''
+TitleSearch - prefix search over article titles, for autocompleting what the player types
+Titles from the link graph and aliases from the redirect index are stored as one sorted
+array of case-folded keys packed into a single bytes blob, so millions of titles cost
+two allocations instead of millions of strings. A keystroke is a bisect over the blob
+for the first key with the typed prefix, followed by a short scan; aliases suggest the
+article they redirect to.
+
+Suggesting titles from the default link graph and redirect dump:
+    python TitleSearch.py suggest "united st"
+Timing index building and prefix queries over synthetic titles:
+    python TitleSearch.py --benchmark [titles]
+'''
+
+from array import array
+import bisect
+import random
+import sys
+import threading
+import time
+
+from WikiTitles import canonical_title, title_key
+
+SUGGESTION_LIMIT = 10
+
+# Separates a key from its title inside an entry of the blob
+SEPARATOR = b"\0"
+
+
+'''
+Name: PrefixIndex
+Description: Immutable sorted index of (title key, title) pairs with prefix queries.
+Behaves as a sequence of keys so the bisect module can search it directly
+Attributes: count
+Methods: suggest, title_at
+'''
+
+class PrefixIndex:
+    def __init__(self, pairs):
+        entries = sorted(set((key.encode('utf-8') + SEPARATOR + title.encode('utf-8'))
+                             for key, title in pairs if key))
+        self.count = len(entries)
+        self.offsets = array('Q', [0])
+        for entry in entries:
+            self.offsets.append(self.offsets[-1] + len(entry))
+        self.blob = b"".join(entries)
+
+    def __len__(self):
+        return self.count
+
+    # Key of entry index, as bytes
+    def __getitem__(self, index):
+        start = self.offsets[index]
+        return self.blob[start:self.blob.index(SEPARATOR, start)]
+
+    def title_at(self, index):
+        start = self.blob.index(SEPARATOR, self.offsets[index]) + 1
+        return self.blob[start:self.offsets[index + 1]].decode('utf-8')
+
+    '''
+    Up to limit distinct titles whose key starts with the title key of prefix, in key order
+    '''
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        text = ' '.join(prefix.replace('_', ' ').split())
+        if not text:
+            return []
+        key = text.casefold().encode('utf-8')
+        titles = []
+        index = bisect.bisect_left(self, key)
+        while index < self.count and len(titles) < limit:
+            if not self[index].startswith(key):
+                break
+            title = self.title_at(index)
+            if title not in titles:
+                titles.append(title)
+            index += 1
+        return titles
+
+
+'''
+(key, title) pairs for every article in graph and every alias in a TitleResolver's index
+'''
+def title_pairs(graph=None, resolver=None):
+    if graph is not None:
+        for node in range(graph.nodeCount):
+            title = graph.title(node)
+            yield title.casefold(), title
+    if resolver is not None:
+        yield from resolver.index.items()
+
+
+_defaultIndex = None
+_defaultLock = threading.Lock()
+
+'''
+Returns the prefix index over the default link graph and redirect dump, built on first
+use. Building reads every title, so call it off the GUI thread
+'''
+def default_index():
+    global _defaultIndex
+    with _defaultLock:
+        if _defaultIndex is None:
+            from LinkGraph import default_graph
+            from TitleResolver import default_resolver
+            _defaultIndex = PrefixIndex(title_pairs(default_graph(), default_resolver()))
+    return _defaultIndex
+
+
+'''
+Time building an index of count synthetic titles and answering prefix queries from it
+'''
+def benchmark(count=1000000, queries=20000, seed=0):
+    rng = random.Random(seed)
+    words = ["History", "River", "Battle", "United", "Station", "Album", "County", "Film",
+             "Church", "School", "Railway", "List", "Island", "Saint", "North", "Party"]
+    titles = ["%s %s %d" % (rng.choice(words), rng.choice(words), number)
+              for number in range(count)]
+    start = time.perf_counter()
+    index = PrefixIndex((title_key(title), canonical_title(title)) for title in titles)
+    buildTime = time.perf_counter() - start
+    prefixes = [rng.choice(titles)[:rng.randrange(1, 12)].lower() for _ in range(queries)]
+    start = time.perf_counter()
+    results = sum(len(index.suggest(prefix)) for prefix in prefixes)
+    queryTime = time.perf_counter() - start
+    return {
+        "titles": count,
+        "build_s": buildTime,
+        "index_mb": (len(index.blob) + index.offsets.itemsize * len(index.offsets)) / 2 ** 20,
+        "us_per_query": queryTime / queries * 1e6,
+        "suggestions_per_query": results / queries,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "suggest":
+        index = default_index()
+        for prefix in sys.argv[2:]:
+            print("%s: %s" % (prefix, ", ".join(index.suggest(prefix)) or "no titles"))
+    elif len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        for key, value in benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000).items():
+            print(f"{key}: {value}")
+    else:
+        print(__doc__)
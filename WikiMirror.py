@@ -0,0 +1,377 @@
+'''
+WikiMirror - an offline copy of the articles a race needs, served like en.wikipedia.org
+Responses are packed into one archive: zlib-compressed chunks of about CHUNK_BYTES,
+plus an index of URL keys sorted for binary search, each pointing at its chunk, offset
+and length. The archive is memory-mapped, so opening it reads nothing and a page load
+decompresses one chunk (recent chunks are kept decompressed). MirrorProxy serves the
+archive through the same local HTTP layout as the caching proxy, so the race window,
+navigation rules and request filter work unchanged, and nothing touches the network.
+Special:Random redirects to a random archived article.
+
+Building an archive from pages the caching proxy has already saved (play online once):
+    python WikiMirror.py build-cache page_cache wikimirror.bin
+from a directory of Title.html files:
+    python WikiMirror.py build-dir articles/ wikimirror.bin
+or from generated MockWiki articles, for testing:
+    python WikiMirror.py synthetic wikimirror.bin 10000
+Then start the game with --mirror [wikimirror.bin].
+'''
+
+from array import array
+from collections import OrderedDict
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import threading
+import zlib
+from urllib.parse import urlsplit
+
+from PageCache import UPSTREAM, CacheRequestHandler, CachingProxy
+from WikiTitles import canonical_title, title_to_path
+
+MIRROR_FILE = "wikimirror.bin"
+
+# File layout: header, then 8 byte aligned sections: key offsets (Q), key blob, entries
+# (4 x I: chunk, offset in chunk, length, content type | flags), chunk offsets (Q),
+# article entry indices (I), content type list (JSON), chunk data
+MAGIC = b"WRMA"
+VERSION = 2
+HEADER = struct.Struct("<4sIIII7Q")
+CHUNK_BYTES = 256 * 1024
+CHUNK_CACHE = 16
+COMPRESSION_LEVEL = 6
+
+# Flag in an entry's type field: the body is the key of the entry it redirects to
+REDIRECT = 0x80000000
+ARTICLE_PREFIX = "/wiki/"
+RANDOM_TITLE = "Special:Random"
+
+
+'''
+Normalise a Wikipedia URL to its archive key. Article paths are canonicalised, so
+"/wiki/united_states" and "/wiki/United%20States" find the same entry
+'''
+def archive_key(url):
+    parts = urlsplit(url)
+    host = parts.netloc or urlsplit(UPSTREAM).netloc
+    path = parts.path
+    if path.startswith(ARTICLE_PREFIX):
+        path = ARTICLE_PREFIX + title_to_path(canonical_title(path[len(ARTICLE_PREFIX):]))
+    return host + path + ("?" + parts.query if parts.query else "")
+
+
+'''
+Name: WikiArchive
+Description: Read-only, memory-mapped view of an archive written by build_archive.
+Has the read side of PageCache (get, size_of, stats) so it can stand in for one
+Attributes: entryCount, chunkCount, articleCount, hits, misses
+Methods: lookup, get, size_of, random_article, stats, close
+'''
+
+class WikiArchive:
+    def __init__(self, filename=MIRROR_FILE):
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.entryCount, self.chunkCount, self.articleCount,
+         *offsets) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"'{filename}' is not a version {VERSION} wiki mirror")
+        self.view = memoryview(self.map)
+        self.keyOffsets = self.view[offsets[0]:offsets[0] + 8 * (self.entryCount + 1)].cast('Q')
+        self.keyBlob = self.view[offsets[1]:offsets[1] + self.keyOffsets[self.entryCount]]
+        self.entries = self.view[offsets[2]:offsets[2] + 16 * self.entryCount].cast('I')
+        self.chunkOffsets = self.view[offsets[3]:offsets[3] + 8 * (self.chunkCount + 1)].cast('Q')
+        # Written by build_archive, so opening a large mirror never scans its keys
+        self.articles = self.view[offsets[4]:offsets[4] + 4 * self.articleCount].cast('I')
+        self.contentTypes = json.loads(bytes(self.view[offsets[5]:offsets[6]]))
+        self.chunks = OrderedDict()
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        self.hits = 0
+        self.misses = 0
+        self.bytesServed = 0
+
+    def close(self):
+        for section in (self.keyOffsets, self.keyBlob, self.entries, self.chunkOffsets,
+                        self.articles):
+            section.release()
+        self.view.release()
+        self.map.close()
+
+    def _key(self, index):
+        return bytes(self.keyBlob[self.keyOffsets[index]:self.keyOffsets[index + 1]])
+
+    '''
+    Binary search of the sorted keys. Returns the entry index for url, or None
+    '''
+
+    def lookup(self, url):
+        key = archive_key(url).encode('utf-8')
+        lo, hi = 0, self.entryCount
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.entryCount and self._key(lo) == key:
+            return lo
+        return None
+
+    # Decompressed chunk, from a small LRU of recently used chunks
+    def _chunk(self, number):
+        with self.lock:
+            data = self.chunks.get(number)
+            if data is not None:
+                self.chunks.move_to_end(number)
+                return data
+        start, end = self.chunkOffsets[number], self.chunkOffsets[number + 1]
+        data = zlib.decompress(self.view[start:end])
+        with self.lock:
+            self.chunks[number] = data
+            if len(self.chunks) > CHUNK_CACHE:
+                self.chunks.popitem(last=False)
+        return data
+
+    def _body(self, index):
+        chunk, offset, length = self.entries[4 * index:4 * index + 3]
+        return self._chunk(chunk)[offset:offset + length]
+
+    '''
+    Returns (status, contentType, body, location) for url, or None if it is not archived.
+    Redirect entries come back as a 301 to the key they point at
+    '''
+
+    def get(self, url):
+        index = self.lookup(url)
+        with self.lock:
+            if index is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        kind = self.entries[4 * index + 3]
+        body = self._body(index)
+        if kind & REDIRECT:
+            target = body.decode('utf-8')
+            return 301, "text/html; charset=UTF-8", b"", "https://" + target
+        with self.lock:
+            self.bytesServed += len(body)
+        return 200, self.contentTypes[kind], body, None
+
+    def size_of(self, url):
+        index = self.lookup(url)
+        return None if index is None else self.entries[4 * index + 2]
+
+    def random_article(self):
+        if not self.articleCount:
+            return None
+        key = self._key(self.articles[self.random.randrange(self.articleCount)])
+        return key.decode('utf-8').partition(ARTICLE_PREFIX)[2]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": self.entryCount, "articles": self.articleCount,
+                    "chunks": self.chunkCount, "bytes": len(self.map), "hits": self.hits,
+                    "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "bytes_served": self.bytesServed}
+
+
+'''
+Name: MirrorRequestHandler
+Description: Serves GET requests from the proxy's WikiArchive and never goes upstream
+'''
+
+class MirrorRequestHandler(CacheRequestHandler):
+    def do_GET(self):
+        proxy = self.server.proxy
+        upstream = proxy.upstream_url(self.path)
+        if upstream is None:
+            self.send_error(403, "Host not proxied")
+            return
+        if archive_key(upstream).partition(ARTICLE_PREFIX)[2] == title_to_path(RANDOM_TITLE):
+            title = proxy.cache.random_article()
+            if title is not None:
+                self.reply(302, "text/html; charset=UTF-8", b"", ARTICLE_PREFIX + title)
+                return
+        response = proxy.cache.get(upstream)
+        if response is None:
+            self.send_error(404, "Not in the offline mirror")
+            return
+        self.reply(*response)
+
+
+'''
+Name: MirrorProxy
+Description: CachingProxy whose cache is a WikiArchive and which never fetches upstream
+'''
+
+class MirrorProxy(CachingProxy):
+    handlerClass = MirrorRequestHandler
+    # Every article is already on disk
+    prefetchable = False
+
+    def __init__(self, archive, host="127.0.0.1", port=0):
+        super().__init__(archive, UPSTREAM, host, port)
+
+    def fetch(self, url):
+        raise OSError("offline mirror")
+
+
+'''
+Whether an entry is an article Special:Random may pick: not a redirect or special page
+'''
+def is_article_key(key, kind):
+    title = key.partition(ARTICLE_PREFIX)[2]
+    return bool(title) and not kind & REDIRECT and not title.startswith("Special:")
+
+
+'''
+Write an archive from an iterable of (url, status, contentType, body) responses.
+Redirects (3xx with a Location) become redirect entries. Returns the entry count
+'''
+def build_archive(responses, filename=MIRROR_FILE, chunkBytes=CHUNK_BYTES):
+    entries = {}
+    contentTypes = []
+    for url, status, contentType, body, *location in responses:
+        key = archive_key(url)
+        if 300 <= status < 400 and location and location[0]:
+            target = archive_key(location[0] if "//" in location[0] else UPSTREAM + location[0])
+            entries[key] = (REDIRECT, target.encode('utf-8'))
+        elif status == 200:
+            if contentType not in contentTypes:
+                contentTypes.append(contentType)
+            entries[key] = (contentTypes.index(contentType), body)
+    keys = sorted(entries, key=lambda key: key.encode('utf-8'))
+
+    # Pack bodies into chunks in key order, so neighbouring titles share a chunk
+    table = array('I')
+    articles = array('I')
+    chunks = []
+    pending = []
+    pendingBytes = 0
+    for key in keys:
+        kind, body = entries[key]
+        if is_article_key(key, kind):
+            articles.append(len(table) // 4)
+        table.extend((len(chunks), pendingBytes, len(body), kind))
+        pending.append(body)
+        pendingBytes += len(body)
+        if pendingBytes >= chunkBytes:
+            chunks.append(zlib.compress(b"".join(pending), COMPRESSION_LEVEL))
+            pending, pendingBytes = [], 0
+    if pending:
+        chunks.append(zlib.compress(b"".join(pending), COMPRESSION_LEVEL))
+
+    encodedKeys = [key.encode('utf-8') for key in keys]
+    keyOffsets = array('Q', [0])
+    for encoded in encodedKeys:
+        keyOffsets.append(keyOffsets[-1] + len(encoded))
+    chunkOffsets = array('Q')
+    sections = [bytes(keyOffsets), b"".join(encodedKeys), bytes(table), None,
+                bytes(articles), json.dumps(contentTypes).encode('utf-8')]
+    offsets = []
+    position = HEADER.size
+    for index, section in enumerate(sections):
+        position += -position % 8
+        offsets.append(position)
+        position += 8 * (len(chunks) + 1) if section is None else len(section)
+    offsets.append(position)  # End of the content types, where chunk data starts
+    for chunk in chunks:
+        chunkOffsets.append(position)
+        position += len(chunk)
+    chunkOffsets.append(position)
+    sections[3] = bytes(chunkOffsets)
+
+    temporary = filename + ".tmp"
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(keys), len(chunks), len(articles),
+                               *offsets))
+        for offset, section in zip(offsets, sections):
+            file.write(b'\0' * (offset - file.tell()))
+            file.write(section)
+        for chunk in chunks:
+            file.write(chunk)
+    os.replace(temporary, filename)
+    return len(keys)
+
+
+'''
+Responses saved by PageCache: each file is a JSON header line followed by the body
+'''
+def responses_from_cache(directory):
+    for name in os.listdir(directory):
+        if ".tmp" in name:
+            continue
+        with open(os.path.join(directory, name), 'rb') as file:
+            try:
+                meta = json.loads(file.readline())
+            except ValueError:
+                continue
+            yield meta["url"], meta["status"], meta["type"], file.read()
+
+
+'''
+Articles saved as <Title>.html files in a directory
+'''
+def responses_from_directory(directory):
+    for name in os.listdir(directory):
+        if name.endswith(".html"):
+            with open(os.path.join(directory, name), 'rb') as file:
+                yield (UPSTREAM + ARTICLE_PREFIX + title_to_path(name[:-len(".html")]), 200,
+                       "text/html; charset=UTF-8", file.read())
+
+
+'''
+Generated MockWiki articles "Article 0" .. "Article count-1", plus the site stylesheet
+'''
+def synthetic_responses(count):
+    from MockWiki import STYLESHEET, MockWikiServer
+    wiki = MockWikiServer()  # Only used to render pages, never started
+    try:
+        for index in range(count):
+            yield (UPSTREAM + ARTICLE_PREFIX + "Article_%d" % index, 200,
+                   "text/html; charset=UTF-8", wiki.render("Article %d" % index))
+    finally:
+        wiki.server.server_close()
+    yield UPSTREAM + "/w/load.php?modules=site.styles&only=styles", 200, "text/css", STYLESHEET
+
+
+'''
+Archive named after --mirror on the command line, or MIRROR_FILE if none is given
+'''
+def mirror_file(argv=sys.argv):
+    index = argv.index("--mirror") if "--mirror" in argv else len(argv)
+    if index + 1 < len(argv) and not argv[index + 1].startswith("--"):
+        return argv[index + 1]
+    return MIRROR_FILE
+
+
+_defaultArchive = None
+
+'''
+Returns the WikiArchive for filename, opened once per process
+'''
+def default_archive(filename=MIRROR_FILE):
+    global _defaultArchive
+    if _defaultArchive is None:
+        _defaultArchive = WikiArchive(filename)
+    return _defaultArchive
+
+
+if __name__ == "__main__":
+    sources = {"build-cache": responses_from_cache, "build-dir": responses_from_directory}
+    if len(sys.argv) == 4 and sys.argv[1] in sources:
+        count = build_archive(sources[sys.argv[1]](sys.argv[2]), sys.argv[3])
+        print(f"Wrote {count} entries to '{sys.argv[3]}'")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "synthetic":
+        count = build_archive(synthetic_responses(int(sys.argv[3]) if len(sys.argv) > 3
+                                                  else 10000), sys.argv[2])
+        print(f"Wrote {count} entries to '{sys.argv[2]}'")
+    else:
+        print(__doc__)
@@ -0,0 +1,58 @@
+'''
+WikiTitles - helpers for turning user input and Wikipedia URLs into article titles
+Every part of the game that compares, stores or looks up an article goes through
+canonical_title so that "united_states", "United States" and "United%20States" agree
+'''
+
+from urllib.parse import quote, unquote
+
+WIKI_URL = "https://en.wikipedia.org/wiki/"
+
+# Links into these namespaces are not articles a race can go through
+NAMESPACES = ("Special:", "File:", "Category:", "Help:", "Wikipedia:", "Talk:", "Portal:",
+              "Template:", "Template talk:", "User:", "Draft:", "Module:", "MediaWiki:")
+
+# JavaScript returning the href of every article link in a page, for runJavaScript
+LINKS_SCRIPT = ("Array.from(document.querySelectorAll('a[href^=\"/wiki/\"]'),"
+                " link => link.getAttribute('href'))")
+
+
+'''
+Convert a title, URL path segment or raw user input into the canonical article title
+Percent-escapes are decoded, underscores become spaces, any #fragment is dropped,
+runs of whitespace collapse and the first letter is capitalised as MediaWiki does
+'''
+def canonical_title(text):
+    if '%' in text:
+        text = unquote(text)
+    title = ' '.join(text.partition('#')[0].replace('_', ' ').split())
+    if not title:
+        return ''
+    return title[0].upper() + title[1:]
+
+
+'''
+Case-folded form of canonical_title, used for matching titles the player typed
+'''
+def title_key(text):
+    return canonical_title(text).casefold()
+
+
+'''
+Convert a canonical title back into the path segment used in article URLs
+'''
+def title_to_path(title):
+    return quote(canonical_title(title).replace(' ', '_'), safe="()',!:*$;@-.~")
+
+
+'''
+Article titles of the /wiki/ hrefs read from a page (see LINKS_SCRIPT), in page order
+without repeats, mapped to the first href that links to each
+'''
+def article_links(hrefs):
+    titles = {}
+    for href in hrefs or []:
+        title = canonical_title(href[len("/wiki/"):])
+        if title and not title.startswith(NAMESPACES) and title not in titles:
+            titles[title] = href
+    return titles
@@ -0,0 +1,62 @@
+'''
+HintEngine vector files: writing, ranking and vectors built from a link graph
+'''
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PyQt5.QtWidgets")
+
+from HintEngine import HintEngine, build_from_graph, link_vectors, write_vectors
+from LinkGraph import LinkGraph, build_link_graph, read_link_dump, write_synthetic_dump
+
+
+def test_rank_orders_by_similarity_and_unknown_last(tmp_path):
+    filename = str(tmp_path / "vectors.bin")
+    titles = ["Goal", "Close", "Far", "Opposite"]
+    vectors = [[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [-1, 0, 0]]
+    assert write_vectors(titles, [np.array(vectors)], 3, filename) == 4
+    engine = HintEngine(filename)
+    try:
+        ranked = engine.rank("Goal", ["Far", "Unknown", "Opposite", "Close"])
+        assert [title for title, _ in ranked] == ["Close", "Far", "Opposite", "Unknown"]
+        scores = [score for _, score in ranked]
+        assert scores[0] == pytest.approx(0.994, abs=1e-2)
+        assert scores[2] == pytest.approx(-1.0, abs=1e-3)
+        assert scores[3] is None
+        assert engine.rank("Unknown", ["Close"]) == [("Close", None)]
+        assert np.linalg.norm(engine.vector("Close")) == pytest.approx(1.0, abs=1e-3)
+    finally:
+        engine.close()
+
+
+def test_empty_file(tmp_path):
+    filename = str(tmp_path / "vectors.bin")
+    write_vectors([], [], 8, filename)
+    engine = HintEngine(filename)
+    try:
+        assert engine.count == 0
+        assert engine.rank("Goal", ["A", "B"]) == [("A", None), ("B", None)]
+    finally:
+        engine.close()
+
+
+def test_vectors_from_a_link_graph(tmp_path):
+    dump = str(tmp_path / "links.tsv")
+    graphFile = str(tmp_path / "graph.bin")
+    vectorFile = str(tmp_path / "vectors.bin")
+    write_synthetic_dump(dump, nodeCount=300, linksPerPage=5)
+    build_link_graph(read_link_dump(dump), graphFile)
+    with LinkGraph(graphFile) as graph:
+        blocks = list(link_vectors(graph, dimensions=16))
+        assert sum(len(block) for block in blocks) == 300
+        assert all(block.shape[1] == 16 for block in blocks)
+        assert build_from_graph(graph, vectorFile, dimensions=16) == 300
+    engine = HintEngine(vectorFile)
+    try:
+        ranked = engine.rank("Article 5", ["Article %d" % index for index in range(300)])
+        assert all(score is not None for _, score in ranked)
+        # An article is its own closest match
+        assert ranked[0][0] == "Article 5"
+    finally:
+        engine.close()
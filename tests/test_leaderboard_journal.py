@@ -0,0 +1,109 @@
+'''
+LeaderboardJournal: ordering, indexes, crash recovery, compaction and several writers
+'''
+
+import multiprocessing
+import random
+
+import pytest
+
+import LeaderboardJournal
+from LeaderboardJournal import LeaderboardJournal as Journal
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / "board.journal")
+
+
+def fill(journal, count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        journal.add(rng.choice("ABCD"), round(rng.uniform(10, 100), 1),
+                    rng.choice(["Cat", "Dog"]), rng.choice(["Moon", "Sun"]), rng.randint(1, 9))
+
+
+def expected(rows, name=None, start=None, goal=None):
+    return sorted((row for row in rows if (name is None or row["name"] == name)
+                   and (start is None or row["start"] == start)
+                   and (goal is None or row["goal"] == goal)),
+                  key=lambda row: (row["time"], row["id"]))
+
+
+def test_top_and_pages_beyond_the_heap(filename, monkeypatch):
+    monkeypatch.setattr(LeaderboardJournal, "TOP_CACHE", 20)
+    with Journal(filename) as journal:
+        fill(journal, 300)
+        everything = expected(journal.rows)
+        assert journal.top(10) == everything[:10]
+        assert journal.top(50) == everything[:50]
+        assert journal.page(0, 15) == everything[:15]
+        assert journal.page(15, 15) == everything[15:30]
+        fill(journal, 5, seed=1)
+        everything = expected(journal.rows)
+        assert journal.page(290, 50) == everything[290:]
+        assert journal.top(5, name="B") == expected(journal.rows, name="B")[:5]
+        assert journal.top(5, start="Cat", goal="Sun") == \
+            expected(journal.rows, start="Cat", goal="Sun")[:5]
+        assert journal.top(5, name="C", start="Dog", goal="Moon") == \
+            expected(journal.rows, "C", "Dog", "Moon")[:5]
+        assert journal.count(name="A") == len(expected(journal.rows, name="A"))
+        assert journal.count() == 305
+
+
+def test_torn_last_line_is_skipped_and_ended(filename):
+    with Journal(filename) as journal:
+        journal.add("A", 12.0)
+        journal.add("B", 11.0)
+        journalFile = journal._journal_name(journal.generation)
+    with open(journalFile, 'ab') as file:
+        file.write(b'{"op": "add", "name": "Crash", "ti')
+    with Journal(filename) as journal:
+        assert [row["name"] for row in journal.top()] == ["B", "A"]
+        newId = journal.add("C", 10.0)
+    with Journal(filename) as journal:
+        assert [row["name"] for row in journal.top()] == ["C", "B", "A"]
+        assert journal.top(1)[0]["id"] == newId
+
+
+def test_compaction_keeps_every_row(filename):
+    with Journal(filename, compactRecords=25) as journal:
+        fill(journal, 60)
+        assert journal.generation == 2
+        before = expected(journal.rows)
+        assert journal.page(0, 100) == before
+    with Journal(filename) as journal:
+        assert journal.generation == 2
+        assert journal.page(0, 100) == before
+        assert journal.add("E", 1.0) == 61
+
+
+def test_other_writers_are_seen(filename):
+    with Journal(filename, compactRecords=10) as first, Journal(filename) as second:
+        first.add("A", 30.0)
+        second.add("B", 20.0)
+        fill(first, 12)  # Compacts under the second journal's feet
+        assert [row["id"] for row in second.top(100)] == [row["id"] for row in first.top(100)]
+        assert second.count() == 14
+
+
+def write_rounds(filename, name, count):
+    with Journal(filename, compactRecords=30) as journal:
+        for index in range(count):
+            journal.add(name, float(index))
+
+
+def test_concurrent_appends_from_processes(filename):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=write_rounds, args=(filename, "P%d" % index, 40))
+               for index in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+    with Journal(filename) as journal:
+        assert journal.count() == 160
+        assert len({row["id"] for row in journal.rows}) == 160
+        for index in range(4):
+            assert journal.count(name="P%d" % index) == 40
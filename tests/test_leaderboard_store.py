@@ -0,0 +1,69 @@
+'''
+LeaderboardStore splits, schema migration and the rounds analytics reads, for both backends
+'''
+
+import sqlite3
+
+import pytest
+
+from LeaderboardJournal import LeaderboardJournal
+from LeaderboardStore import LeaderboardStore, decode_splits, encode_splits
+
+OLD_SCHEMA = '''
+CREATE TABLE scores (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    time REAL NOT NULL,
+    start TEXT,
+    goal TEXT,
+    clicks INTEGER,
+    par INTEGER,
+    recorded REAL NOT NULL
+);
+INSERT INTO scores (name, time, start, goal, clicks, par, recorded)
+    VALUES ('Old', 42.5, 'Cat', 'Dog', 5, 3, 1700000000);
+'''
+
+
+def test_splits_round_trip():
+    splits = [("Moon", 12.3456), ("Ümlaut", 30.0)]
+    assert decode_splits(encode_splits(splits)) == [("Moon", 12.346), ("Ümlaut", 30.0)]
+    assert encode_splits([]) is None and encode_splits(None) is None
+    assert decode_splits(None) == []
+
+
+def test_old_database_gains_columns(tmp_path):
+    filename = str(tmp_path / "old.db")
+    connection = sqlite3.connect(filename)
+    connection.executescript(OLD_SCHEMA)
+    connection.close()
+    with LeaderboardStore(filename) as store:
+        columns = {row["name"] for row in store.connection.execute("PRAGMA table_info(scores)")}
+        assert {"path", "mode", "splits"} <= columns
+        store.add("New", 30.0, "Cat", "Sun", mode="relay", splits=[("Moon", 10.0)])
+        assert [row["name"] for row in store.top()] == ["New", "Old"]
+        assert decode_splits(store.top(1)[0]["splits"]) == [("Moon", 10.0)]
+    # Opening it again finds the columns already there
+    with LeaderboardStore(filename) as store:
+        assert store.count() == 2
+
+
+@pytest.fixture(params=["sqlite", "journal"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = LeaderboardStore(str(tmp_path / "scores.db"))
+    else:
+        store = LeaderboardJournal(str(tmp_path / "scores.journal"))
+    yield store
+    store.close()
+
+
+def test_games_skip_multi_goal_rounds(store):
+    store.add("A", 20.0, "Cat", "Dog", 4, 3, path=["Cat", "Pet", "Dog"])
+    store.add("B", 25.0, "Cat", "Dog", 5, 3, mode="single")
+    store.add("C", 40.0, "Cat", "Moon\tSun", 9, mode="relay", splits=[("Moon", 20.0)])
+    store.add("D", 50.0, "Cat", "Moon\tSun", 9, mode="scavenger", splits=[("Sun", 20.0)])
+    store.add("E", 10.0)
+    games = sorted(store.games())
+    assert [game[:4] for game in games] == [("Cat", "Dog", 20.0, 4), ("Cat", "Dog", 25.0, 5)]
+    assert games[0][5] == "Cat\tPet\tDog"
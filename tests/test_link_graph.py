@@ -0,0 +1,46 @@
+'''
+LinkGraph built from small hand-made and synthetic link dumps
+'''
+
+from LinkGraph import LinkGraph, build_link_graph, read_link_dump, write_synthetic_dump
+
+
+def test_solve_finds_shortest_route(tmp_path):
+    edges = [("A", "B"), ("B", "C"), ("C", "D"), ("A", "E"), ("E", "D"), ("D", "F")]
+    filename = str(tmp_path / "graph.bin")
+    assert build_link_graph(edges, filename) == (6, 6)
+    with LinkGraph(filename) as graph:
+        assert graph.solve("A", "D") == ["A", "E", "D"]
+        assert graph.par("A", "F") == 3
+        assert graph.solve("A", "A") == ["A"]
+        assert graph.solve("F", "A") is None
+        assert graph.solve("A", "Missing") is None
+        assert graph.solve("A", "F", maxDepth=2) is None
+
+
+def test_solve_on_synthetic_ring(tmp_path):
+    dump = str(tmp_path / "links.tsv")
+    filename = str(tmp_path / "graph.bin")
+    write_synthetic_dump(dump, nodeCount=200, linksPerPage=1)
+    build_link_graph(read_link_dump(dump), filename)
+    with LinkGraph(filename) as graph:
+        assert len(graph) == 200
+        # With one link per page the ring is the only route
+        route = graph.solve("Article 10", "Article 15")
+        assert route == ["Article %d" % node for node in range(10, 16)]
+        assert graph.par("Article 199", "Article 1") == 2
+
+
+def test_shortcuts_never_lengthen_routes(tmp_path):
+    dump = str(tmp_path / "links.tsv")
+    filename = str(tmp_path / "graph.bin")
+    write_synthetic_dump(dump, nodeCount=500, linksPerPage=6, seed=3)
+    build_link_graph(read_link_dump(dump), filename)
+    with LinkGraph(filename) as graph:
+        for start, goal in [(0, 250), (17, 16), (499, 498)]:
+            route = graph.solve("Article %d" % start, "Article %d" % goal)
+            assert route[0] == "Article %d" % start and route[-1] == "Article %d" % goal
+            assert len(route) - 1 <= (goal - start) % 500
+            for source, target in zip(route, route[1:]):
+                node = graph.lookup(source)
+                assert graph.lookup(target) in graph.links_from(node)
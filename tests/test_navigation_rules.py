@@ -0,0 +1,64 @@
+'''
+Checkpoint progress of single, relay and scavenger rounds in NavigationRules
+'''
+
+import pytest
+
+from NavigationRules import RELAY_MODE, SCAVENGER_MODE, NavigationRules, describe_goals
+
+
+def test_single_goal():
+    rules = NavigationRules("Moon")
+    assert rules.check("https://en.wikipedia.org/wiki/moon") == (True, "Moon", True)
+    assert not rules.is_goal("Sun")
+    assert rules.reach("Moon") == 0
+    assert rules.finished()
+
+
+def test_relay_counts_only_the_next_checkpoint():
+    rules = NavigationRules(["Moon", "Sun", "Mars"], mode=RELAY_MODE)
+    assert rules.is_goal("Moon")
+    assert not rules.is_goal("Sun") and not rules.is_goal("Mars")
+    assert rules.reach("Sun") is None
+    assert rules.reach("Moon") == 0
+    assert not rules.is_goal("Moon")
+    assert rules.is_goal("Sun") and not rules.is_goal("Mars")
+    assert rules.reach("Sun") == 1
+    assert not rules.finished()
+    assert rules.reach("Mars") == 2
+    assert rules.finished()
+    assert rules.reached == [0, 1, 2]
+
+
+def test_relay_may_repeat_a_checkpoint():
+    rules = NavigationRules(["Moon", "Sun", "Moon"], mode=RELAY_MODE)
+    assert rules.checkpoints == ["moon", "sun", "moon"]
+    assert rules.reach("Moon") == 0
+    assert rules.reach("Moon") is None
+    assert rules.reach("Sun") == 1
+    assert rules.is_goal("Moon")
+    assert rules.reach("Moon") == 2
+    assert rules.finished()
+
+
+def test_scavenger_in_any_order_without_duplicates():
+    rules = NavigationRules(["Moon", "Sun", "moon", "Mars"], mode=SCAVENGER_MODE)
+    assert len(rules.checkpoints) == 3
+    assert all(rules.is_goal(title) for title in ("Moon", "Sun", "Mars"))
+    assert rules.reach("Mars") == 2
+    assert not rules.is_goal("Mars")
+    assert rules.reach("Mars") is None
+    assert rules.reach("Moon") == 0
+    assert not rules.finished()
+    assert rules.is_goal("Sun") and not rules.is_goal("Moon")
+    assert rules.reach("Sun") == 1
+    assert rules.finished()
+    assert rules.reached == [2, 0, 1]
+
+
+def test_unknown_mode_and_goal_text():
+    with pytest.raises(ValueError):
+        NavigationRules(["Moon"], mode="marathon")
+    assert describe_goals(["Moon", "Sun"], RELAY_MODE) == "Moon > Sun"
+    assert describe_goals(["Moon", "Sun"], SCAVENGER_MODE) == "Moon + Sun"
+    assert describe_goals("Moon") == "Moon"
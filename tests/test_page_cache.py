@@ -0,0 +1,108 @@
+'''
+CachingProxy in front of MockWiki: repeat requests are served from the PageCache
+'''
+
+import os
+import time
+import urllib.request
+
+import pytest
+
+from MockWiki import MockWikiServer
+from PageCache import STALE_TEMP_SECONDS, CachingProxy, PageCache, proxied_host
+from RandomPool import fetch_random_title
+
+
+@pytest.fixture
+def proxy(tmp_path):
+    wiki = MockWikiServer().start()
+    proxy = CachingProxy(PageCache(str(tmp_path / "cache")), wiki.baseUrl).start()
+    proxy.wiki = wiki
+    yield proxy
+    proxy.stop()
+    wiki.stop()
+
+
+def get(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+def test_repeat_requests_hit_cache(proxy):
+    first = get(proxy.baseUrl + "/wiki/Article_1")
+    assert get(proxy.baseUrl + "/wiki/Article_1") == first
+    get(proxy.baseUrl + "/wiki/Article_2")
+    stats = proxy.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["entries"] == 2
+    assert proxy.wiki.requests == 2
+
+
+def test_special_pages_are_not_cached(proxy):
+    randomUrl = proxy.baseUrl + "/wiki/Special:Random"
+    assert fetch_random_title(randomUrl).startswith("Article_")
+    assert fetch_random_title(randomUrl).startswith("Article_")
+    assert proxy.cache.stats()["entries"] == 0
+
+
+def test_cache_survives_restart(proxy, tmp_path):
+    get(proxy.baseUrl + "/wiki/Article_3")
+    reloaded = PageCache(str(tmp_path / "cache"))
+    assert reloaded.get(proxy.upstream + "/wiki/Article_3") is not None
+    assert reloaded.stats()["hits"] == 1
+
+
+def test_proxied_hosts_match_whole_labels():
+    assert proxied_host("wikipedia.org")
+    assert proxied_host("upload.wikimedia.org:443")
+    assert proxied_host("EN.Wikipedia.org.")
+    assert not proxied_host("evilwikipedia.org")
+    assert not proxied_host("wikipedia.org.evil.com")
+    assert not proxied_host("en.wikipedia.org@evil.com")
+
+
+def test_proxy_refuses_look_alike_hosts(proxy):
+    assert proxy.upstream_url("/_/upload.wikimedia.org/a.png") == \
+        "https://upload.wikimedia.org/a.png"
+    assert proxy.upstream_url("/_/evilwikimedia.org/a.png") is None
+    assert proxy.local_url("https://evilwikipedia.org/x") == "https://evilwikipedia.org/x"
+    assert proxy.local_url("https://upload.wikimedia.org/a.png") == \
+        proxy.baseUrl + "/_/upload.wikimedia.org/a.png"
+
+
+def test_load_keeps_other_copies_temp_files(tmp_path):
+    directory = tmp_path / "shared"
+    cache = PageCache(str(directory))
+    cache.put("https://en.wikipedia.org/wiki/A", 200, "text/html", b"a")
+    fresh = directory / "abc.tmp.1.2"
+    stale = directory / "def.tmp.1.2"
+    fresh.write_bytes(b"half written")
+    stale.write_bytes(b"abandoned")
+    old = time.time() - STALE_TEMP_SECONDS - 60
+    os.utime(stale, (old, old))
+    reloaded = PageCache(str(directory))
+    assert fresh.exists() and not stale.exists()
+    assert reloaded.stats()["entries"] == 1
+
+
+def test_put_survives_its_temp_being_removed(tmp_path, monkeypatch):
+    cache = PageCache(str(tmp_path / "cache"))
+    replace = os.replace
+
+    def cleared(source, target):
+        os.remove(source)
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", cleared)
+    cache.put("https://en.wikipedia.org/wiki/A", 200, "text/html", b"a")
+    assert cache.get("https://en.wikipedia.org/wiki/A") is None
+
+
+def test_size_of_maps_proxy_urls_to_cache_keys(proxy):
+    body = get(proxy.baseUrl + "/wiki/Article_4")
+    size = proxy.cache.size_of(proxy.upstream + "/wiki/Article_4")
+    assert size is not None and size > len(body)
+    assert proxy.size_of(proxy.baseUrl + "/wiki/Article_4") == size
+    assert proxy.size_of(proxy.upstream + "/wiki/Article_4") == size
+    assert proxy.size_of(proxy.baseUrl + "/wiki/Article_5") is None
+    assert proxy.size_of(proxy.baseUrl + "/_/evilwikimedia.org/a.png") is None
@@ -0,0 +1,116 @@
+'''
+Prefetcher and CachingProxy.prefetch against MockWiki: what counts as prefetched, the
+byte budget, cancellation on navigation and requests waiting on a prefetch
+'''
+
+from collections import Counter
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from MockWiki import MockWikiServer
+from PageCache import CachingProxy, PageCache
+from Prefetcher import LinkScorer, Prefetcher
+
+
+class SlowWiki(MockWikiServer):
+    delay = 0.0
+
+    def render(self, title):
+        time.sleep(self.delay)
+        return super().render(title)
+
+
+@pytest.fixture
+def wiki():
+    server = SlowWiki().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def proxy(wiki, tmp_path):
+    proxy = CachingProxy(PageCache(str(tmp_path / "cache")), wiki.baseUrl).start()
+    yield proxy
+    proxy.stop()
+
+
+def links(*titles):
+    return {title: "/wiki/" + title.replace(" ", "_") for title in titles}
+
+
+def prefetcher(proxy, **options):
+    # Links score by click counts, so they are fetched in the order given
+    scorer = LinkScorer(clicks=Counter({"Article %d" % index: 100 - index
+                                        for index in range(100)}))
+    options.setdefault("rateBytes", 10 ** 9)
+    return Prefetcher(proxy, scorer, **options)
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_only_cached_pages_count(proxy):
+    assert proxy.prefetch(proxy.upstream + "/nowhere") == 0
+    assert proxy.prefetch(proxy.upstream + "/wiki/Special:Random") == 0
+    assert proxy.cache.stats()["entries"] == 0
+    assert proxy.prefetch(proxy.upstream + "/wiki/Article_1") > 0
+    assert proxy.upstream + "/wiki/Article_1" in proxy.cache
+
+
+def test_errors_are_not_counted_as_prefetched(proxy):
+    worker = prefetcher(proxy)
+    worker.page_ready("Start", "Goal", {"Article 0": "/missing/0", "Article 1": "/wiki/Article_1"})
+    assert wait_for(lambda: worker.pages == 1)
+    time.sleep(0.1)
+    worker.navigated("Article 0")
+    stats = worker.stats()
+    worker.stop()
+    assert stats["pages"] == 1 and stats["used"] == 0
+
+
+def test_byte_budget_stops_the_page(proxy):
+    worker = prefetcher(proxy, budgetBytes=1)
+    worker.page_ready("Start", "Goal", links("Article 1", "Article 2", "Article 3"))
+    assert wait_for(lambda: worker.pages == 1)
+    time.sleep(0.2)
+    stats = worker.stats()
+    worker.stop()
+    assert stats["pages"] == 1
+    assert proxy.upstream + "/wiki/Article_1" in proxy.cache
+    assert proxy.upstream + "/wiki/Article_2" not in proxy.cache
+
+
+def test_navigation_cancels_the_rest(wiki, proxy):
+    wiki.delay = 0.2
+    worker = prefetcher(proxy, topK=4)
+    worker.page_ready("Start", "Goal", links(*("Article %d" % index for index in range(4))))
+    assert wait_for(lambda: worker.active is not None)
+    worker.navigated("Article 0")
+    time.sleep(0.6)
+    stats = worker.stats()
+    worker.stop()
+    assert stats["cancelled"] == 1
+    assert stats["pages"] <= 1
+    assert wiki.requests <= 2
+
+
+def test_request_waits_for_a_prefetch_in_progress(wiki, proxy):
+    wiki.delay = 0.3
+    url = proxy.upstream + "/wiki/Article_5"
+    thread = threading.Thread(target=proxy.prefetch, args=(url,))
+    thread.start()
+    assert wait_for(lambda: url in proxy.inflight)
+    with urllib.request.urlopen(proxy.baseUrl + "/wiki/Article_5") as response:
+        assert b"Article 5" in response.read()
+    thread.join()
+    assert wiki.requests == 1
+    assert proxy.cache.stats()["hits"] == 1
@@ -0,0 +1,87 @@
+'''
+RaceBot strategies and GhostRuns, which need no browser
+'''
+
+import random
+
+import pytest
+
+pytest.importorskip("PyQt5.QtWidgets")
+
+from GhostRuns import Ghost, GhostStore
+from LinkGraph import LinkGraph, build_link_graph
+from RaceBot import GreedyStrategy, SimilarityStrategy, similarity, trigrams
+
+
+@pytest.fixture
+def graph(tmp_path):
+    filename = str(tmp_path / "graph.bin")
+    edges = [("Cat", "Dog"), ("Dog", "Moon"), ("Cat", "Mars"), ("Mars", "Sun"), ("Sun", "Moon")]
+    build_link_graph(edges, filename)
+    with LinkGraph(filename) as graph:
+        yield graph
+
+
+def test_similarity_prefers_titles_like_the_goal():
+    assert similarity(trigrams("Moon"), trigrams("moon")) == 1.0
+    assert similarity(trigrams("Moon"), frozenset()) == 0.0
+    strategy = SimilarityStrategy(rng=random.Random(0))
+    strategy.new_round("Cat", "Moon landing")
+    assert strategy.choose("Cat", ["Dog", "Moon", "Sun"]) == "Moon"
+    assert strategy.choose("Moon", ["Moon landing", "Moon"]) == "Moon landing"
+
+
+def test_similarity_never_goes_back():
+    strategy = SimilarityStrategy(rng=random.Random(0))
+    strategy.new_round("Moonbase", "Moon")
+    assert strategy.choose("Sun", ["Moonbase", "Mars"]) == "Mars"
+    assert strategy.choose("Mars", ["Sun", "Moonbase"]) is None
+
+
+def test_greedy_follows_and_replans_the_route(graph):
+    strategy = GreedyStrategy(graph, rng=random.Random(0))
+    strategy.new_round("Cat", "Moon")
+    assert strategy.next_on_route("Cat") == "Dog"
+    assert strategy.choose("Cat", ["Mars", "Dog"]) == "Dog"
+    # Off the route: plan again from where the player is
+    assert strategy.next_on_route("Mars") == "Sun"
+    assert strategy.route == ["Mars", "Sun", "Moon"]
+    assert strategy.next_on_route("Moon") is None
+    # Without the route step on the page it falls back on similarity
+    assert strategy.choose("Cat", ["Mars", "Moonlight"]) == "Moonlight"
+
+
+def test_greedy_mistakes_are_seeded(graph):
+    def choices(seed):
+        strategy = GreedyStrategy(graph, mistakeRate=0.5, rng=random.Random(seed))
+        picks = []
+        for _ in range(20):
+            strategy.new_round("Cat", "Moon")
+            picks.append(strategy.choose("Cat", ["Dog", "Mars"]))
+        return picks
+
+    assert choices(3) == choices(3)
+    assert set(choices(3)) == {"Dog", "Mars"}
+
+
+def test_ghost_position():
+    ghost = Ghost("Cat", "Moon", "bot", 9.0, 2, [(0.0, "Cat"), (4.0, "Dog"), (9.0, "Moon")])
+    assert ghost.position(0.0) == ("Cat", 0)
+    assert ghost.position(3.9) == ("Cat", 0)
+    assert ghost.position(4.0) == ("Dog", 1)
+    assert ghost.position(100.0) == ("Moon", 2)
+    assert ghost.position(-1.0) == ("Cat", 0)
+
+
+def test_ghost_store_keeps_the_fastest(tmp_path):
+    filename = str(tmp_path / "ghosts.jsonl")
+    store = GhostStore(filename)
+    store.add(Ghost("Cat", "Moon", "slow", 20.0, 3, [(0.0, "Cat")]))
+    store.add(Ghost("cat", "moon", "fast", 10.0, 2, [(0.0, "Cat")]))
+    store.add(Ghost("Cat", "Sun", "other", 5.0, 1, [(0.0, "Cat")]))
+    with open(filename, 'a', encoding='utf-8') as file:
+        file.write('{"start": "Cat", "goal": "Mo')
+    reloaded = GhostStore(filename)
+    assert reloaded.best_for("Cat", "Moon").name == "fast"
+    assert reloaded.best_for("CAT", "Sun").seconds == 5.0
+    assert reloaded.best_for("Dog", "Moon") is None
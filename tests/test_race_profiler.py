@@ -0,0 +1,48 @@
+'''
+RaceProfiler recording from several threads while a trace is exported
+'''
+
+import json
+import threading
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+
+from RaceProfiler import RaceProfiler
+
+
+@pytest.fixture
+def profiler():
+    application = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    profiler = RaceProfiler(maxEvents=5000)
+    yield profiler
+    profiler.stop()
+    del application
+
+
+def test_export_while_threads_record(profiler, tmp_path):
+    stop = threading.Event()
+
+    def record():
+        while not stop.is_set():
+            now = time.perf_counter_ns()
+            profiler.record_decision(now, now + 1000, True, "https://example/")
+            profiler.instant("tick")
+            time.sleep(0.0001)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for index in range(5):
+            filename = profiler.export_trace(str(tmp_path / ("trace%d.json" % index)))
+            with open(filename, encoding='utf-8') as file:
+                assert json.load(file)["traceEvents"]
+            assert profiler.snapshot()["decision_us"] == 1.0
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert profiler.snapshot()["events"] == len(profiler.events)
@@ -0,0 +1,106 @@
+'''
+RaceServer driven by several asyncio clients on 127.0.0.1
+'''
+
+import asyncio
+import json
+
+from RaceServer import RaceServer, encode
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, server, name):
+        client = cls(*await asyncio.open_connection("127.0.0.1", server.port))
+        client.send({"type": "hello", "name": name})
+        client.welcome = await client.expect("welcome")
+        return client
+
+    def send(self, message):
+        self.writer.write(message if isinstance(message, bytes) else encode(message))
+
+    async def expect(self, kind, timeout=5):
+        while True:
+            message = json.loads(await asyncio.wait_for(self.reader.readline(), timeout))
+            if message["type"] == kind:
+                return message
+
+    async def standings_until(self, predicate, timeout=5):
+        while True:
+            message = await self.expect("standings", timeout)
+            if predicate(message["standings"]):
+                return message["standings"]
+
+    def close(self):
+        self.writer.close()
+
+
+def run(test, pairSource=None):
+    async def main():
+        server = await RaceServer("127.0.0.1", 0, pairSource, countdown=0.0).start()
+        try:
+            await test(server)
+        finally:
+            await server.close()
+    asyncio.run(main())
+
+
+def test_round_is_shared_and_ranked():
+    async def test(server):
+        clients = [await Client.connect(server, "Player %d" % index) for index in range(4)]
+        assert [client.welcome["host"] for client in clients] == [True, False, False, False]
+        clients[0].send({"type": "start_round", "start": "Cat", "goal": "Dog"})
+        rounds = [await client.expect("round") for client in clients]
+        assert {(message["round"], message["start"], message["goal"]) for message in rounds} \
+            == {(1, "Cat", "Dog")}
+        for index, seconds in [(2, 30.5), (1, 12.0), (3, 45.0)]:
+            clients[index].send({"type": "finish", "round": 1, "time": seconds, "clicks": index})
+        standings = await clients[0].standings_until(
+            lambda rows: sum(row["finished"] for row in rows) == 3)
+        assert [row["name"] for row in standings] == ["Player 1", "Player 2", "Player 3",
+                                                      "Player 0"]
+        assert [row["rank"] for row in standings] == [1, 2, 3, None]
+        for client in clients:
+            client.close()
+    run(test)
+
+
+def test_only_host_starts_rounds_and_host_moves_on():
+    async def test(server):
+        host = await Client.connect(server, "Host")
+        guest = await Client.connect(server, "Guest")
+        guest.send({"type": "start_round", "start": "Cat", "goal": "Dog"})
+        assert (await guest.expect("error"))["message"] == "Only the host starts rounds"
+        host.close()
+        await guest.expect("host")
+        guest.send({"type": "start_round"})
+        assert (await guest.expect("round"))["start"] == "Alpha"
+        guest.close()
+    run(test, pairSource=lambda: ("Alpha", "Beta"))
+
+
+def test_bad_messages_get_errors_not_disconnects():
+    def no_pairs():
+        raise ValueError("empty band")
+
+    async def test(server):
+        client = await Client.connect(server, "Player")
+        client.send(b'not json\n')
+        client.send([1, 2])
+        client.send({"type": "start_round"})
+        assert "empty band" in (await client.expect("error"))["message"]
+        client.send({"type": "start_round", "start": "Cat", "goal": "Dog"})
+        await client.expect("round")
+        client.send({"type": "progress", "round": 1, "clicks": "many"})
+        assert (await client.expect("error"))["message"] == "clicks must be a number"
+        client.send({"type": "finish", "round": 1, "time": "soon"})
+        assert (await client.expect("error"))["message"] == "A finish needs a time and clicks"
+        client.send({"type": "finish", "round": 1, "time": 9.5, "clicks": 3})
+        standings = await client.standings_until(lambda rows: rows[0]["finished"])
+        assert standings[0]["time"] == 9.5
+        client.close()
+    run(test, pairSource=no_pairs)
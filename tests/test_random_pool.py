@@ -0,0 +1,88 @@
+'''
+RandomPool against MockWiki, whose Special:Random answers with a 302 like Wikipedia's
+'''
+
+import threading
+import time
+
+import pytest
+
+from MockWiki import MockWikiServer
+from RandomPool import RandomArticlePool, fetch_random_title
+
+
+@pytest.fixture
+def wiki():
+    server = MockWikiServer().start()
+    yield server
+    server.stop()
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_fetch_reads_redirect(wiki):
+    title = fetch_random_title(wiki.baseUrl + "/wiki/Special:Random")
+    assert title.startswith("Article_")
+
+
+def test_take_pairs_never_blocks(wiki, tmp_path):
+    pool = RandomArticlePool(size=3, randomUrl=wiki.baseUrl + "/wiki/Special:Random",
+                             poolFile=str(tmp_path / "pool.json"))
+    assert pool.take_pairs(2) is None
+    assert wait_for(lambda: len(pool) >= 3)
+    pairs = pool.take_pairs(2)
+    pool.stop()
+    assert len(pairs) == 2
+    assert all(title.startswith("Article_") for pair in pairs for title in pair)
+    assert pool.lastError is None
+
+
+def test_reserve_grows_pool(wiki, tmp_path):
+    pool = RandomArticlePool(size=1, randomUrl=wiki.baseUrl + "/wiki/Special:Random",
+                             poolFile=str(tmp_path / "pool.json"))
+    pool.reserve(4)
+    assert wait_for(lambda: len(pool) >= 4)
+    pool.stop()
+    pool.worker.join(10)
+    reloaded = RandomArticlePool(size=4, poolFile=str(tmp_path / "pool.json"))
+    assert len(reloaded) >= 4
+
+
+def test_failed_fetch_is_recorded(tmp_path):
+    pool = RandomArticlePool(randomUrl="http://127.0.0.1:9/wiki/Special:Random",
+                             poolFile=str(tmp_path / "pool.json"))
+    assert pool.take_pairs() is None
+    assert wait_for(lambda: pool.lastError is not None)
+    pool.stop()
+
+
+def test_saves_from_many_threads_leave_one_valid_file(tmp_path):
+    poolFile = tmp_path / "pool.json"
+    pool = RandomArticlePool(poolFile=str(poolFile))
+    pool.pairs.extend(("Start_%d" % index, "Goal_%d" % index) for index in range(50))
+    threads = [threading.Thread(target=pool.save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(RandomArticlePool(poolFile=str(poolFile))) == 50
+    assert [path.name for path in tmp_path.iterdir()] == ["pool.json"]
+
+
+def test_worker_saves_what_take_pairs_leaves(wiki, tmp_path):
+    poolFile = str(tmp_path / "pool.json")
+    pool = RandomArticlePool(size=2, randomUrl=wiki.baseUrl + "/wiki/Special:Random",
+                             poolFile=poolFile)
+    pool.refill()
+    assert wait_for(lambda: len(pool) == 2)
+    pool.size = 0  # Nothing to fetch, so only the save is left for the worker
+    assert len(pool.take_pairs(1)) == 1
+    assert wait_for(lambda: len(RandomArticlePool(poolFile=poolFile)) == 1)
+    pool.stop()
@@ -0,0 +1,55 @@
+'''
+WikiArchive built from generated articles, and served offline through MirrorProxy
+'''
+
+import struct
+
+import pytest
+
+from RandomPool import fetch_random_title
+from WikiMirror import (ARTICLE_PREFIX, HEADER, MirrorProxy, UPSTREAM, WikiArchive,
+                        build_archive, synthetic_responses)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    filename = str(tmp_path / "mirror.bin")
+    redirect = (UPSTREAM + ARTICLE_PREFIX + "First", 301, "text/html", b"",
+                ARTICLE_PREFIX + "Article_0")
+    build_archive(list(synthetic_responses(50)) + [redirect], filename, chunkBytes=4096)
+    archive = WikiArchive(filename)
+    yield archive
+    archive.close()
+
+
+def test_articles_are_indexed_at_build_time(archive):
+    assert archive.entryCount == 52
+    assert archive.articleCount == 50
+    assert archive.stats()["articles"] == 50
+    titles = {archive.random_article() for _ in range(200)}
+    assert titles <= {"Article_%d" % index for index in range(50)}
+    assert len(titles) > 10
+
+
+def test_redirects_and_lookups(archive):
+    assert archive.get(UPSTREAM + "/wiki/First")[0] == 301
+    status, contentType, body, _ = archive.get(UPSTREAM + "/wiki/article_7")
+    assert status == 200 and b"Article 7" in body
+    assert archive.get(UPSTREAM + "/wiki/Missing") is None
+
+
+def test_old_archives_are_refused(tmp_path):
+    filename = str(tmp_path / "old.bin")
+    with open(filename, 'wb') as file:
+        file.write(struct.pack("<4sI", b"WRMA", 1) + b"\0" * HEADER.size)
+    with pytest.raises(ValueError):
+        WikiArchive(filename)
+
+
+def test_mirror_serves_special_random(archive):
+    proxy = MirrorProxy(archive).start()
+    try:
+        title = fetch_random_title(proxy.baseUrl + "/wiki/Special:Random")
+    finally:
+        proxy.stop()
+    assert title.startswith("Article_")